@@ -1,13 +1,54 @@
 import { writable } from 'svelte/store';
 
-export const user = writable(null); // { username, id, chips }
+export const user = writable(null); // { username, id, chips, seat_token }
 export const currentTable = writable(null); // table_id
 export const tableState = writable(null); // Full table state
 export const socket = writable(null);
 
-export function connectWebSocket(tableId) {
+// Apply a server patch: [path, value] sets, [path] deletes (see app/ws/delta.py)
+function applyPatch(state, ops) {
+    for (const op of ops) {
+        const path = op[0];
+        if (path.length === 0) {
+            state = op[1];
+            continue;
+        }
+        let parent = state;
+        for (const key of path.slice(0, -1)) parent = parent[key];
+        const last = path[path.length - 1];
+        if (op.length === 1) delete parent[last];
+        else parent[last] = op[1];
+    }
+    return state;
+}
+
+// The server only sends our own hole cards, next to the masked table state
+function mergePrivate(state, priv) {
+    if (!state || !priv) return state;
+    const me = (state.players || []).find(p => p.id === priv.player_id);
+    if (me) me.hole_cards = priv.hole_cards;
+    return state;
+}
+
+// Seat tokens survive a reload, so a player coming back to a table reconnects with
+// theirs instead of joining again (and gets their hole cards)
+function seatTokenKey(tableId, playerId) {
+    return `seat_token:${tableId}:${playerId}`;
+}
+
+export function loadSeatToken(tableId, playerId) {
+    return localStorage.getItem(seatTokenKey(tableId, playerId));
+}
+
+// Hole cards are only sent to a socket that joined the seat, or reconnects with the
+// seat token the server issued on join
+export function connectWebSocket(tableId, playerId, seatToken) {
+    let lastSeq = null;
     return new Promise((resolve, reject) => {
-        const ws = new WebSocket(`ws://localhost:8000/ws/${tableId}`);
+        const query = playerId && seatToken
+            ? `?player_id=${encodeURIComponent(playerId)}&seat_token=${encodeURIComponent(seatToken)}`
+            : '';
+        const ws = new WebSocket(`ws://localhost:8000/ws/${tableId}${query}`);
 
         const timeout = setTimeout(() => {
             reject(new Error('Connection timeout'));
@@ -24,8 +65,28 @@ export function connectWebSocket(tableId) {
         ws.onmessage = (event) => {
             const data = JSON.parse(event.data);
             console.log('Received:', data);
-            if (data.type === 'update') {
-                tableState.set(data.state);
+            if (data.type === 'seat') {
+                localStorage.setItem(seatTokenKey(tableId, data.player_id), data.seat_token);
+                user.update(u => (u && u.id === data.player_id ? { ...u, seat_token: data.seat_token } : u));
+            } else if (data.type === 'snapshot') {
+                if (seatToken && lastSeq === null && !(data.state.players || []).some(p => p.id === playerId)) {
+                    // The table no longer has our seat (e.g. it was reset): join afresh next time
+                    localStorage.removeItem(seatTokenKey(tableId, playerId));
+                    console.warn('Seat not found at table', tableId);
+                }
+                lastSeq = data.seq;
+                tableState.set(mergePrivate(data.state, data.private));
+            } else if (data.type === 'delta') {
+                if (data.base_seq !== lastSeq) {
+                    // Missed an update; ask the server for a fresh snapshot
+                    ws.send(JSON.stringify({ type: 'resync', seq: lastSeq }));
+                    return;
+                }
+                lastSeq = data.seq;
+                tableState.update(state => mergePrivate(applyPatch(state, data.patch), data.private));
+            } else if (data.type === 'rejected') {
+                // Turned away before reaching the table (not our turn, rate limited, ...)
+                console.warn(`Action ${data.action} rejected: ${data.reason}`);
             }
         };
 
@@ -0,0 +1,196 @@
+import json
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.engine.cards import encode_cards
+
+# On-disk layout of an exported hand history (a directory):
+#
+#   meta.json                 last exported game_audit id, row counts, part names
+#   players.json, tables.json dictionary of ids; columns store the list index
+#   part-00000/<group>.<column>.npy ...
+#
+# Groups, one row each per:
+#   hands    hand     table, pot, showdown, winner (player code), n_seats, board0-4, created_at
+#   seats    player in a hand    hand, player, hole0, hole1, won
+#   actions  player action       hand, seat, player, street, action, amount
+#
+# Cards are 0-51 ints (app.engine.cards), -1 when unknown. Row references
+# (hand, seat) are global across parts. Every file is a plain .npy, so readers can
+# np.load(..., mmap_mode="r") them without parsing anything.
+
+STREETS = ("preflop", "flop", "turn", "river")
+ACTIONS = ("fold", "check", "call", "raise")
+STREET_CODES = {s: i for i, s in enumerate(STREETS)}
+ACTION_CODES = {a: i for i, a in enumerate(ACTIONS)}
+
+COLUMNS = {
+    "hands": {"table": "i4", "pot": "i8", "showdown": "?", "winner": "i4", "n_seats": "i1",
+              "board0": "i1", "board1": "i1", "board2": "i1", "board3": "i1", "board4": "i1",
+              "created_at": "i8"},
+    "seats": {"hand": "i4", "player": "i4", "hole0": "i1", "hole1": "i1", "won": "?"},
+    "actions": {"hand": "i4", "seat": "i4", "player": "i4", "street": "i1", "action": "i1", "amount": "i4"},
+}
+# array.array typecodes used while a part is being built
+_TYPECODES = {"i1": "b", "i4": "i", "i8": "q", "?": "b"}
+
+
+class Dictionary:
+    """String <-> dense int code, persisted as a JSON list."""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = list(values)
+        self.codes: Dict[str, int] = {v: i for i, v in enumerate(self.values)}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    @classmethod
+    def load(cls, path: str) -> "Dictionary":
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.values, f)
+
+
+def _event_type(event: dict) -> Optional[str]:
+    # Rows written before the audit log was typed hold bare payloads
+    if "type" in event and "payload" in event:
+        return event["type"]
+    if "action" in event and "player_id" in event:
+        return "player_action"
+    if "winner_id" in event:
+        return "showdown"
+    if "phase" in event and "community_cards" in event:
+        return "phase_change"
+    if "dealer" in event and "hand_id" in event:
+        return "hand_started"
+    return None
+
+
+def _card_code(card) -> int:
+    return card if isinstance(card, int) else encode_cards([card])[0]
+
+
+class ColumnarWriter:
+    """Appends audited hands to an export directory, one part per flush."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.meta = {"last_id": 0, "hands": 0, "seats": 0, "actions": 0, "parts": []}
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+        self.players = Dictionary.load(os.path.join(path, "players.json"))
+        self.tables = Dictionary.load(os.path.join(path, "tables.json"))
+        self._reset()
+
+    def _reset(self):
+        self.buffers = {group: {col: array(_TYPECODES[dtype]) for col, dtype in cols.items()}
+                        for group, cols in COLUMNS.items()}
+        self.pending_hands = 0
+        self.pending_last_id = self.meta["last_id"]
+
+    def add_hand(self, audit_id: int, table_id: str, events: list, created_at: int = 0):
+        hands, seats, actions = self.buffers["hands"], self.buffers["seats"], self.buffers["actions"]
+        hand = self.meta["hands"] + self.pending_hands
+        first_seat = self.meta["seats"] + len(seats["hand"])
+        seat_of: Dict[str, int] = {}
+        street = 0
+        pot = 0
+        showdown = False
+        winner = -1
+        board: List[int] = []
+
+        def seat(player_id):
+            # Seats come from the deal record; older rows only learn them from actions
+            if player_id not in seat_of:
+                seat_of[player_id] = first_seat + len(seat_of)
+                seats["hand"].append(hand)
+                seats["player"].append(self.players.code(player_id))
+                seats["hole0"].append(-1)
+                seats["hole1"].append(-1)
+                seats["won"].append(0)
+            return seat_of[player_id]
+
+        for event in events:
+            kind = _event_type(event)
+            payload = event.get("payload", event)
+            if kind == "deal":
+                for player_id, cards in zip(payload["players"], payload["hole_cards"]):
+                    row = seat(player_id) - self.meta["seats"]
+                    if len(cards) == 2:
+                        seats["hole0"][row], seats["hole1"][row] = cards
+            elif kind == "player_action":
+                code = ACTION_CODES.get(payload["action"])
+                if code is None:
+                    continue
+                actions["hand"].append(hand)
+                actions["seat"].append(seat(payload["player_id"]))
+                actions["player"].append(self.players.code(payload["player_id"]))
+                actions["street"].append(street)
+                actions["action"].append(code)
+                actions["amount"].append(payload.get("amount") or 0)
+            elif kind == "phase_change":
+                street = STREET_CODES.get(payload["phase"], street)
+                board = [_card_code(c) for c in payload.get("community_cards", [])]
+            elif kind == "board":
+                board = [_card_code(c) for c in payload["cards"]]
+            elif kind == "showdown":
+                pot = payload.get("amount") or 0
+                showdown = payload.get("winning_hand") not in (None, "opponent folded")
+                winner = self.players.code(payload["winner_id"])
+                # Everyone paid from a side pot or sharing a split pot won; rows from
+                # before side pots only name the one winner
+                pots = payload.get("pots") or [{"winner_ids": [payload["winner_id"]]}]
+                for player_id in {p for share in pots for p in share["winner_ids"]}:
+                    seats["won"][seat(player_id) - self.meta["seats"]] = 1
+
+        hands["table"].append(self.tables.code(table_id))
+        hands["pot"].append(pot)
+        hands["showdown"].append(showdown)
+        hands["winner"].append(winner)
+        hands["n_seats"].append(len(seat_of))
+        for i in range(5):
+            hands[f"board{i}"].append(board[i] if i < len(board) else -1)
+        hands["created_at"].append(created_at)
+        self.pending_hands += 1
+        self.pending_last_id = max(self.pending_last_id, audit_id)
+
+    def flush(self):
+        # Write the buffered hands as a new part, then commit it in meta.json
+        if not self.pending_hands:
+            return
+        name = f"part-{len(self.meta['parts']):05d}"
+        part = os.path.join(self.path, name)
+        os.makedirs(part, exist_ok=True)
+        for group, cols in COLUMNS.items():
+            for col, dtype in cols.items():
+                np.save(os.path.join(part, f"{group}.{col}.npy"),
+                        np.frombuffer(self.buffers[group][col], dtype=self.buffers[group][col].typecode)
+                        .astype(dtype))
+        self.players.save(os.path.join(self.path, "players.json"))
+        self.tables.save(os.path.join(self.path, "tables.json"))
+        self.meta["parts"].append(name)
+        self.meta["hands"] += self.pending_hands
+        self.meta["seats"] += len(self.buffers["seats"]["hand"])
+        self.meta["actions"] += len(self.buffers["actions"]["hand"])
+        self.meta["last_id"] = self.pending_last_id
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+        self._reset()
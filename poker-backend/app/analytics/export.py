@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from app.analytics.columnar import ColumnarWriter
+from app.storage.pg import pg_client
+
+# Hands per part file (and per transaction batch read from Postgres)
+EXPORT_BATCH_HANDS = int(os.getenv("EXPORT_BATCH_HANDS", "100000"))
+EXPORT_PREFETCH = 5000
+
+EXPORT_QUERY = """
+SELECT id, table_id, events, created_at FROM game_audit
+WHERE id > $1 ORDER BY id
+"""
+
+
+async def export(path: str, batch_hands: int = EXPORT_BATCH_HANDS) -> int:
+    """Stream game_audit rows after the last exported id into the columnar store at `path`.
+
+    Incremental: re-running only appends hands audited since the previous export.
+    """
+    writer = ColumnarWriter(path)
+    await pg_client.connect()
+    exported = 0
+    started = time.perf_counter()
+    async with pg_client.pool.acquire() as conn:
+        async with conn.transaction():
+            # Server-side cursor: rows arrive in prefetch-sized chunks, never all at once
+            async for row in conn.cursor(EXPORT_QUERY, writer.meta["last_id"], prefetch=EXPORT_PREFETCH):
+                events = row["events"]
+                if isinstance(events, str):
+                    events = json.loads(events)
+                created = row["created_at"]
+                writer.add_hand(row["id"], row["table_id"], events or [],
+                                int(created.timestamp()) if created else 0)
+                exported += 1
+                if writer.pending_hands >= batch_hands:
+                    writer.flush()
+                    print(f"[Export] {exported} hands ({exported / (time.perf_counter() - started):.0f}/s)")
+    writer.flush()
+    print(f"[Export] Done: {exported} new hands, {writer.meta['hands']} total in {path}")
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export game_audit to a columnar hand history")
+    parser.add_argument("path", help="export directory (created or appended to)")
+    parser.add_argument("--batch-hands", type=int, default=EXPORT_BATCH_HANDS)
+    args = parser.parse_args()
+    asyncio.run(export(args.path, args.batch_hands))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import json
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from app.analytics.columnar import ACTION_CODES, STREET_CODES
+
+FOLD, CALL, RAISE = ACTION_CODES["fold"], ACTION_CODES["call"], ACTION_CODES["raise"]
+PREFLOP = STREET_CODES["preflop"]
+
+
+class HandHistory:
+    """Vectorized queries over a columnar hand-history export (see app.analytics.columnar).
+
+    Columns are memory-mapped per part and only loaded when a query touches them.
+    Aggregates are bincounts and scatters over whole columns, one part at a time
+    (a hand never spans parts), so no column is ever copied into RAM whole and
+    there is no per-hand Python.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, "players.json")) as f:
+            self.players: List[str] = json.load(f)
+        with open(os.path.join(path, "tables.json")) as f:
+            self.tables: List[str] = json.load(f)
+        self._columns: Dict[str, np.ndarray] = {}
+        self._offsets: List[Tuple[int, int]] = []
+
+    def column(self, part: int, group: str, name: str) -> np.ndarray:
+        # One part's column, memory-mapped; row references in it are global (see offsets())
+        key = f"{self.meta['parts'][part]}/{group}.{name}"
+        if key not in self._columns:
+            self._columns[key] = np.load(os.path.join(self.path, f"{key}.npy"), mmap_mode="r")
+        return self._columns[key]
+
+    def columns(self, group: str, name: str) -> Iterator[np.ndarray]:
+        return (self.column(i, group, name) for i in range(len(self.meta["parts"])))
+
+    def offsets(self) -> List[Tuple[int, int]]:
+        # Per part: global index of its first hand row and first seat row
+        if len(self._offsets) != len(self.meta["parts"]):
+            self._offsets, hand0, seat0 = [], 0, 0
+            for i in range(len(self.meta["parts"])):
+                self._offsets.append((hand0, seat0))
+                hand0 += len(self.column(i, "hands", "table"))
+                seat0 += len(self.column(i, "seats", "hand"))
+        return self._offsets
+
+    def _seat_flags(self, part: int, mask: np.ndarray) -> np.ndarray:
+        # Per seat row of a part: did any action matching `mask` come from that seat
+        flags = np.zeros(len(self.column(part, "seats", "hand")), dtype=bool)
+        flags[self.column(part, "actions", "seat")[mask] - self.offsets()[part][1]] = True
+        return flags
+
+    def player_stats(self) -> Dict[str, np.ndarray]:
+        """Per player (index into .players): hands, VPIP, PFR, win rate, showdown frequency."""
+        n = len(self.players)
+        hands, won, vpip, pfr, wtsd, won_at_showdown = (np.zeros(n) for _ in range(6))
+        for part, (hand0, _) in enumerate(self.offsets()):
+            seat_player = self.column(part, "seats", "player")
+            seat_won = self.column(part, "seats", "won")
+            street = self.column(part, "actions", "street")
+            action = self.column(part, "actions", "action")
+            preflop = street == PREFLOP
+
+            hands += np.bincount(seat_player, minlength=n)
+            won += np.bincount(seat_player, weights=seat_won, minlength=n)
+            vpip += np.bincount(seat_player, minlength=n,
+                                weights=self._seat_flags(part, preflop & ((action == CALL) | (action == RAISE))))
+            pfr += np.bincount(seat_player, weights=self._seat_flags(part, preflop & (action == RAISE)), minlength=n)
+            # Went to showdown: the hand reached one and this seat never folded
+            reached = self.column(part, "hands", "showdown")[self.column(part, "seats", "hand") - hand0] \
+                & ~self._seat_flags(part, action == FOLD)
+            wtsd += np.bincount(seat_player, weights=reached, minlength=n)
+            won_at_showdown += np.bincount(seat_player, weights=reached & seat_won, minlength=n)
+
+        per_hand = np.maximum(hands, 1)
+        return {
+            "hands": hands.astype(np.int64),
+            "vpip": vpip / per_hand,
+            "pfr": pfr / per_hand,
+            "win_rate": won / per_hand,
+            "showdown_rate": wtsd / per_hand,
+            "won_at_showdown": won_at_showdown / np.maximum(wtsd, 1),
+        }
+
+    def table_stats(self) -> Dict[str, np.ndarray]:
+        """Per table (index into .tables): hands, average pot, showdown rate, actions per hand."""
+        n = len(self.tables)
+        hands, pots, showdowns, actions = (np.zeros(n) for _ in range(4))
+        for part, (hand0, _) in enumerate(self.offsets()):
+            table = self.column(part, "hands", "table")
+            hands += np.bincount(table, minlength=n)
+            pots += np.bincount(table, weights=self.column(part, "hands", "pot"), minlength=n)
+            showdowns += np.bincount(table, weights=self.column(part, "hands", "showdown"), minlength=n)
+            actions += np.bincount(table[self.column(part, "actions", "hand") - hand0], minlength=n)
+        per_hand = np.maximum(hands, 1)
+        return {
+            "hands": hands.astype(np.int64),
+            "avg_pot": pots / per_hand,
+            "showdown_rate": showdowns / per_hand,
+            "actions_per_hand": actions / per_hand,
+        }
+
+    def player(self, player_id: str) -> Dict[str, float]:
+        # One player's row of player_stats()
+        idx = self.players.index(player_id)
+        return {k: v[idx].item() for k, v in self.player_stats().items()}
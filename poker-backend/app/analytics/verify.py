@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+from app.storage.pg import pg_client
+
+# Hands per task sent to a worker process, and worker count (0 = one per CPU)
+VERIFY_CHUNK_HANDS = int(os.getenv("VERIFY_CHUNK_HANDS", "5000"))
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", "0"))
+VERIFY_PREFETCH = 10000
+
+VERIFY_QUERY = """
+SELECT id, hand_id, server_secret, commitment, events FROM game_audit
+WHERE id > $1 ORDER BY id
+"""
+
+# A row: (audit id, hand_id, server_secret, commitment, events as JSON text or list)
+Row = Tuple[int, str, str, str, object]
+
+
+def dealt_cards(secret: str, hand_id: str, count: int) -> List[int]:
+    """The first `count` cards dealt from the hand's seeded shuffle, in dealing order.
+
+    Same result as DeterministicRNG seeded with generate_seed(secret, hand_id)
+    shuffling a fresh deck and popping from its end, but Fisher-Yates fixes the
+    end of the deck first, so the shuffle stops once the dealt cards are known.
+    """
+    seed = int(hashlib.sha256(f"{secret}:{hand_id}".encode()).hexdigest(), 16)
+    randbelow = random.Random(seed)._randbelow  # what random.shuffle draws with
+    deck = list(range(52))
+    dealt = []
+    for i in range(51, 51 - count, -1):
+        j = randbelow(i + 1)
+        deck[i], deck[j] = deck[j], deck[i]
+        dealt.append(deck[i])
+    return dealt
+
+
+def verify_hand(hand_id: str, secret: str, commitment: str, events) -> Optional[str]:
+    """None if the hand checks out, else why not.
+
+    Checks the commitment against the revealed secret, then that the hole cards and
+    board recorded in the audit log are exactly what the seeded shuffle dealt.
+    """
+    expected = hmac.new(secret.encode(), hand_id.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, commitment or ""):
+        return "commitment does not match secret"
+    if isinstance(events, str):
+        events = json.loads(events)
+    hole_cards = board = None
+    for event in events or ():
+        kind = event.get("type")
+        if kind == "deal":
+            hole_cards = event["payload"]["hole_cards"]
+        elif kind == "board":
+            board = event["payload"]["cards"]
+        elif kind == "showdown" and event["payload"].get("server_secret") not in (None, secret):
+            return "revealed secret differs from audited secret"
+    if hole_cards is None:
+        return None if board is None else "board recorded without a deal"
+    board = board or []
+    cards = dealt_cards(secret, hand_id, 2 * len(hole_cards) + len(board))
+    for seat, hole in enumerate(hole_cards):
+        if list(hole) != cards[2 * seat:2 * seat + 2]:
+            return f"hole cards of seat {seat} differ from the shuffle"
+    if list(board) != cards[2 * len(hole_cards):]:
+        return "board differs from the shuffle"
+    return None
+
+
+def verify_rows(rows: Iterable[Row]) -> dict:
+    """Verify a chunk of audit rows (runs in a worker process)."""
+    checked = commitment_only = 0
+    mismatches = []
+    for audit_id, hand_id, secret, commitment, events in rows:
+        checked += 1
+        try:
+            if isinstance(events, str):
+                events = json.loads(events)
+            reason = verify_hand(hand_id, secret, commitment, events)
+        except Exception as e:
+            reason = f"unreadable audit row: {e!r}"
+        if reason is not None:
+            mismatches.append({"id": audit_id, "hand_id": hand_id, "reason": reason})
+        elif not any(isinstance(e, dict) and e.get("type") == "deal" for e in events or ()):
+            # Audited before the deal was recorded: only the commitment could be checked
+            commitment_only += 1
+    return {"checked": checked, "commitment_only": commitment_only, "mismatches": mismatches}
+
+
+class Checkpoint:
+    """Progress of a verification run, saved after every chunk that completes in order."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.state = {"last_id": 0, "checked": 0, "commitment_only": 0, "mismatches": 0}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def advance(self, last_id: int, result: dict, report):
+        for mismatch in result["mismatches"]:
+            report.write(json.dumps(mismatch) + "\n")
+        report.flush()
+        self.state["last_id"] = last_id
+        self.state["checked"] += result["checked"]
+        self.state["commitment_only"] += result["commitment_only"]
+        self.state["mismatches"] += len(result["mismatches"])
+        if self.path:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.state, f)
+            os.replace(tmp, self.path)
+
+
+async def verify_stream(rows, checkpoint: Checkpoint, report, workers: int = VERIFY_WORKERS,
+                        chunk_hands: int = VERIFY_CHUNK_HANDS) -> dict:
+    """Verify rows from an async iterator in parallel chunks.
+
+    Chunks finish in any order but are committed to the checkpoint (and the
+    report) in id order, so a resumed run never skips or repeats a hand.
+    """
+    loop = asyncio.get_running_loop()
+    workers = workers or os.cpu_count() or 1
+    pending = deque()  # (last id in chunk, future), oldest first
+    started = time.perf_counter()
+
+    async def commit_oldest():
+        last_id, future = pending.popleft()
+        checkpoint.advance(last_id, await future, report)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunk = []
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) < chunk_hands:
+                continue
+            pending.append((chunk[-1][0], loop.run_in_executor(pool, verify_rows, chunk)))
+            chunk = []
+            while pending and pending[0][1].done():
+                await commit_oldest()
+            if len(pending) >= 2 * workers:
+                # Bounded read-ahead: wait for the oldest chunk before reading more
+                await commit_oldest()
+                state = checkpoint.state
+                print(f"[Verify] {state['checked']} hands "
+                      f"({state['checked'] / (time.perf_counter() - started) * 60:.0f}/min), "
+                      f"{state['mismatches']} mismatches")
+        if chunk:
+            pending.append((chunk[-1][0], loop.run_in_executor(pool, verify_rows, chunk)))
+        while pending:
+            await commit_oldest()
+    return checkpoint.state
+
+
+async def _audit_rows(after_id: int):
+    await pg_client.connect()
+    async with pg_client.pool.acquire() as conn:
+        async with conn.transaction():
+            async for row in conn.cursor(VERIFY_QUERY, after_id, prefetch=VERIFY_PREFETCH):
+                yield (row["id"], row["hand_id"], row["server_secret"], row["commitment"], row["events"])
+
+
+async def verify(checkpoint_path: str, report_path: str, workers: int = VERIFY_WORKERS,
+                 chunk_hands: int = VERIFY_CHUNK_HANDS) -> dict:
+    """Verify every game_audit row after the checkpoint; mismatches are appended to the report."""
+    checkpoint = Checkpoint(checkpoint_path)
+    with open(report_path, "a") as report:
+        state = await verify_stream(_audit_rows(checkpoint.state["last_id"]), checkpoint, report,
+                                    workers, chunk_hands)
+    print(f"[Verify] Done: {state['checked']} hands checked, {state['commitment_only']} commitment only, "
+          f"{state['mismatches']} mismatches (see {report_path})")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify the provably-fair shuffle of audited hands")
+    parser.add_argument("--checkpoint", default="verify-checkpoint.json", help="resumed from if it exists")
+    parser.add_argument("--report", default="verify-mismatches.jsonl", help="mismatches are appended here")
+    parser.add_argument("--workers", type=int, default=VERIFY_WORKERS)
+    parser.add_argument("--chunk-hands", type=int, default=VERIFY_CHUNK_HANDS)
+    args = parser.parse_args()
+    state = asyncio.run(verify(args.checkpoint, args.report, args.workers, args.chunk_hands))
+    raise SystemExit(1 if state["mismatches"] else 0)
+
+
+if __name__ == "__main__":
+    main()
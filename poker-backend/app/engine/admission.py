@@ -0,0 +1,83 @@
+import os
+import time
+from collections import OrderedDict
+from typing import FrozenSet, NamedTuple, Optional
+
+# Per-connection action rate: sustained actions per second, and the burst allowed on top
+ACTION_RATE = float(os.getenv("ACTION_RATE", "10"))
+ACTION_BURST = float(os.getenv("ACTION_BURST", "20"))
+# Actions waiting for a table's engine; beyond this new ones are turned away
+ACTION_QUEUE_MAX = int(os.getenv("ACTION_QUEUE_MAX", "256"))
+# Client hosts with a rate-limit bucket; the least recently seen is evicted beyond this
+MAX_TRACKED_CLIENTS = int(os.getenv("MAX_TRACKED_CLIENTS", "10000"))
+
+BETTING_ACTIONS = frozenset(("fold", "check", "call", "raise"))
+
+
+class TurnView(NamedTuple):
+    """What an engine last published about its table, read by the edge without locking."""
+    phase: str
+    to_act: Optional[str]  # player id whose turn it is, None between hands
+    seated: FrozenSet[str]
+
+
+def precheck(view: Optional[TurnView], action: dict, settled: bool) -> Optional[str]:
+    """Why an action can be turned away before it is queued, or None to queue it.
+
+    `settled` means nothing is queued or being applied, so the view is current. While
+    it isn't, queued actions may still change the turn; only malformed actions are
+    rejected then and the FSM has the final say.
+    """
+    act = action.get("action")
+    if act != "join" and act not in BETTING_ACTIONS:
+        return "unknown action"
+    if not action.get("player_id"):
+        return "missing player_id"
+    if act == "raise" and not isinstance(action.get("amount"), int):
+        return "raise needs an integer amount"
+    if view is None or not settled:
+        return None
+    if act == "join":
+        return "already seated" if action["player_id"] in view.seated else None
+    if view.to_act is None:
+        return "no hand in progress"
+    if view.to_act != action["player_id"]:
+        return "not your turn"
+    return None
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float = ACTION_RATE, burst: float = ACTION_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+# host -> bucket, least recently used first. Keyed by host, not (host, port): every
+# HTTP request may come from a new ephemeral port, which would mean a fresh bucket
+_client_buckets: "OrderedDict[Optional[str], TokenBucket]" = OrderedDict()
+
+
+def client_bucket(client) -> TokenBucket:
+    # Buckets for GraphQL callers (and joins over any transport), by the caller's address
+    key = client.host if client is not None else None
+    bucket = _client_buckets.get(key)
+    if bucket is None:
+        if len(_client_buckets) >= MAX_TRACKED_CLIENTS:
+            _client_buckets.popitem(last=False)  # only the idlest host starts over
+        bucket = _client_buckets[key] = TokenBucket()
+    else:
+        _client_buckets.move_to_end(key)
+    return bucket
@@ -0,0 +1,40 @@
+from typing import Dict, List, Iterable
+
+# Integer card encoding: card = rank_index * 4 + suit_index (0..51).
+# The order matches the rank-major / suit-minor order PokerFSM has always used
+# to build its deck, so a shuffled range(52) lines up with the old dict deck.
+RANKS = "23456789TJQKA"
+SUITS = "shdc"
+
+RANK_INDEX = {r: i for i, r in enumerate(RANKS)}
+SUIT_INDEX = {s: i for i, s in enumerate(SUITS)}
+
+
+def card_rank(card: int) -> int:
+    return card >> 2
+
+
+def card_suit(card: int) -> int:
+    return card & 3
+
+
+def encode_card(card: Dict[str, str]) -> int:
+    # {"rank": "A", "suit": "s"} -> 48
+    return RANK_INDEX[card["rank"]] * 4 + SUIT_INDEX[card["suit"]]
+
+
+def card_from_str(text: str) -> int:
+    # "As" -> 48
+    return RANK_INDEX[text[0]] * 4 + SUIT_INDEX[text[1]]
+
+
+def decode_card(card: int) -> Dict[str, str]:
+    return {"rank": RANKS[card >> 2], "suit": SUITS[card & 3]}
+
+
+def encode_cards(cards: Iterable[Dict[str, str]]) -> List[int]:
+    return [encode_card(c) for c in cards]
+
+
+def decode_cards(cards: Iterable[int]) -> List[Dict[str, str]]:
+    return [decode_card(c) for c in cards]
@@ -0,0 +1,159 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import Optional, Sequence
+
+import numpy as np
+
+from app.engine.evaluator import QUINARY, get_evaluator
+
+# Random boards drawn when the board is not complete enough to enumerate (~0.5% error)
+EQUITY_SAMPLES = int(os.getenv("EQUITY_SAMPLES", "5000"))
+# Monte Carlo requests with at least this many hand evaluations are split over processes
+EQUITY_PARALLEL_MIN = int(os.getenv("EQUITY_PARALLEL_MIN", "400000"))
+EQUITY_WORKERS = int(os.getenv("EQUITY_WORKERS", str(os.cpu_count() or 1)))
+# Boards evaluated per NumPy batch, to bound memory
+EQUITY_CHUNK = 50000
+
+
+class VectorEvaluator:
+    """The lookup-table evaluator over NumPy arrays of boards.
+
+    Uses the same tables as HandEvaluator: an unsuited quinary key looked up with
+    searchsorted, plus the flush table indexed by each suit's rank mask.
+    """
+
+    def __init__(self, evaluator=None):
+        evaluator = evaluator or get_evaluator()
+        self.flush = np.asarray(evaluator.flush_table, dtype=np.uint16)
+        self.keys = np.asarray(evaluator.keys, dtype=np.uint32)
+        self.ranks = np.asarray(evaluator.ranks, dtype=np.uint16)
+        self.quinary = np.array(QUINARY, dtype=np.int64)
+
+    def rank_boards(self, boards: np.ndarray, holes: Sequence[Sequence[int]]) -> np.ndarray:
+        """Rank every hole-card pair on every board; returns a (players, boards) array."""
+        r = boards >> 2
+        s = boards & 3
+        bits = np.left_shift(1, r, dtype=np.int64)
+        board_key = self.quinary[r].sum(axis=1)
+        # Cards of one suit have distinct ranks, so summing their bits is an OR
+        board_masks = [np.where(s == suit, bits, 0).sum(axis=1) for suit in range(4)]
+
+        out = np.empty((len(holes), len(boards)), dtype=np.uint16)
+        for i, hole in enumerate(holes):
+            key = board_key + sum(QUINARY[c >> 2] for c in hole)
+            best = self.ranks[np.searchsorted(self.keys, key)]
+            for suit in range(4):
+                extra = sum(1 << (c >> 2) for c in hole if c & 3 == suit)
+                f = self.flush[board_masks[suit] + extra]
+                best = np.where((f > 0) & (f < best), f, best)
+            out[i] = best
+        return out
+
+
+_vector = None
+_pool = None
+
+
+def _vector_evaluator() -> VectorEvaluator:
+    global _vector
+    if _vector is None:
+        _vector = VectorEvaluator()
+    return _vector
+
+
+def _tally(ranks: np.ndarray, wins: np.ndarray, ties: np.ndarray, shares: np.ndarray):
+    best = ranks.min(axis=0)
+    winners = ranks == best
+    count = winners.sum(axis=0)
+    wins += (winners & (count == 1)).sum(axis=1)
+    ties += (winners & (count > 1)).sum(axis=1)
+    shares += (winners / count).sum(axis=1)
+
+
+def _run_boards(holes, board, remaining, need, samples, seed, exact):
+    """Evaluate boards for one chunk of work; returns (wins, ties, shares, boards)."""
+    vector = _vector_evaluator()
+    k = len(holes)
+    wins = np.zeros(k, dtype=np.int64)
+    ties = np.zeros(k, dtype=np.int64)
+    shares = np.zeros(k, dtype=np.float64)
+    fixed = np.array(board, dtype=np.int64)
+    deck = np.array(remaining, dtype=np.int64)
+    total = 0
+
+    if exact:
+        rows = np.array(list(combinations(remaining, need)), dtype=np.int64).reshape(-1, need)
+        boards = np.hstack([np.broadcast_to(fixed, (len(rows), len(fixed))), rows])
+        _tally(vector.rank_boards(boards, holes), wins, ties, shares)
+        total = len(rows)
+    else:
+        rng = np.random.default_rng(seed)
+        while total < samples:
+            n = min(EQUITY_CHUNK, samples - total)
+            # A random partial permutation of the remaining deck per row
+            picks = rng.random((n, len(deck))).argpartition(need, axis=1)[:, :need]
+            boards = np.hstack([np.broadcast_to(fixed, (n, len(fixed))), deck[picks]])
+            _tally(vector.rank_boards(boards, holes), wins, ties, shares)
+            total += n
+    return wins, ties, shares, total
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers)
+    return _pool
+
+
+def calculate_equity(hands: Sequence[Sequence[int]], board: Sequence[int] = (), dead: Sequence[int] = (),
+                     samples: int = EQUITY_SAMPLES, seed: Optional[int] = None,
+                     workers: Optional[int] = None) -> dict:
+    """Win/tie/equity percentages for each hand.
+
+    Cards are 0-51 ints. Turn and river spots are enumerated exactly; preflop
+    and flop spots use `samples` random boards, spread over a process pool when
+    the request is large.
+    """
+    hands = [list(h) for h in hands]
+    board = list(board)
+    if len(hands) < 2 or any(len(h) != 2 for h in hands):
+        raise ValueError("need at least two hands of two cards each")
+    if len(board) not in (0, 3, 4, 5):
+        raise ValueError("board must have 0, 3, 4 or 5 cards")
+    known = [c for h in hands for c in h] + board + list(dead)
+    if len(set(known)) != len(known) or any(not 0 <= c < 52 for c in known):
+        raise ValueError("cards must be distinct ints in 0..51")
+
+    remaining = [c for c in range(52) if c not in set(known)]
+    need = 5 - len(board)
+    if need > len(remaining):
+        raise ValueError("not enough cards left to complete the board")
+    exact = need <= 1
+
+    if exact:
+        wins, ties, shares, total = _run_boards(hands, board, remaining, need, 0, None, True)
+    else:
+        workers = EQUITY_WORKERS if workers is None else workers
+        if workers > 1 and samples * len(hands) >= EQUITY_PARALLEL_MIN:
+            seeds = np.random.SeedSequence(seed).spawn(workers)
+            per_worker = -(-samples // workers)
+            futures = [
+                _get_pool(workers).submit(_run_boards, hands, board, remaining, need, per_worker, s, False)
+                for s in seeds
+            ]
+            parts = [f.result() for f in futures]
+            wins = sum(p[0] for p in parts)
+            ties = sum(p[1] for p in parts)
+            shares = sum(p[2] for p in parts)
+            total = sum(p[3] for p in parts)
+        else:
+            wins, ties, shares, total = _run_boards(hands, board, remaining, need, samples, seed, False)
+
+    return {
+        "win": [100.0 * w / total for w in wins.tolist()],
+        "tie": [100.0 * t / total for t in ties.tolist()],
+        "equity": [100.0 * e / total for e in shares.tolist()],
+        "boards": total,
+        "exact": exact,
+    }
@@ -0,0 +1,280 @@
+import os
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from itertools import combinations, combinations_with_replacement
+from typing import List, Sequence
+
+# Optional pre-built table file. When set, the tables are memory-mapped from it at
+# startup instead of being generated (and written there on first build).
+EVALUATOR_TABLES_PATH = os.getenv("EVALUATOR_TABLES_PATH")
+
+# Hand rank scale is the same as treys: 1 = royal flush ... 7462 = 7-5-4-3-2 offsuit.
+MAX_ROYAL_FLUSH = 1
+MAX_STRAIGHT_FLUSH = 10
+MAX_FOUR_OF_A_KIND = 166
+MAX_FULL_HOUSE = 322
+MAX_FLUSH = 1599
+MAX_STRAIGHT = 1609
+MAX_THREE_OF_A_KIND = 2467
+MAX_TWO_PAIR = 3325
+MAX_PAIR = 6185
+MAX_HIGH_CARD = 7462
+
+CLASS_BOUNDS = [
+    MAX_ROYAL_FLUSH, MAX_STRAIGHT_FLUSH, MAX_FOUR_OF_A_KIND, MAX_FULL_HOUSE, MAX_FLUSH,
+    MAX_STRAIGHT, MAX_THREE_OF_A_KIND, MAX_TWO_PAIR, MAX_PAIR, MAX_HIGH_CARD,
+]
+CLASS_NAMES = [
+    "Royal Flush", "Straight Flush", "Four of a Kind", "Full House", "Flush",
+    "Straight", "Three of a Kind", "Two Pair", "Pair", "High Card",
+]
+
+# Rank multisets are keyed in base 5 (a rank appears at most 4 times), so the
+# unsuited key of any 5-7 card hand is just the sum of its cards' digits.
+QUINARY = [5 ** r for r in range(13)]
+
+# Straight rank masks, best first (bit 0 = deuce, bit 12 = ace); the wheel is last.
+STRAIGHTS = [0b1111100000000 >> i for i in range(9)] + [0b1000000001111]
+
+_MAGIC = b"PKEVAL01"
+_HEADER = struct.Struct("<8sI")
+_FLUSH_SIZE = 1 << 13
+
+
+def _mask_key(mask):
+    return sum(QUINARY[r] for r in range(13) if mask >> r & 1)
+
+
+def _five_card_ranks():
+    """Rank every distinct 5-card hand: (flush mask -> rank, unsuited key -> rank)."""
+    desc = list(range(12, -1, -1))
+    straights = set(STRAIGHTS)
+    patterns = sorted(
+        (m for m in range(_FLUSH_SIZE) if bin(m).count("1") == 5 and m not in straights),
+        reverse=True,
+    )
+
+    flush = {}
+    unsuited = {}
+
+    rank = 1
+    for mask in STRAIGHTS:
+        flush[mask] = rank
+        rank += 1
+
+    for quad in desc:
+        for kicker in desc:
+            if kicker != quad:
+                unsuited[4 * QUINARY[quad] + QUINARY[kicker]] = rank
+                rank += 1
+
+    for trips in desc:
+        for pair in desc:
+            if pair != trips:
+                unsuited[3 * QUINARY[trips] + 2 * QUINARY[pair]] = rank
+                rank += 1
+
+    for mask in patterns:
+        flush[mask] = rank
+        rank += 1
+
+    for mask in STRAIGHTS:
+        unsuited[_mask_key(mask)] = rank
+        rank += 1
+
+    for trips in desc:
+        kickers = [k for k in desc if k != trips]
+        for a, b in combinations(kickers, 2):
+            unsuited[3 * QUINARY[trips] + QUINARY[a] + QUINARY[b]] = rank
+            rank += 1
+
+    for high, low in combinations(desc, 2):
+        for kicker in desc:
+            if kicker != high and kicker != low:
+                unsuited[2 * QUINARY[high] + 2 * QUINARY[low] + QUINARY[kicker]] = rank
+                rank += 1
+
+    for pair in desc:
+        kickers = [k for k in desc if k != pair]
+        for a, b, c in combinations(kickers, 3):
+            unsuited[2 * QUINARY[pair] + QUINARY[a] + QUINARY[b] + QUINARY[c]] = rank
+            rank += 1
+
+    for mask in patterns:
+        unsuited[_mask_key(mask)] = rank
+        rank += 1
+
+    assert rank == MAX_HIGH_CARD + 1
+    return flush, unsuited
+
+
+def build_tables():
+    """Generate the 5-7 card flush and unsuited tables.
+
+    Returns (flush_table, keys, ranks): flush_table is indexed by a suit's 13-bit rank
+    mask (0 = fewer than five cards of that suit), keys/ranks are the sorted unsuited
+    quinary keys and their best 5-card rank.
+    """
+    flush5, unsuited5 = _five_card_ranks()
+
+    flush_table = array("H", bytes(2 * _FLUSH_SIZE))
+    for mask, rank in flush5.items():
+        flush_table[mask] = rank
+    # A 6 or 7 card flush is as good as its best 5 card subset
+    for size in (6, 7):
+        for mask in range(_FLUSH_SIZE):
+            if bin(mask).count("1") == size:
+                flush_table[mask] = min(
+                    flush_table[mask ^ (1 << r)] for r in range(13) if mask >> r & 1
+                )
+
+    unsuited = dict(unsuited5)
+    previous = unsuited5
+    for size in (6, 7):
+        current = {}
+        for combo in combinations_with_replacement(range(13), size):
+            if any(combo[i] == combo[i + 4] for i in range(size - 4)):
+                continue  # more than four of one rank
+            key = sum(QUINARY[r] for r in combo)
+            current[key] = min(previous[key - QUINARY[r]] for r in set(combo))
+        unsuited.update(current)
+        previous = current
+
+    keys = array("I", sorted(unsuited))
+    ranks = array("H", (unsuited[k] for k in keys))
+    return flush_table, keys, ranks
+
+
+class HandEvaluator:
+    def __init__(self, flush_table, keys, ranks):
+        # Tables may be arrays or memoryviews over a mapped file
+        self.flush_table = flush_table
+        self.keys = keys
+        self.ranks = ranks
+        self._unsuited = dict(zip(keys, ranks))
+
+    @classmethod
+    def build(cls):
+        return cls(*build_tables())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _HEADER.unpack_from(buf, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not an evaluator table file")
+        view = memoryview(buf)
+        offset = _HEADER.size
+        flush_table = view[offset:offset + 2 * _FLUSH_SIZE].cast("H")
+        offset += 2 * _FLUSH_SIZE
+        keys = view[offset:offset + 4 * count].cast("I")
+        offset += 4 * count
+        ranks = view[offset:offset + 2 * count].cast("H")
+        return cls(flush_table, keys, ranks)
+
+    def save(self, path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(self.keys)))
+            f.write(bytes(self.flush_table))
+            f.write(bytes(self.keys))
+            f.write(bytes(self.ranks))
+        os.replace(tmp, path)
+
+    def evaluate(self, cards: Sequence[int]) -> int:
+        """Rank 5-7 integer cards (lower is better)."""
+        key = 0
+        s0 = s1 = s2 = s3 = 0
+        for c in cards:
+            r = c >> 2
+            key += QUINARY[r]
+            suit = c & 3
+            if suit == 0:
+                s0 |= 1 << r
+            elif suit == 1:
+                s1 |= 1 << r
+            elif suit == 2:
+                s2 |= 1 << r
+            else:
+                s3 |= 1 << r
+        return self._finish(key, s0, s1, s2, s3)
+
+    def evaluate_many(self, board: Sequence[int], hands: Sequence[Sequence[int]]) -> List[int]:
+        """Rank every hand against a shared board in one pass.
+
+        The board's rank key and suit masks are computed once; each hand only adds
+        its own hole cards on top.
+        """
+        key = 0
+        masks = [0, 0, 0, 0]
+        for c in board:
+            key += QUINARY[c >> 2]
+            masks[c & 3] |= 1 << (c >> 2)
+
+        results = []
+        for hole in hands:
+            k = key
+            s = masks[:]
+            for c in hole:
+                r = c >> 2
+                k += QUINARY[r]
+                s[c & 3] |= 1 << r
+            results.append(self._finish(k, s[0], s[1], s[2], s[3]))
+        return results
+
+    def _finish(self, key, s0, s1, s2, s3):
+        best = self._unsuited[key]
+        flush = self.flush_table
+        # At most one suit can hold five of seven cards, but checking all four is cheap
+        for mask in (s0, s1, s2, s3):
+            if mask:
+                f = flush[mask]
+                if f and f < best:
+                    best = f
+        return best
+
+    @staticmethod
+    def rank_class(rank: int) -> int:
+        if not 1 <= rank <= MAX_HIGH_CARD:
+            raise ValueError(f"Invalid hand rank {rank}")
+        return bisect_left(CLASS_BOUNDS, rank)
+
+    @staticmethod
+    def class_to_string(class_int: int) -> str:
+        return CLASS_NAMES[class_int]
+
+    def hand_name(self, rank: int) -> str:
+        return CLASS_NAMES[self.rank_class(rank)]
+
+
+_evaluator = None
+
+
+def get_evaluator() -> HandEvaluator:
+    """Process-wide evaluator; tables are built (or mapped) once on first use."""
+    global _evaluator
+    if _evaluator is None:
+        path = EVALUATOR_TABLES_PATH
+        if path and os.path.exists(path):
+            _evaluator = HandEvaluator.load(path)
+        else:
+            _evaluator = HandEvaluator.build()
+            if path:
+                try:
+                    _evaluator.save(path)
+                except OSError as e:
+                    print(f"[Evaluator] Could not write tables to {path}: {e}")
+    return _evaluator
+
+
+if __name__ == "__main__":
+    import sys
+
+    target = sys.argv[1] if len(sys.argv) > 1 else EVALUATOR_TABLES_PATH
+    if not target:
+        sys.exit("usage: python -m app.engine.evaluator <tables-file>")
+    HandEvaluator.build().save(target)
+    print(f"Wrote evaluator tables to {target}")
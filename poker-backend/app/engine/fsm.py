@@ -1,7 +1,13 @@
 from typing import List, Dict, Any, Tuple, Optional
 import json
 from enum import Enum
-from dataclasses import dataclass, asdict, field
+from functools import partial
+from app.engine.cards import decode_cards, encode_cards
+from app.engine.evaluator import get_evaluator
+from app.storage.audit_writer import audit_writer
+from app.ws.wire import dumps_json
+
+FULL_DECK = bytes(range(52))
 
 class GamePhase(str, Enum):
     WAITING = "waiting"
@@ -11,36 +17,248 @@ class GamePhase(str, Enum):
     RIVER = "river"
     SHOWDOWN = "showdown"
 
-@dataclass
 class PlayerState:
-    id: str
-    username: str
-    chips: int
-    current_bet: int = 0
-    has_folded: bool = False
-    is_active: bool = True
-    hole_cards: List[Dict[str, str]] = None # [{"rank": "A", "suit": "s"}, ...]
-
-@dataclass
+    # Cards are 0-51 ints (see app.engine.cards); dicts only appear in to_dict()
+    __slots__ = ("id", "username", "chips", "current_bet", "has_folded", "is_active", "hole_cards", "seat_key")
+
+    def __init__(self, id: str, username: str, chips: int, current_bet: int = 0,
+                 has_folded: bool = False, is_active: bool = True, hole_cards: Optional[List[int]] = None,
+                 seat_key: Optional[str] = None):
+        self.id = id
+        self.username = username
+        self.chips = chips
+        self.current_bet = current_bet
+        self.has_folded = has_folded
+        self.is_active = is_active
+        self.hole_cards = hole_cards
+        # Hash of the token issued to whoever took the seat; it unlocks the seat's
+        # hole cards for a socket. Stripped from client state with the cards.
+        self.seat_key = seat_key
+
+    def to_dict(self):
+        d = self.to_public_dict()
+        if self.hole_cards is not None:
+            d["hole_cards"] = decode_cards(self.hole_cards)
+        if self.seat_key is not None:
+            d["seat_key"] = self.seat_key
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "PlayerState":
+        cards = d.get("hole_cards")
+        return cls(d["id"], d["username"], d["chips"], d.get("current_bet", 0), d.get("has_folded", False),
+                   d.get("is_active", True), encode_cards(cards) if cards is not None else None,
+                   d.get("seat_key"))
+
+    def to_public_dict(self):
+        # For event payloads: never carries hole cards
+        return {
+            "id": self.id,
+            "username": self.username,
+            "chips": self.chips,
+            "current_bet": self.current_bet,
+            "has_folded": self.has_folded,
+            "is_active": self.is_active,
+            "hole_cards": None,
+        }
+
 class GameState:
-    table_id: str
-    phase: str = "waiting"
-    pot: int = 0
-    community_cards: list = field(default_factory=list)
-    players: list = field(default_factory=list)
-    current_turn_index: int = None
-    dealer_index: int = 0
-    min_bet: int = 20
-    deck: list = field(default_factory=list)
-    actions_this_round: int = 0  # Track how many actions in current betting round
+    __slots__ = ("table_id", "phase", "pot", "community_cards", "players", "current_turn_index",
+                 "dealer_index", "min_bet", "deck", "actions_this_round")
+
+    def __init__(self, table_id: str, phase: str = "waiting", pot: int = 0,
+                 community_cards: Optional[List[int]] = None, players: Optional[List[PlayerState]] = None,
+                 current_turn_index: Optional[int] = None, dealer_index: int = 0, min_bet: int = 20,
+                 deck: Optional[bytearray] = None, actions_this_round: int = 0):
+        self.table_id = table_id
+        self.phase = phase
+        self.pot = pot
+        self.community_cards = community_cards if community_cards is not None else []
+        self.players = players if players is not None else []
+        self.current_turn_index = current_turn_index
+        self.dealer_index = dealer_index
+        self.min_bet = min_bet
+        self.deck = deck if deck is not None else bytearray()
+        self.actions_this_round = actions_this_round  # Track how many actions in current betting round
 
     def to_dict(self):
-        d = asdict(self)
         # Don't serialize deck or hidden hole cards for public view usually, 
         # but for internal state we keep them. 
         # We'll handle sanitization in the view layer.
+        d = self.to_public_dict()
+        d["deck"] = decode_cards(self.deck)
         return d
 
+    @classmethod
+    def from_dict(cls, d: dict) -> "GameState":
+        # Inverse of to_dict(), for rebuilding a table from its persisted state
+        return cls(
+            table_id=d["table_id"],
+            phase=GamePhase(d["phase"]),
+            pot=d["pot"],
+            community_cards=encode_cards(d["community_cards"]),
+            players=[PlayerState.from_dict(p) for p in d["players"]],
+            current_turn_index=d.get("current_turn_index"),
+            dealer_index=d.get("dealer_index", 0),
+            min_bet=d.get("min_bet", 20),
+            deck=bytearray(encode_cards(d.get("deck", []))),
+            actions_this_round=d.get("actions_this_round", 0),
+        )
+
+    def to_public_dict(self):
+        # Client-facing state: no deck. Hole cards are split out per seat by app.ws.views
+        return {
+            "table_id": self.table_id,
+            "phase": self.phase,
+            "pot": self.pot,
+            "community_cards": decode_cards(self.community_cards),
+            "players": [p.to_dict() for p in self.players],
+            "current_turn_index": self.current_turn_index,
+            "dealer_index": self.dealer_index,
+            "min_bet": self.min_bet,
+            "actions_this_round": self.actions_this_round,
+        }
+
+def _low_bit(mask: int) -> int:
+    return (mask & -mask).bit_length() - 1
+
+
+def _next_seat(mask: int, seat: int) -> Optional[int]:
+    # First seat in `mask` after `seat`, wrapping round
+    if not mask:
+        return None
+    later = mask >> (seat + 1)
+    return seat + 1 + _low_bit(later) if later else _low_bit(mask)
+
+
+class BettingRound:
+    """Bookkeeping for the hand in play, updated as chips go in rather than rescanned.
+
+    Seats are bits: `live` is every seat still in the hand and `all_in` the live
+    seats with nothing behind. A seat owes an action until it has acted since the
+    last raise and matched `max_bet`. `committed` is what each seat has put in over
+    the whole hand, which is all showdown needs to layer the side pots.
+    """
+
+    __slots__ = ("max_bet", "live", "all_in", "acted", "matched", "last_aggressor", "committed")
+
+    def __init__(self, seats: int = 0):
+        everyone = (1 << seats) - 1
+        self.max_bet = 0
+        self.live = everyone
+        self.all_in = 0
+        self.acted = 0
+        self.matched = everyone
+        self.last_aggressor: Optional[int] = None
+        self.committed = [0] * seats
+
+    @property
+    def active_count(self) -> int:
+        return self.live.bit_count()
+
+    @property
+    def all_in_count(self) -> int:
+        return self.all_in.bit_count()
+
+    def add_seat(self):
+        # Joined mid-hand: sits out until the next deal
+        self.committed.append(0)
+
+    def new_street(self):
+        self.max_bet = 0
+        self.acted = 0
+        self.matched = self.live
+        self.last_aggressor = None
+
+    def put_in(self, seat: int, amount: int, player: PlayerState, blind: bool = False):
+        # Called once `amount` has moved from the player's chips into its current_bet
+        bit = 1 << seat
+        self.committed[seat] += amount
+        if player.current_bet > self.max_bet:
+            # A raise (or a short all-in over the bet): everyone else owes an answer
+            self.max_bet = player.current_bet
+            self.matched = bit
+            self.acted = 0
+            if not blind:
+                self.last_aggressor = seat
+        elif player.current_bet == self.max_bet:
+            self.matched |= bit
+        if player.chips == 0:
+            self.all_in |= bit
+
+    def acted_on(self, seat: int):
+        self.acted |= 1 << seat
+
+    def fold(self, seat: int):
+        keep = ~(1 << seat)
+        self.live &= keep
+        self.all_in &= keep
+        self.matched &= keep
+        self.acted &= keep
+
+    def owed(self) -> int:
+        return self.live & ~self.all_in & ~(self.acted & self.matched)
+
+    def is_complete(self) -> bool:
+        # Nobody owes an action, or a lone seat with chips has nothing left to match
+        can_act = self.live & ~self.all_in
+        if (can_act & (can_act - 1)) == 0:
+            return not (can_act & ~self.matched)
+        return not self.owed()
+
+    def next_to_act(self, seat: int) -> Optional[int]:
+        return _next_seat(self.owed(), seat)
+
+    def next_live(self, seat: int) -> Optional[int]:
+        return _next_seat(self.live, seat)
+
+    def pots(self, pot: int) -> List[Tuple[int, int]]:
+        """(amount, eligible seats mask) per pot, main pot first, in one sweep of the all-in levels."""
+        if sum(self.committed) != pot or not self.live:
+            # Chips we didn't see go in (a table restored from an older snapshot): one pot
+            return [(pot, self.live)]
+        levels = sorted({self.committed[s] for s in range(len(self.committed)) if self.live >> s & 1})
+        pots = []
+        below = 0
+        for i, level in enumerate(levels):
+            top = level if i < len(levels) - 1 else max(self.committed)  # last pot takes dead money above
+            amount = sum(min(c, top) - min(c, below) for c in self.committed)
+            eligible = sum(1 << s for s in range(len(self.committed))
+                           if self.live >> s & 1 and self.committed[s] >= level)
+            if amount:
+                pots.append((amount, eligible))
+            below = top
+        return pots or [(pot, self.live)]
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "BettingRound":
+        r = cls()
+        for slot in cls.__slots__:
+            setattr(r, slot, d[slot])
+        return r
+
+    @classmethod
+    def from_state(cls, state: GameState) -> "BettingRound":
+        # Best effort for snapshots saved without the round: everything but `committed`
+        r = cls(len(state.players))
+        r.max_bet = max((p.current_bet for p in state.players), default=0)
+        r.live = r.all_in = r.matched = 0
+        for seat, p in enumerate(state.players):
+            if p.has_folded:
+                continue
+            r.live |= 1 << seat
+            if p.chips == 0:
+                r.all_in |= 1 << seat
+            if p.current_bet == r.max_bet:
+                r.matched |= 1 << seat
+        # Who has acted isn't saved: once anyone has, take the seats that match as done
+        r.acted = r.matched if state.actions_this_round else 0
+        return r
+
+
 class PokerFSM:
     def __init__(self, table_id):
         self.table_id = table_id
@@ -53,8 +271,15 @@ class PokerFSM:
             current_turn_index=None,
             dealer_index=0,
             min_bet=20, # Blinds: 10/20
-            deck=[]
+            deck=bytearray()
         )
+        # Off while replaying logged actions during recovery: no audit rows
+        self.side_effects = True
+        # Record of the current hand, including what only the audit may see (hole cards
+        # and board as 0-51 ints). Kept as compact tuples on every table; audit_log()
+        # expands it into the typed {type, payload} events stored in game_audit.
+        self.hand_log = []
+        self.round = BettingRound()
 
     async def apply(self, action: Dict[str, Any], rng) -> Tuple[List[Any], Any]:
         events = []
@@ -68,16 +293,21 @@ class PokerFSM:
                     id=player_id,
                     username=action.get("username", f"Player-{player_id[:4]}"),
                     chips=action.get("buyin", 1000),
-                    hole_cards=[]
+                    hole_cards=[],
+                    seat_key=action.get("seat_key")
                 )
+                if self.state.phase != GamePhase.WAITING:
+                    # Not dealt in: sits this hand out
+                    new_player.has_folded = True
+                    self.round.add_seat()
                 self.state.players.append(new_player)
-                events.append(self._create_event("player_joined", {"player": asdict(new_player)}))
+                events.append(self._create_event("player_joined", {"player": new_player.to_public_dict()}))
                 
                 # Broadcast current waiting state immediately so all clients see the new player
-                events.append(self._create_event("state_update", {"phase": self.state.phase, "players": [asdict(p) for p in self.state.players]}))
+                events.append(self._create_event("state_update", {"phase": self.state.phase, "players": [p.to_public_dict() for p in self.state.players]}))
                 
                 # Auto-start if enough players (e.g., 2)
-                if len(self.state.players) >= 2 and self.state.phase == GamePhase.WAITING:
+                if self._can_deal() and self.state.phase == GamePhase.WAITING:
                     await self._start_hand(rng, events)
 
         elif act_type in ["fold", "check", "call", "raise"]:
@@ -97,10 +327,10 @@ class PokerFSM:
         self.state.phase = GamePhase.PREFLOP
         self.state.pot = 0
         self.state.community_cards = []
+        self.hand_log = []
         
         # Anti-Cheat: Generate Secret & Commitment
-        import uuid
-        hand_id = str(uuid.uuid4())
+        hand_id = rng.new_hand_id()
         server_secret = rng.generate_secret()
         commitment = rng.compute_commitment(server_secret, hand_id)
         
@@ -116,27 +346,43 @@ class PokerFSM:
         self.state.deck = self._create_deck()
         rng.shuffle(self.state.deck)
         
-        # Reset player states
-        for p in self.state.players:
+        # Reset player states; a seat with no chips sits the hand out
+        self.round = BettingRound(len(self.state.players))
+        self.state.actions_this_round = 0
+        for seat, p in enumerate(self.state.players):
             p.current_bet = 0
-            p.has_folded = False
-            p.hole_cards = [self.state.deck.pop(), self.state.deck.pop()]
+            p.has_folded = p.chips == 0
+            if p.has_folded:
+                p.hole_cards = []
+                self.round.fold(seat)
+            else:
+                p.hole_cards = [self.state.deck.pop(), self.state.deck.pop()]
         
         # Blinds
-        sb_idx = (self.state.dealer_index + 1) % len(self.state.players)
-        bb_idx = (self.state.dealer_index + 2) % len(self.state.players)
+        sb_idx = self.round.next_live(self.state.dealer_index)
+        bb_idx = self.round.next_live(sb_idx)
         
         # Simple blind posting
         self._post_blind(sb_idx, self.state.min_bet // 2)
         self._post_blind(bb_idx, self.state.min_bet)
         
-        self.state.current_turn_index = (bb_idx + 1) % len(self.state.players)
+        # Skips anyone the blinds put all in (None if that leaves nobody to act)
+        self.state.current_turn_index = self.round.next_to_act(bb_idx)
         
         events.append(self._create_event("hand_started", {
             "dealer": self.state.dealer_index,
             "hand_id": hand_id,
             "commitment": commitment
         }))
+        self.hand_log.append(("hand_started", self.state.dealer_index))
+        self.hand_log.append(("deal", tuple(p.id for p in self.state.players if p.hole_cards),
+                              tuple(c for p in self.state.players for c in p.hole_cards)))
+        if self.round.is_complete():
+            # The blinds put all but one seat all in: nothing to bet, run the board out
+            await self._next_phase(events, rng)
+
+    def _can_deal(self) -> bool:
+        return sum(p.chips > 0 for p in self.state.players) >= 2
 
     def _post_blind(self, player_idx, amount):
         player = self.state.players[player_idx]
@@ -144,29 +390,33 @@ class PokerFSM:
         player.chips -= bet
         player.current_bet += bet
         self.state.pot += bet
+        self.round.put_in(player_idx, bet, player, blind=True)
 
     async def _handle_game_action(self, action, events, rng):
         if self.state.current_turn_index is None:
             return
 
-        player = self.state.players[self.state.current_turn_index]
+        seat = self.state.current_turn_index
+        player = self.state.players[seat]
         if player.id != action.get("player_id"):
             return # Not turn
 
         act_type = action.get("action")
         amount = action.get("amount", 0)
         
-        current_max_bet = max((p.current_bet for p in self.state.players), default=0)
+        current_max_bet = self.round.max_bet
         
         if act_type == "fold":
             player.has_folded = True
             player.is_active = False
+            self.round.fold(seat)
         elif act_type == "call":
             to_call = current_max_bet - player.current_bet
             bet = min(player.chips, to_call)
             player.chips -= bet
             player.current_bet += bet
             self.state.pot += bet
+            self.round.put_in(seat, bet, player)
         elif act_type == "check":
             # Check is only valid if player's bet matches current max
             if player.current_bet < current_max_bet:
@@ -185,20 +435,12 @@ class PokerFSM:
                  # Invalid raise
                  return
             
-            diff = amount - player.current_bet
-            if player.chips >= diff:
-                player.chips -= diff
-                player.current_bet += diff
-                self.state.pot += diff
-            else:
-                # All-in case: Player puts in everything they have
-                actual_bet = player.chips
-                player.chips = 0
-                player.current_bet += actual_bet
-                self.state.pot += actual_bet
-                # Note: In a real engine, we'd create a side pot here.
-                # For this implementation, we'll keep a single pot but note the all-in.
-                # Side pots are complex; this is a simplified "complete" logic.
+            # Short of chips: all in for what they have (showdown splits the side pots)
+            bet = min(player.chips, amount - player.current_bet)
+            player.chips -= bet
+            player.current_bet += bet
+            self.state.pot += bet
+            self.round.put_in(seat, bet, player)
 
         events.append(self._create_event("player_action", {
             "player_id": player.id,
@@ -207,60 +449,37 @@ class PokerFSM:
             "chips": player.chips,
             "current_bet": player.current_bet
         }))
+        self.hand_log.append(("player_action", player.id, act_type, amount, player.chips, player.current_bet))
 
         # Increment action counter
         self.state.actions_this_round += 1
+        if act_type != "fold":
+            self.round.acted_on(seat)
 
         # Move turn
         await self._next_turn(events, rng)
 
     async def _next_turn(self, events, rng):
-        active_players = [p for p in self.state.players if not p.has_folded]
-        if len(active_players) <= 1:
+        if self.round.active_count <= 1:
             # Everyone folded, remaining player wins
-            if active_players:
-                await self._end_hand(events, rng, winner=active_players[0], hand_name="opponent folded")
+            if self.round.live:
+                winner = self.state.players[_low_bit(self.round.live)]
+                await self._end_hand(events, rng, winner=winner, hand_name="opponent folded")
             return
 
-        # Check if betting round is over
-        current_max_bet = max((p.current_bet for p in self.state.players if not p.has_folded), default=0)
-        
-        # Round is complete if:
-        # 1. All active players have matched the max bet OR are all-in (chips == 0)
-        all_matched_or_allin = all(
-            (p.current_bet == current_max_bet or p.chips == 0) 
-            for p in active_players
-        )
-        
-        # We need to check if everyone has acted. In a proper implementation, we'd track
-        # "last_action_index" but for simplicity, we count actions.
-        # Round ends when: all bets equal AND everyone has acted at least once
-        if all_matched_or_allin and len(active_players) > 1 and self.state.actions_this_round >= len(active_players):
-            # Everyone has acted and equalized bets, move to next phase
+        # Round is over once every seat with chips has acted since the last raise and
+        # matched it (all-in seats are done acting)
+        if self.round.is_complete():
             await self._next_phase(events, rng)
             return
-            
-        # Find next active player who can still act (has chips)
-        start_idx = self.state.current_turn_index
-        next_idx = (start_idx + 1) % len(self.state.players)
-        
-        # Skip folded players and all-in players
-        attempts = 0
-        while attempts < len(self.state.players):
-            if not self.state.players[next_idx].has_folded and self.state.players[next_idx].chips > 0:
-                self.state.current_turn_index = next_idx
-                return
-            next_idx = (next_idx + 1) % len(self.state.players)
-            attempts += 1
-            
-        # If we get here, all remaining players are all-in, move to next phase
-        await self._next_phase(events, rng)
+        self.state.current_turn_index = self.round.next_to_act(self.state.current_turn_index)
 
     async def _next_phase(self, events, rng):
         # Reset action counter and bets for new round
         self.state.actions_this_round = 0
         for p in self.state.players:
             p.current_bet = 0
+        self.round.new_street()
             
         if self.state.phase == GamePhase.PREFLOP:
             self.state.phase = GamePhase.FLOP
@@ -276,90 +495,82 @@ class PokerFSM:
             await self._showdown(events, rng)
             return
             
-        # Set turn to first active player after dealer
-        next_idx = (self.state.dealer_index + 1) % len(self.state.players)
-        while self.state.players[next_idx].has_folded:
-            next_idx = (next_idx + 1) % len(self.state.players)
-        self.state.current_turn_index = next_idx
+        # Set turn to first player after dealer who can still bet
+        self.state.current_turn_index = self.round.next_to_act(self.state.dealer_index)
             
         events.append(self._create_event("phase_change", {
             "phase": self.state.phase,
-            "community_cards": self.state.community_cards,
+            "community_cards": decode_cards(self.state.community_cards),
             "pot": self.state.pot
         }))
+        self.hand_log.append(("phase_change", self.state.phase, tuple(self.state.community_cards), self.state.pot))
+        if self.round.is_complete():
+            # At most one seat has chips left to bet: run the board out
+            await self._next_phase(events, rng)
 
     async def _showdown(self, events, rng):
-        # Evaluate hands
-        from treys import Evaluator, Card
-        
-        active_players = [p for p in self.state.players if not p.has_folded]
-        if not active_players:
+        seats = [s for s in range(len(self.state.players)) if self.round.live >> s & 1]
+        if not seats:
             return
+        players = self.state.players
 
-        evaluator = Evaluator()
-        best_rank = float('inf')
-        winner = None
-        
-        # Helper to convert our card format to treys format
-        def to_treys_card(card):
-            rank_map = {'2': '2', '3': '3', '4': '4', '5': '5', '6': '6', '7': '7', 
-                       '8': '8', '9': '9', 'T': 'T', 'J': 'J', 'Q': 'Q', 'K': 'K', 'A': 'A'}
-            suit_map = {'h': 'h', 'd': 'd', 'c': 'c', 's': 's'}
-            return Card.new(rank_map[card['rank']] + suit_map[card['suit']])
-        
-        # Evaluate each player's hand
-        for player in active_players:
-            try:
-                # Convert hole cards and community cards to treys format
-                hole = [to_treys_card(c) for c in player.hole_cards]
-                board = [to_treys_card(c) for c in self.state.community_cards]
-                
-                # Evaluate hand (lower rank is better)
-                rank = evaluator.evaluate(board, hole)
-                
-                if rank < best_rank:
-                    best_rank = rank
-                    winner = player
-            except Exception as e:
-                print(f"Error evaluating hand for {player.id}: {e}")
-                # Fallback to random if evaluation fails
-                if winner is None:
-                    winner = player
-        
-        if winner is None:
-            winner = active_players[0]
-                
-        # Get hand class name for display
-        hand_class = evaluator.get_rank_class(best_rank)
-        hand_name = evaluator.class_to_string(hand_class)
-        
-        await self._end_hand(events, rng, winner, hand_name)
+        # Rank every live hand against the board in one pass (lower rank is better)
+        evaluator = get_evaluator()
+        try:
+            ranks = dict(zip(seats, evaluator.evaluate_many(self.state.community_cards,
+                                                            [players[s].hole_cards for s in seats])))
+        except Exception as e:
+            print(f"Error evaluating hands at table {self.table_id}: {e}")
+            await self._end_hand(events, rng, players[seats[0]])
+            return
+
+        # Each layer goes to the best hand among the seats that covered it; ties split
+        # it, odd chips to the first winner after the dealer
+        order = sorted(seats, key=lambda s: (s - self.state.dealer_index - 1) % len(players))
+        pots = []
+        for amount, eligible in self.round.pots(self.state.pot):
+            best = min(ranks[s] for s in order if eligible >> s & 1)
+            winners = [s for s in order if eligible >> s & 1 and ranks[s] == best]
+            pots.append((amount, [players[s] for s in winners]))
 
-    async def _end_hand(self, events, rng, winner, hand_name="Unknown"):
-        winner.chips += self.state.pot
+        # The main pot's winner and hand headline the showdown
+        main = pots[0][1][0]
+        await self._end_hand(events, rng, main, evaluator.hand_name(ranks[players.index(main)]), pots)
+
+    async def _end_hand(self, events, rng, winner, hand_name="Unknown", pots=None):
+        if pots is None:
+            pots = [(self.state.pot, [winner])]
+        for amount, winners in pots:
+            share, odd = divmod(amount, len(winners))
+            for i, p in enumerate(winners):
+                p.chips += share + (i < odd)
+        pots = [{"amount": amount, "winner_ids": [p.id for p in winners]} for amount, winners in pots]
+        self.hand_log.append(("board", tuple(self.state.community_cards)))
+        self.hand_log.append(("showdown", winner.id, self.state.pot, hand_name, pots))
         events.append(self._create_event("showdown", {
             "winner_id": winner.id,
             "amount": self.state.pot,
             "winning_hand": hand_name,
+            "pots": pots,
             "server_secret": getattr(self, 'current_hand_secret', None),
             "hand_id": getattr(self, 'current_hand_id', None)
         }))
         
-        # Log to Postgres (Fire and forget task in real app, here await for simplicity)
-        try:
-            from app.storage.pg import pg_client
-            # Ensure connected
-            await pg_client.connect()
-            await pg_client.log_hand(
+        # Log to Postgres: queued for the batched audit writer, never awaited here.
+        # The compact log is handed over as is (the next hand starts a new list) and
+        # only expanded to JSON when the writer inserts it.
+        if self.side_effects:
+            hand_id = getattr(self, 'current_hand_id', 'unknown')
+            secret = getattr(self, 'current_hand_secret', '')
+            commitment = getattr(self, 'current_hand_commitment', '')
+            audit_writer.submit((
                 self.table_id, 
-                getattr(self, 'current_hand_id', 'unknown'),
+                hand_id,
                 0, # Seed not stored directly in this flow, derived
-                getattr(self, 'current_hand_secret', ''),
-                getattr(self, 'current_hand_commitment', ''),
-                json.dumps([e.payload for e in events])
-            )
-        except Exception as e:
-            print(f"Failed to log hand: {e}")
+                secret,
+                commitment,
+                partial(_audit_json, json.dumps(self.hand_log, separators=(",", ":")), hand_id, secret, commitment)
+            ))
         
         self.state.pot = 0
         self.state.phase = GamePhase.WAITING
@@ -368,26 +579,90 @@ class PokerFSM:
         self.state.dealer_index = (self.state.dealer_index + 1) % len(self.state.players)
         
         # Auto-start next hand after delay?
-        if len(self.state.players) >= 2:
+        if self._can_deal():
              await self._start_hand(rng, events)
 
     def _create_deck(self):
-        ranks = "23456789TJQKA"
-        suits = "shdc"
-        return [{"rank": r, "suit": s} for r in ranks for s in suits]
+        # Same rank-major order as the old dict deck, so seeded shuffles are unchanged
+        return bytearray(FULL_DECK)
 
     def _create_event(self, type, payload):
         return DummyEvent(type, payload)
 
+    def audit_log(self) -> list:
+        return expand_hand_log(self.hand_log, getattr(self, 'current_hand_id', None),
+                               getattr(self, 'current_hand_secret', None),
+                               getattr(self, 'current_hand_commitment', None))
+
     def to_primitive(self):
+        # Complete state for recovery. The deck is kept as hex bytes next to the
+        # client-shaped state rather than as 48 card dicts inside it.
+        state = self.state.to_public_dict()
         return {
-            "data": json.dumps(self.state.to_dict())
+            "data": dumps_json(state),
+            "deck": self.state.deck.hex(),
+            # The current hand's reveal data, so a restored table can still settle it
+            "hand": json.dumps({
+                "hand_id": getattr(self, 'current_hand_id', None),
+                "secret": getattr(self, 'current_hand_secret', None),
+                "commitment": getattr(self, 'current_hand_commitment', None),
+                "log": self.hand_log,
+                "round": self.round.to_dict(),
+            }),
         }
 
+    @classmethod
+    def from_primitive(cls, table_id, mapping: dict) -> "PokerFSM":
+        # Rebuild from the hash written by to_primitive() (see StatePersister)
+        fsm = cls(table_id)
+        fsm.state = GameState.from_dict(json.loads(mapping["data"]))
+        if "deck" in mapping:
+            fsm.state.deck = bytearray.fromhex(mapping["deck"])
+        hand = json.loads(mapping.get("hand") or "{}")
+        if hand.get("hand_id"):
+            fsm.current_hand_id = hand["hand_id"]
+            fsm.current_hand_secret = hand["secret"]
+            fsm.current_hand_commitment = hand["commitment"]
+            fsm.hand_log = hand.get("log", [])
+        fsm.round = BettingRound.from_dict(hand["round"]) if "round" in hand else BettingRound.from_state(fsm.state)
+        return fsm
+
+def expand_hand_log(hand_log, hand_id, secret, commitment) -> list:
+    # A compact hand log as typed {type, payload} events (the game_audit.events format)
+    events = []
+    for entry in hand_log:
+        if isinstance(entry, dict):
+            events.append(entry)  # restored from a snapshot taken before the log was compact
+            continue
+        kind = entry[0]
+        if kind == "hand_started":
+            payload = {"dealer": entry[1], "hand_id": hand_id, "commitment": commitment}
+        elif kind == "deal":
+            cards = list(entry[2])
+            payload = {"players": list(entry[1]), "hole_cards": [cards[i:i + 2] for i in range(0, len(cards), 2)]}
+        elif kind == "player_action":
+            payload = dict(zip(("player_id", "action", "amount", "chips", "current_bet"), entry[1:]))
+        elif kind == "phase_change":
+            payload = {"phase": entry[1], "community_cards": decode_cards(entry[2]), "pot": entry[3]}
+        elif kind == "board":
+            payload = {"cards": list(entry[1])}
+        else:  # showdown
+            payload = {"winner_id": entry[1], "amount": entry[2], "winning_hand": entry[3],
+                       "server_secret": secret, "hand_id": hand_id}
+            if len(entry) > 4:
+                payload["pots"] = entry[4]
+        events.append({"type": kind, "payload": payload})
+    return events
+
+
+def _audit_json(hand_log, hand_id, secret, commitment) -> str:
+    return json.dumps(expand_hand_log(json.loads(hand_log), hand_id, secret, commitment))
+
+
 class DummyEvent:
     def __init__(self, type, payload):
         self.type = type
         self.payload = payload
     
     def to_json(self):
-        return json.dumps({"type": self.type, "payload": self.payload})
+        return dumps_json({"type": self.type, "payload": self.payload})
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from app.engine.table_engine import TableEngine
+from app.storage.state_persister import state_persister
+from app.ws.manager import manager
+from app.ws.broker import broker
+
+# A table with no sockets and no actions for this long (seconds) is hibernated:
+# its state is flushed to Redis and its engine freed until it is needed again
+TABLE_IDLE_TTL = float(os.getenv("TABLE_IDLE_TTL", "300"))
+# Most engines kept in memory; beyond this the least recently used idle ones hibernate
+MAX_RESIDENT_TABLES = int(os.getenv("MAX_RESIDENT_TABLES", "5000"))
+HIBERNATE_CHECK_INTERVAL = float(os.getenv("HIBERNATE_CHECK_INTERVAL", "10"))
+
+# Engines hosted by this process, least recently used first. With sharding enabled
+# only tables whose owner on the hash ring is this node live here (see app.engine.sharding).
+engines = OrderedDict()
+hibernating = {}  # table_id -> task stopping its engine
+hibernated = set()  # tables this process put to sleep and hasn't needed since
+_reaper = None
+
+
+def get_engine(table_id):
+    engine = engines.get(table_id)
+    if engine is None or engine.stopped:
+        # The engine takes the table's ownership lease when it starts running and
+        # reloads whatever state was saved for the table (e.g. when it hibernated)
+        engine = engines[table_id] = TableEngine(table_id)
+        hibernated.discard(table_id)
+        engine.start(after=hibernating.get(table_id))
+        _start_reaper()
+        if len(engines) > MAX_RESIDENT_TABLES:
+            asyncio.create_task(evict_lru())
+    engines.move_to_end(table_id)
+    engine.last_active = time.monotonic()
+    return engine
+
+
+def touch(table_id):
+    # Activity that isn't an action (e.g. the last socket leaving) restarts the idle clock
+    engine = engines.get(table_id)
+    if engine is not None:
+        engine.last_active = time.monotonic()
+
+
+def table_counts() -> dict:
+    return {"resident": len(engines), "hibernated": len(hibernated)}
+
+
+def _evictable(table_id, engine) -> bool:
+    return engine.ready.is_set() and engine.idle and not manager.has_connections(table_id) \
+        and not broker.has_subscribers(table_id)
+
+
+async def hibernate(table_id) -> bool:
+    """Flush an idle table's state and free its engine; False if it is in use."""
+    engine = engines.get(table_id)
+    if engine is None or not _evictable(table_id, engine):
+        return False
+    await state_persister.flush(table_id)
+    # Re-check after the await: an action or socket may have arrived, or the flush failed
+    if engines.get(table_id) is not engine or not _evictable(table_id, engine) \
+            or state_persister.pending(table_id):
+        return False
+    del engines[table_id]
+    task = hibernating[table_id] = asyncio.create_task(engine.stop())
+    try:
+        await task
+    finally:
+        if hibernating.get(table_id) is task:
+            del hibernating[table_id]
+    if table_id not in engines:
+        hibernated.add(table_id)
+    print(f"[Registry] Hibernated table {table_id}")
+    return True
+
+
+async def evict_lru():
+    # Walk from the least recently used end; tables with sockets or work are skipped
+    for table_id in list(engines):
+        if len(engines) <= MAX_RESIDENT_TABLES:
+            return
+        await hibernate(table_id)
+    if len(engines) > MAX_RESIDENT_TABLES:
+        print(f"[Registry] {len(engines)} tables resident, all busy (cap {MAX_RESIDENT_TABLES})")
+
+
+async def reap_idle(now=None):
+    now = time.monotonic() if now is None else now
+    for table_id, engine in list(engines.items()):
+        if now - engine.last_active >= TABLE_IDLE_TTL:
+            await hibernate(table_id)
+
+
+async def _run_reaper():
+    while True:
+        await asyncio.sleep(HIBERNATE_CHECK_INTERVAL)
+        try:
+            await reap_idle()
+            if len(engines) > MAX_RESIDENT_TABLES:
+                await evict_lru()
+        except Exception as e:
+            print(f"[Registry] Hibernation pass failed: {e}")
+
+
+def _start_reaper():
+    global _reaper
+    if _reaper is None or _reaper.done():
+        _reaper = asyncio.create_task(_run_reaper())
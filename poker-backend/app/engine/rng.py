@@ -2,6 +2,7 @@ import hashlib
 import random
 import os
 import hmac
+import uuid
 
 class DeterministicRNG:
     def __init__(self, seed_val):
@@ -15,6 +16,9 @@ class DeterministicRNG:
     def randint(self, a, b):
         return self.rng.randint(a, b)
     
+    def new_hand_id(self):
+        return str(uuid.uuid4())
+
     @staticmethod
     def generate_seed(server_secret, hand_id):
         # Create a deterministic seed based on secret and hand_id
@@ -30,3 +34,19 @@ class DeterministicRNG:
         msg = f"{hand_id}".encode()
         key = secret.encode()
         return hmac.new(key, msg, hashlib.sha256).hexdigest()
+
+
+class ReplayRNG(DeterministicRNG):
+    # Re-applies a logged action: a hand it starts gets the recorded id and secret,
+    # so the seeded shuffle (and everything after it) comes out the same
+    def __init__(self, seed_val, hand=None):
+        super().__init__(seed_val)
+        self.hand = hand  # (hand_id, secret) or None
+
+    def new_hand_id(self):
+        if not self.hand:
+            raise RuntimeError("replayed action started a hand that was not logged")
+        return self.hand[0]
+
+    def generate_secret(self):
+        return self.hand[1]
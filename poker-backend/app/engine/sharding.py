@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import os
+from bisect import bisect
+from typing import Dict, Iterable, List, Optional
+from app.events.nats_client import nats_client
+from app.storage.redis_client import redis_client
+from app.telemetry.tracing import end_action
+from app.ws.views import BroadcastView
+
+# Comma-separated shard names, e.g. "shard-0,shard-1,shard-2". Empty = single process.
+SHARD_NODES = [n.strip() for n in os.getenv("SHARD_NODES", "").split(",") if n.strip()]
+# This process's name on the ring; must be one of SHARD_NODES when sharding.
+SHARD_ID = os.getenv("SHARD_ID", "local")
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+# A forwarded action is re-routed at most this many times while the ring settles
+MAX_FORWARD_HOPS = 2
+# How long a snapshot request waits for a (re)loading engine before giving up (seconds)
+SNAPSHOT_READY_TIMEOUT = 2.0
+# A remote snapshot request must outlast the owner's wait for its engine
+SNAPSHOT_REQUEST_TIMEOUT = SNAPSHOT_READY_TIMEOUT + 1.0
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing of table ids onto nodes.
+
+    Each node is placed at `vnodes` points on the ring, so adding or removing a
+    node only moves roughly 1/N of the tables.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = SHARD_VNODES):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        for i in range(self.vnodes):
+            point = _point(f"{node}#{i}")
+            if point not in self._owners:
+                self._owners[point] = node
+                self._points.insert(bisect(self._points, point), point)
+
+    def remove(self, node: str):
+        self._points = [p for p in self._points if self._owners[p] != node]
+        self._owners = {p: n for p, n in self._owners.items() if n != node}
+
+    def node_for(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("hash ring has no nodes")
+        idx = bisect(self._points, _point(key)) % len(self._points)
+        return self._owners[self._points[idx]]
+
+
+class ShardRouter:
+    """Sends table traffic to the process that owns the table.
+
+    Actions for tables owned elsewhere are forwarded over NATS to
+    shard.<owner>.actions. Sockets attached to a non-owning process get the
+    owner's broadcasts relayed through table.<id>.views, and snapshots are
+    fetched with a request to shard.<owner>.snapshots.
+    """
+
+    def __init__(self, nodes: List[str] = SHARD_NODES, node_id: str = SHARD_ID, vnodes: int = SHARD_VNODES):
+        self.node_id = node_id
+        self.ring = HashRing(nodes, vnodes) if nodes else None
+        self._watches = {}  # table_id -> relay subscription
+
+    @property
+    def enabled(self) -> bool:
+        return self.ring is not None
+
+    def owner(self, table_id: str) -> str:
+        return self.ring.node_for(table_id) if self.ring else self.node_id
+
+    def is_local(self, table_id: str) -> bool:
+        return self.owner(table_id) == self.node_id
+
+    async def start(self):
+        if not self.enabled:
+            return
+        await nats_client.subscribe(f"shard.{self.node_id}.actions", self._on_action)
+        await nats_client.subscribe(f"shard.{self.node_id}.snapshots", self._on_snapshot_request)
+        print(f"[ShardRouter] Node {self.node_id} listening for forwarded actions")
+
+    async def route(self, table_id: str, action: dict, hops: int = 0, span=None) -> Optional[str]:
+        # None once queued (or forwarded: the owner pre-validates), else why it was turned away.
+        # `span` traces the action; it is ended here if the action leaves this process.
+        from app.engine.registry import get_engine
+
+        if self.is_local(table_id) or hops >= MAX_FORWARD_HOPS:
+            return get_engine(table_id).admit(action, span)
+        owner = self.owner(table_id)
+        await nats_client.publish_core(
+            f"shard.{owner}.actions",
+            json.dumps({"table_id": table_id, "action": action, "hops": hops + 1}),
+        )
+        end_action(span, forwarded_to=owner)
+        return None
+
+    async def _on_action(self, msg):
+        data = json.loads(msg.data)
+        reason = await self.route(data["table_id"], data["action"], data.get("hops", 0))
+        if reason is not None:
+            print(f"[ShardRouter] Rejected forwarded action for table {data['table_id']}: {reason}")
+
+    async def snapshot(self, table_id: str) -> Optional[BroadcastView]:
+        # Full view from the owning process; None if the owner can't produce one in time
+        if self.is_local(table_id):
+            return await self._local_snapshot(table_id)
+        try:
+            reply = await nats_client.request(f"shard.{self.owner(table_id)}.snapshots", table_id.encode(),
+                                              timeout=SNAPSHOT_REQUEST_TIMEOUT)
+        except Exception as e:
+            # Owner slow, restarting or not subscribed yet (no responders): callers fall back to Redis
+            print(f"[ShardRouter] Snapshot request for table {table_id} failed: {e!r}")
+            return None
+        return _decode_view(reply.data) if reply.data else None
+
+    async def _local_snapshot(self, table_id: str) -> Optional[BroadcastView]:
+        from app.engine.registry import engines, get_engine, hibernated
+
+        # Asking for a table wakes it if it hibernated (or loads it if this process never
+        # hosted it). Ids nobody has played at don't get an engine, and a lease, for a look.
+        if table_id not in engines and table_id not in hibernated and not await redis_client.has_table(
+                f"table:{table_id}:state", f"table:{table_id}:actions"):
+            return None
+        engine = get_engine(table_id)
+        try:
+            await asyncio.wait_for(engine.ready.wait(), SNAPSHOT_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        return engine.snapshot_view()
+
+    async def _on_snapshot_request(self, msg):
+        view = await self._local_snapshot(msg.data.decode())
+        await msg.respond(_encode_view(view) if view is not None else b"")
+
+    async def publish_view(self, table_id: str, view: BroadcastView):
+        # Owner side: let other processes with sockets on this table relay the update
+        if self.enabled:
+            await nats_client.publish_core(f"table.{table_id}.views", _encode_view(view))
+
+    async def watch(self, table_id: str):
+        # Relay side: forward the owner's broadcasts to sockets and subscriptions here
+        if not self.enabled or self.is_local(table_id) or table_id in self._watches:
+            return
+        from app.ws.manager import manager
+        from app.ws.broker import broker
+
+        async def relay(msg):
+            # No local snapshot to fall back on; lagging clients see the base_seq gap and resync
+            view = _decode_view(msg.data)
+            broker.publish(table_id, view)
+            await manager.broadcast_view(table_id, view, None)
+
+        self._watches[table_id] = await nats_client.subscribe(f"table.{table_id}.views", relay)
+
+    async def unwatch(self, table_id: str):
+        sub = self._watches.pop(table_id, None)
+        if sub is not None:
+            await sub.unsubscribe()
+
+
+def _encode_view(view: BroadcastView) -> bytes:
+    return json.dumps({
+        "seq": view.seq, "base_seq": view.base_seq, "shared": view.shared, "private": view.private,
+        "event_types": view.event_types,
+    }).encode()
+
+
+def _decode_view(data: bytes) -> BroadcastView:
+    d = json.loads(data)
+    return BroadcastView.from_encoded(d["shared"], d["seq"], d["base_seq"], d["private"],
+                                      d.get("event_types", ()))
+
+
+router = ShardRouter()
@@ -1,66 +1,359 @@
 import asyncio
+import json
+import os
+import time
 from collections import deque
+from typing import Optional
+from app.storage.lease import TableLease
 from app.storage.redis_client import redis_client
-from app.events.nats_client import nats_client
+from app.storage.state_persister import state_persister
+from app.events.outbox import EventOutbox
+from app.engine.admission import ACTION_QUEUE_MAX, TurnView, precheck
 from app.engine.fsm import PokerFSM
-from app.engine.rng import DeterministicRNG
+from app.telemetry.metrics import ACTIONS, BATCH_ACTIONS, BROADCAST_SECONDS, FSM_APPLY_SECONDS, HANDS, REJECTED
+from app.telemetry.tracing import child, end_action, record_wait
+from app.engine.rng import DeterministicRNG, ReplayRNG
+from app.engine.sharding import router
 from app.ws.manager import manager
+from app.ws.broker import broker
+from app.ws.delta import diff
+from app.ws.views import BroadcastView, split_private
+
+# Full state snapshot at least every this many actions (and at every hand boundary);
+# in between only the actions are logged, and recovery replays them onto the snapshot
+STATE_SNAPSHOT_EVERY = int(os.getenv("STATE_SNAPSHOT_EVERY", "50"))
+# Most queued actions applied together before their state is persisted and broadcast
+ENGINE_BATCH_MAX = int(os.getenv("ENGINE_BATCH_MAX", "32"))
 
 class TableEngine:
     def __init__(self, table_id):
         self.table_id = table_id
-        self.queue = asyncio.Queue()
+        self.queue = asyncio.Queue(ACTION_QUEUE_MAX)
         self.fsm = PokerFSM(table_id)
         self.rng = DeterministicRNG(table_id) # Should be seeded per hand in reality
         self.seq = 0  # per-table event sequence
+        self.lease = TableLease(table_id)
+        self.outbox = EventOutbox(f"table.{table_id}.events")
+        self.task = None
+        self.stopped = False
+        # Set once the lease is held and persisted state (if any) is loaded
+        self.ready = asyncio.Event()
+        self.processing = False
+        self.last_active = time.monotonic()
+        self.unsnapshotted = 0  # actions logged since the last snapshot was marked
+        # Last state sent to clients and its seq; deltas are computed against it
+        self.public_state = None
+        self.private = {}
+        self.public_seq = 0
+        self.snapshot_cache = None  # latest encoded snapshot; valid while its seq == public_seq
+        self.turn = None  # TurnView of the last applied state, for admit()
+        self.rejected = 0
+
+    async def enqueue(self, action, span=None):
+        # Queue items carry the action's trace span (if traced) and when it was queued;
+        # the engine ends the span once the action's batch is broadcast
+        await self.queue.put((action, span, time.time_ns() if span is not None else 0))
+
+    def admit(self, action, span=None) -> Optional[str]:
+        """Queue a client's action unless it can be turned away up front; the reason if not.
+
+        Checked against the turn this engine last published, so out-of-turn actions
+        and junk never cost an FSM call, a log write or a broadcast.
+        """
+        reason = precheck(self.turn, action, self.idle)
+        if reason is None and self.queue.full():
+            reason = "table busy"
+        if reason is not None:
+            self.rejected += 1
+            REJECTED.labels(reason).inc()
+            end_action(span, rejected=reason)
+            return reason
+        self.queue.put_nowait((action, span, time.time_ns() if span is not None else 0))
+        return None
+
+    def _publish_turn(self):
+        state = self.fsm.state
+        idx = state.current_turn_index
+        # Players are only ever appended, so the seated set changes only with the count
+        seated = self.turn.seated if self.turn is not None and len(self.turn.seated) == len(state.players) \
+            else frozenset(p.id for p in state.players)
+        self.turn = TurnView(state.phase, state.players[idx].id if idx is not None else None, seated)
+
+    def start(self, after=None):
+        # `after`: a previous engine for this table still shutting down; wait for it first
+        self.task = asyncio.create_task(self.run(after))
+
+    @property
+    def idle(self) -> bool:
+        return self.queue.empty() and not self.processing
+
+    async def stop(self):
+        # Persist the final state while still holding the lease, then give it up
+        self.stopped = True
+        if self.task is not None:
+            self.task.cancel()
+        if self.ready.is_set() and self.unsnapshotted:
+            self._mark_snapshot()  # so the table reloads without replaying anything
+        await state_persister.flush(self.table_id)
+        await self.outbox.close()
+        await self.lease.release()
 
-    async def enqueue(self, action):
-        await self.queue.put(action)
+    async def _acquire_lease(self):
+        # Own the table for the engine's lifetime instead of locking every action
+        while not await self._try_acquire():
+            await asyncio.sleep(self.lease.ttl / 2)
+        print(f"[TableEngine] Acquired lease for table {self.table_id} (token {self.lease.token})")
 
-    async def run(self):
+    async def _try_acquire(self):
+        try:
+            if await self.lease.acquire():
+                return True
+            print(f"[TableEngine] Table {self.table_id} is owned by another node, waiting")
+        except Exception as e:
+            print(f"[TableEngine] Lease acquire failed for table {self.table_id}: {e}")
+        return False
+
+    @property
+    def fence(self):
+        return (self.lease.fence_key, self.lease.token)
+
+    def _snapshot(self):
+        # Called by the persister at flush time; the seq always matches the state
+        return dict(self.fsm.to_primitive(), seq=self.seq)
+
+    def _mark_snapshot(self):
+        state_persister.mark_dirty(self.table_id, self.seq, self._snapshot, fence=self.fence)
+        self.unsnapshotted = 0
+
+    async def _restore(self):
+        # Pick the table up where its last owner (or hibernation) left it: the last
+        # snapshot, then whatever actions were logged after it
+        while True:
+            try:
+                saved, log = await redis_client.load_table(
+                    f"table:{self.table_id}:state", f"table:{self.table_id}:actions")
+                break
+            except Exception as e:
+                # Starting empty would overwrite the saved table, so keep trying
+                print(f"[TableEngine] Loading state for table {self.table_id} failed, retrying: {e}")
+                await asyncio.sleep(self.lease.ttl / 2)
+        if saved.get("data"):
+            self.fsm = PokerFSM.from_primitive(self.table_id, saved)
+            self.seq = int(saved.get("seq", 0))
+        started = time.perf_counter()
+        try:
+            replayed = await self.replay(log)
+        except Exception as e:
+            # A tail that can't be replayed must not keep the table from loading: rebuild
+            # from the snapshot, re-apply what did replay and drop the rest (the fresh
+            # snapshot below resets the log)
+            good = self._replayed
+            print(f"[TableEngine] Replay of table {self.table_id} failed after {good} actions, "
+                  f"dropping {len(log) - good} logged entries: {e!r}")
+            self.fsm = PokerFSM.from_primitive(self.table_id, saved) if saved.get("data") else PokerFSM(self.table_id)
+            self.seq = int(saved.get("seq", 0))
+            replayed = await self.replay(log[:good])
+            self.unsnapshotted = 1
+            try:
+                self.seq = max(self.seq, json.loads(log[-1])["seq"])  # never reuse a seq clients saw
+            except (ValueError, KeyError, TypeError):
+                pass
+        if saved.get("data") or replayed:
+            print(f"[TableEngine] Restored table {self.table_id} at seq {self.seq} "
+                  f"({replayed} actions replayed in {(time.perf_counter() - started) * 1000:.1f}ms)")
+        if replayed or self.unsnapshotted:
+            # Fold the replayed tail into a fresh snapshot so the next recovery starts here
+            self._mark_snapshot()
+            await state_persister.flush(self.table_id)
+
+    async def replay(self, log) -> int:
+        # Re-apply logged actions newer than the current seq, without audit writes,
+        # broadcasts or event publishing (the previous owner already did those)
+        replayed = 0
+        self._replayed = 0  # log entries consumed, for recovering from a bad one
+        self.fsm.side_effects = False
+        try:
+            for raw in log:
+                entry = json.loads(raw)
+                if entry["seq"] > self.seq:  # else already part of the snapshot
+                    await self.fsm.apply(entry["action"], rng=ReplayRNG(self.table_id, entry.get("hand")))
+                    self.seq = entry["seq"]
+                    replayed += 1
+                self._replayed += 1
+        finally:
+            self.fsm.side_effects = True
+        return replayed
+
+    async def run(self, after=None):
         print(f"[TableEngine] Starting engine for table {self.table_id}")
+        if after is not None:
+            try:
+                await after
+            except Exception:
+                pass
+        await self._acquire_lease()
+        try:
+            await self._restore()
+        except Exception as e:
+            # Never leave a half-loaded engine registered: get_engine replaces stopped ones
+            print(f"[TableEngine] Restoring table {self.table_id} failed, stopping engine: {e!r}")
+            self.stopped = True
+            await self.lease.release()
+            return
+        self._publish_turn()
+        self.ready.set()
         while True:
-            action = await self.queue.get()
-            print(f"[TableEngine] Processing action: {action}")
+            # Take everything that piled up (up to ENGINE_BATCH_MAX), apply it in order,
+            # then persist and broadcast once for the whole batch
+            batch = [await self.queue.get()]
+            while len(batch) < ENGINE_BATCH_MAX and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            self.processing = True
             try:
-                # Acquire lightweight per-table lock in Redis for cross-process safety
-                # Using the redis_client wrapper which exposes .lock
-                lock = redis_client.lock(f"table-lock:{self.table_id}", timeout=5)
-                async with lock:
-                    # Apply action deterministically via FSM
-                    events, state = await self.fsm.apply(action, rng=self.rng)
-                    
-                    print(f"[TableEngine] FSM returned {len(events)} events")
-                    
-                    # Persist hot state to Redis
-                    await redis_client.hset(f"table:{self.table_id}:state", mapping=state.to_primitive())
-                    
-                    # Publish events to NATS (optional, don't let it crash the game)
-                    for ev in events:
-                        try:
-                            await nats_client.publish(f"table.{self.table_id}.events", ev.to_json())
-                        except Exception as nats_error:
-                            # NATS is optional in development
-                            print(f"[TableEngine] NATS publish failed (non-fatal): {nats_error}")
-                        self.seq += 1
-                    
-                    # Broadcast to connected clients (via WebSocket manager)
-                    # Sanitize state for public view (hide other players' cards)
-                    public_state = state.state.to_dict()
-                    # TODO: Mask hole cards for others in a real impl
-                    
-                    msg = {
-                        "type": "update",
-                        "table_id": self.table_id,
-                        "seq": self.seq,
-                        "state": public_state,
-                        "events": [ev.payload for ev in events]
-                    }
-                    print(f"[TableEngine] Broadcasting update to clients")
-                    await manager.broadcast(self.table_id, msg)
+                if not self.lease.held:
+                    # Renewal failed or another node took over: our state may be stale
+                    print(f"[TableEngine] Lease for table {self.table_id} lost, stopping engine")
+                    self.stopped = True
+                    await self.lease.release()
+                    return
+                events = []
+                traced = []
+                for action, span, queued_ns in batch:
+                    if span is None:  # nearly every action: skip the tracing helpers
+                        events += await self._apply(action)
+                        continue
+                    traced.append(span)
+                    record_wait(span, queued_ns)
+                    with child("fsm.apply", span):
+                        events += await self._apply(action, span)
+                BATCH_ACTIONS.observe(len(batch))
+                view = self._next_view(events)
+
+                boundary = any(ev.type in ("showdown", "hand_started") for ev in events)
+                if boundary or self.unsnapshotted >= STATE_SNAPSHOT_EVERY:
+                    self._mark_snapshot()
+
+                # What follows is shared by the batch: traced under its first traced
+                # action, linked from the others
+                parent = traced[0] if traced else None
+                # Broadcast to connected clients (via WebSocket manager)
+                if view is not None:
+                    with child("engine.broadcast", parent, traced[1:]):
+                        await self._broadcast(view, [ev.payload for ev in events])
+                if boundary:
+                    with child("engine.flush", parent, traced[1:]):
+                        await state_persister.flush(self.table_id)
             except Exception as e:
                 print(f"[TableEngine] Error in action processing: {e}")
                 import traceback
                 traceback.print_exc()
             finally:
-                self.queue.task_done()
+                self._publish_turn()
+                self.processing = False
+                self.last_active = time.monotonic()
+                for _, span, _ in batch:
+                    if span is not None:
+                        end_action(span, batch_size=len(batch))
+                    self.queue.task_done()
+
+    async def _apply(self, action, span=None) -> list:
+        # One action of a batch: apply it, hand its events to the outbox and log it.
+        # Both keep the action's span (if traced) to link their own spans to
+        print(f"[TableEngine] Processing action: {action}")
+        hand_id = getattr(self.fsm, "current_hand_id", None)
+        started = time.perf_counter()
+        try:
+            events, _ = await self.fsm.apply(action, rng=self.rng)
+        except Exception as e:
+            # Only this action is lost; the rest of the batch still applies
+            print(f"[TableEngine] Error applying action {action}: {e!r}")
+            return []
+        finally:
+            FSM_APPLY_SECONDS.observe(time.perf_counter() - started)
+        ACTIONS.inc()
+        if not events:
+            return []  # ignored: the FSM changed nothing, so there is nothing to replay
+
+        # Hand events to the outbox; it publishes to NATS in the background.
+        # The lease token keeps message ids unique across engine restarts.
+        for ev in events:
+            self.seq += 1
+            self.outbox.append(f"{self.table_id}:{self.lease.token}:{self.seq}", ev.to_json(), span)
+            if ev.type == "showdown":
+                HANDS.inc()
+
+        # Persist to Redis (write-behind; flushed right away at hand boundaries): the
+        # action goes to the table's log, with the id and secret of any hand it dealt
+        # so replay deals the same cards; a full snapshot is taken every so often.
+        # The fencing token makes Redis drop the writes if we no longer own the table.
+        # Logged before any I/O, so a failed broadcast can't leave the FSM ahead of the log.
+        entry = {"seq": self.seq, "action": action}
+        if getattr(self.fsm, "current_hand_id", None) != hand_id:
+            entry["hand"] = [self.fsm.current_hand_id, self.fsm.current_hand_secret]
+        state_persister.log_action(self.table_id, self.seq, json.dumps(entry), fence=self.fence, span=span)
+        self.unsnapshotted += 1
+        return events
+
+    def _next_view(self, events):
+        # The delta for the batch just applied (None if it changed nothing). Public view
+        # hides every seat's hole cards; each seat gets its own as a fragment
+        public_state, private = split_private(self.fsm.state.to_public_dict())
+        if self.public_state is None:
+            patch = None
+        else:
+            patch = diff(self.public_state, public_state)
+            if not patch and not events and private == self.private:
+                return None  # ignored action, nothing changed
+            if not events:
+                self.seq += 1  # every state version gets its own seq
+
+        base_seq = self.public_seq if patch is not None else -1
+        self.public_state = public_state
+        self.private = private
+        self.public_seq = self.seq
+        self.snapshot_cache = None
+        return BroadcastView({
+            "type": "delta",
+            "table_id": self.table_id,
+            "seq": self.seq,
+            "base_seq": base_seq,
+            "patch": patch,
+            "events": [ev.payload for ev in events]
+        }, private, event_types=[ev.type for ev in events])
+
+    async def _broadcast(self, view, payloads):
+        print(f"[TableEngine] Broadcasting update to clients")
+        started = time.perf_counter()
+        try:
+            # GraphQL subscriptions get the same encoded view
+            broker.publish(self.table_id, view)
+            # Sockets that did not see base_seq get the full snapshot instead
+            await manager.broadcast_view(self.table_id, view, lambda: self.snapshot_view(payloads))
+            # Other shard processes relay it to sockets attached there
+            await router.publish_view(self.table_id, view)
+        finally:
+            BROADCAST_SECONDS.observe(time.perf_counter() - started)
+
+    def public_snapshot(self):
+        # Client-facing state (hole cards masked) as of the last broadcast; don't mutate
+        if self.public_state is None:
+            self.public_state, self.private = split_private(self.fsm.state.to_public_dict())
+            self.public_seq = self.seq
+        return self.public_state
+
+    def snapshot_view(self, events=None):
+        # Full state for connects, resyncs and clients that missed a delta. The
+        # event-less snapshot is encoded once per seq and shared by every connect.
+        self.public_snapshot()
+        if not events and self.snapshot_cache is not None and self.snapshot_cache.seq == self.public_seq:
+            return self.snapshot_cache
+        view = BroadcastView({
+            "type": "snapshot",
+            "table_id": self.table_id,
+            "seq": self.public_seq,
+            "state": self.public_state,
+            "events": events or []
+        }, self.private)
+        if not events:
+            self.snapshot_cache = view
+        return view
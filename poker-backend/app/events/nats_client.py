@@ -1,6 +1,7 @@
 import os
 import nats
 from nats.js import JetStreamContext
+from app.telemetry.metrics import timed
 
 NATS_URL = os.getenv("NATS_URL", "nats://localhost:4222")
 
@@ -13,13 +14,38 @@ class NatsClient:
         self.nc = await nats.connect(NATS_URL)
         self.js = self.nc.jetstream()
 
-    async def publish(self, subject, payload):
+    async def publish(self, subject, payload, msg_id=None):
         if not self.js:
             await self.connect()
         # payload should be bytes
         if isinstance(payload, str):
             payload = payload.encode()
-        await self.js.publish(subject, payload)
+        # JetStream drops a repeated Nats-Msg-Id within its dedup window
+        headers = {"Nats-Msg-Id": msg_id} if msg_id else None
+        await self.js.publish(subject, payload, headers=headers)
+
+    # Core NATS (no JetStream persistence) for shard-to-shard traffic
+
+    async def publish_core(self, subject, payload):
+        if not self.nc:
+            await self.connect()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        with timed("nats", "publish_core"):
+            await self.nc.publish(subject, payload)
+
+    async def request(self, subject, payload, timeout=1.0):
+        if not self.nc:
+            await self.connect()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        with timed("nats", "request"):
+            return await self.nc.request(subject, payload, timeout=timeout)
+
+    async def subscribe(self, subject, cb):
+        if not self.nc:
+            await self.connect()
+        return await self.nc.subscribe(subject, cb=cb)
 
     async def close(self):
         if self.nc:
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Optional
+from app.events.nats_client import nats_client
+from app.telemetry.metrics import EVENTS_DROPPED, EVENTS_PUBLISHED, io_metrics
+from app.telemetry.tracing import background
+
+# Events buffered per table before the oldest are dropped
+EVENT_OUTBOX_MAX = int(os.getenv("EVENT_OUTBOX_MAX", "10000"))
+# Publishes in flight at once (acks awaited concurrently)
+EVENT_PUBLISH_BATCH = int(os.getenv("EVENT_PUBLISH_BATCH", "64"))
+# Back-off after a batch with failures, doubled up to EVENT_RETRY_MAX_DELAY
+EVENT_RETRY_DELAY = float(os.getenv("EVENT_RETRY_DELAY", "0.1"))
+EVENT_RETRY_MAX_DELAY = float(os.getenv("EVENT_RETRY_MAX_DELAY", "5"))
+
+
+class EventOutbox:
+    """Per-table buffer between the engine and JetStream.
+
+    The engine appends without awaiting anything. A background task publishes
+    the buffer in batches with all acks in flight together; a traced batch
+    links to the action spans whose events it carries. A batch is only
+    trimmed up to its first failure, so per-subject order is kept; anything
+    re-sent after a partial failure is deduplicated by JetStream on the
+    Nats-Msg-Id header.
+    """
+
+    def __init__(self, subject: str, max_size: int = EVENT_OUTBOX_MAX, batch_size: int = EVENT_PUBLISH_BATCH):
+        self.subject = subject
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.buffer = deque()  # (msg_id, payload, span of the action that produced it or None)
+        self.published = 0
+        self.dropped = 0
+        self.failures = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def append(self, msg_id: str, payload, span=None):
+        if len(self.buffer) >= self.max_size:
+            self.buffer.popleft()
+            self.dropped += 1
+            EVENTS_DROPPED.inc()
+            if self.dropped % 1000 == 1:
+                print(f"[EventOutbox] {self.subject} full, dropped {self.dropped} events so far")
+        self.buffer.append((msg_id, payload, span))
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    async def _run(self):
+        delay = EVENT_RETRY_DELAY
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.buffer:
+                if await self.publish_batch():
+                    delay = EVENT_RETRY_DELAY
+                else:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, EVENT_RETRY_MAX_DELAY)
+
+    async def publish_batch(self) -> bool:
+        batch = [self.buffer[i] for i in range(min(self.batch_size, len(self.buffer)))]
+        started = time.perf_counter()
+        # Runs apart from the engine, so traced on its own and linked to the actions
+        links = dict.fromkeys(span for _, _, span in batch if span is not None)
+        with background("outbox.publish", links, subject=self.subject, events=len(batch)):
+            results = await asyncio.gather(
+                *(nats_client.publish(self.subject, payload, msg_id=msg_id) for msg_id, payload, _ in batch),
+                return_exceptions=True,
+            )
+        sent = 0
+        for result in results:
+            if isinstance(result, BaseException):
+                self.failures += 1
+                io_metrics("nats", "publish")[1].inc()
+                print(f"[EventOutbox] Publish to {self.subject} failed, will retry: {result}")
+                break
+            sent += 1
+        # Drop what was acknowledged, unless the bounded buffer already evicted it
+        for item in batch[:sent]:
+            if self.buffer and self.buffer[0] is item:
+                self.buffer.popleft()
+        self.published += sent
+        EVENTS_PUBLISHED.inc(sent)
+        io_metrics("nats", "publish")[0].observe(time.perf_counter() - started)  # the whole batch
+        return sent == len(results)
+
+    async def close(self, timeout: float = 2.0):
+        # Give the publisher a bounded chance to drain, then stop it
+        if self._task is not None:
+            deadline = asyncio.get_running_loop().time() + timeout
+            while self.buffer and asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(0.01)
+            self._task.cancel()
+            self._task = None
+        if self.buffer:
+            print(f"[EventOutbox] {self.subject} closed with {len(self.buffer)} unpublished events")
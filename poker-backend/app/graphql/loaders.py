@@ -0,0 +1,64 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from strawberry.dataloader import DataLoader
+from app.engine.registry import engines
+from app.storage.redis_client import redis_client
+from app.ws.views import split_private
+
+# How long a table state read from Redis is reused by later requests (seconds)
+TABLE_CACHE_TTL = float(os.getenv("TABLE_CACHE_TTL", "1.0"))
+TABLE_CACHE_MAX = int(os.getenv("TABLE_CACHE_MAX", "10000"))
+
+# table_id -> (expires_at, public state or None); process-wide, shared by all requests
+_cache: Dict[str, Tuple[float, Optional[dict]]] = {}
+
+
+def _public(data: Optional[str]) -> Optional[dict]:
+    # Persisted state as clients see it: no deck, hole cards masked
+    if not data:
+        return None
+    state = json.loads(data)
+    state.pop("deck", None)
+    return split_private(state)[0]
+
+
+async def load_tables(table_ids: List[str]) -> List[Optional[dict]]:
+    """Public state for every table id a request asked for, in one pass.
+
+    Tables hosted here are read from their engine; the rest come from a single
+    Redis pipeline, or from the short-TTL cache if another request just read them.
+    """
+    now = time.monotonic()
+    found: Dict[str, Optional[dict]] = {}
+    missing = []
+    for table_id in table_ids:
+        engine = engines.get(table_id)
+        if engine is not None and engine.ready.is_set() and not engine.stopped:
+            found[table_id] = engine.public_snapshot()
+            continue
+        cached = _cache.get(table_id)
+        if cached is not None and cached[0] > now:
+            found[table_id] = cached[1]
+        else:
+            missing.append(table_id)
+
+    if missing:
+        states = await redis_client.load_states([f"table:{t}:state" for t in missing])
+        if len(_cache) + len(missing) > TABLE_CACHE_MAX:
+            _cache.clear()
+        for table_id, data in zip(missing, states):
+            state = found[table_id] = _public(data)
+            _cache[table_id] = (now + TABLE_CACHE_TTL, state)
+    return [found[t] for t in table_ids]
+
+
+def table_loader(context) -> DataLoader:
+    # One loader per request (it caches per request too); created on first use
+    if not isinstance(context, dict):
+        return DataLoader(load_fn=load_tables)
+    loader = context.get("table_loader")
+    if loader is None:
+        loader = context["table_loader"] = DataLoader(load_fn=load_tables)
+    return loader
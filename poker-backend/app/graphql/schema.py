@@ -1,23 +1,26 @@
 import strawberry
-from typing import List, Optional
+from typing import AsyncGenerator, List, Optional
 from datetime import datetime
 import asyncio
-from app.engine.table_engine import TableEngine
 
-# Global engine registry (In-memory for single node, use Redis/NATS routing for distributed)
-engines = {}
-
-def get_engine(table_id):
-    if table_id not in engines:
-        engines[table_id] = TableEngine(table_id)
-        asyncio.create_task(engines[table_id].run())
-    return engines[table_id]
+# Engine registry lives in app.engine.registry; re-exported for existing imports
+from app.engine.registry import engines, get_engine
+from app.engine.sharding import router
+from app.ws.broker import broker
+from app.ws.manager import manager
+from app.ws.views import new_seat_token, seat_key
+from app.graphql.loaders import table_loader
+from app.engine.admission import client_bucket
+from app.telemetry.tracing import fail_action, start_action
 
 @strawberry.type
 class Player:
     id: strawberry.ID
     username: str
     chips: int
+    current_bet: int
+    has_folded: bool
+    is_active: bool
 
 @strawberry.type
 class Card:
@@ -29,13 +32,40 @@ class TableState:
     table_id: strawberry.ID
     pot: int
     phase: str
-    # Simplified for GraphQL return, real state is complex
-    
+    min_bet: int
+    dealer_index: int
+    current_turn_index: Optional[int]
+    community_cards: List[Card]
+    players: List[Player]
+
+    @classmethod
+    def from_state(cls, state: dict) -> "TableState":
+        # From the client-facing state dict (hole cards already masked)
+        return cls(
+            table_id=state["table_id"],
+            pot=state["pot"],
+            phase=state["phase"],
+            min_bet=state.get("min_bet", 20),
+            dealer_index=state.get("dealer_index", 0),
+            current_turn_index=state.get("current_turn_index"),
+            community_cards=[Card(rank=c["rank"], suit=c["suit"]) for c in state.get("community_cards", [])],
+            players=[Player(id=p["id"], username=p["username"], chips=p["chips"],
+                            current_bet=p.get("current_bet", 0), has_folded=p.get("has_folded", False),
+                            is_active=p.get("is_active", True)) for p in state.get("players", [])],
+        )
+
 @strawberry.type
 class Query:
+    # Every table id in a request is batched into one lookup (see app.graphql.loaders)
     @strawberry.field
-    async def table(self, table_id: strawberry.ID) -> Optional[TableState]:
-        return None
+    async def table(self, info: strawberry.Info, table_id: strawberry.ID) -> Optional[TableState]:
+        state = await table_loader(info.context).load(table_id)
+        return TableState.from_state(state) if state is not None else None
+
+    @strawberry.field
+    async def tables(self, info: strawberry.Info, table_ids: List[strawberry.ID]) -> List[Optional[TableState]]:
+        states = await table_loader(info.context).load_many(table_ids)
+        return [TableState.from_state(s) if s is not None else None for s in states]
 
 @strawberry.input
 class JoinTableInput:
@@ -50,40 +80,110 @@ class ActionInput:
     action: str
     amount: Optional[int] = None
 
+@strawberry.type
+class JoinedSeat:
+    player_id: strawberry.ID
+    # Pass to tableUpdates (or ?seat_token= on /ws) to receive this seat's hole cards
+    seat_token: str
+
+def _caller(info: strawberry.Info):
+    # The HTTP/WebSocket connection the operation arrived on, for rate limits
+    request = info.context.get("request") if isinstance(info.context, dict) else None
+    return getattr(request, "client", None)
+
+async def _route(table_id: str, action: dict, span_name: str):
+    # Traced from here until the engine has broadcast the result (see app.telemetry.tracing)
+    span = start_action(span_name, table_id, action)
+    try:
+        return await router.route(table_id, action, span=span)
+    except Exception as e:
+        fail_action(span, e)
+        raise
+
+async def _join(info: strawberry.Info, input: JoinTableInput) -> JoinedSeat:
+    # Forwarded to the shard that owns the table (local enqueue when unsharded).
+    # Rate limited like actions: every join adds a seat
+    if not client_bucket(_caller(info)).take():
+        raise ValueError("Join rejected: rate limited")
+    player_id = f"p-{input.username}" # Simple ID gen
+    token, key = new_seat_token()
+    action = {
+        "action": "join",
+        "player_id": player_id,
+        "username": input.username,
+        "buyin": input.buyin,
+        "seat_key": key
+    }
+    reason = await _route(input.table_id, action, "graphql.join_table")
+    if reason is not None:
+        raise ValueError(f"Join rejected: {reason}")
+    return JoinedSeat(player_id=player_id, seat_token=token)
+
 @strawberry.type
 class Mutation:
     @strawberry.mutation
-    async def join_table(self, input: JoinTableInput) -> bool:
-        engine = get_engine(input.table_id)
-        await engine.enqueue({
-            "action": "join",
-            "player_id": f"p-{input.username}", # Simple ID gen
-            "username": input.username,
-            "buyin": input.buyin
-        })
+    async def join_table(self, info: strawberry.Info, input: JoinTableInput) -> bool:
+        # False if the join was turned away (see perform_action). Kept for existing
+        # clients; joinSeat also returns the seat token that unlocks the hole cards
+        try:
+            await _join(info, input)
+        except ValueError:
+            return False
         return True
 
     @strawberry.mutation
-    async def perform_action(self, input: ActionInput) -> bool:
-        engine = get_engine(input.table_id)
-        await engine.enqueue({
+    async def join_seat(self, info: strawberry.Info, input: JoinTableInput) -> JoinedSeat:
+        return await _join(info, input)
+
+    @strawberry.mutation
+    async def perform_action(self, info: strawberry.Info, input: ActionInput) -> bool:
+        # False if the action was turned away before reaching the table (rate limit,
+        # not this player's turn, table busy; see app.engine.admission)
+        if not client_bucket(_caller(info)).take():
+            return False
+        reason = await _route(input.table_id, {
             "action": input.action,
             "player_id": input.player_id,
             "amount": input.amount
-        })
-        return True
+        }, "graphql.perform_action")
+        return reason is None
 
 @strawberry.type
 class TableUpdate:
     table_id: strawberry.ID
+    seq: int
+    # The same JSON snapshot/delta message the /ws/{table_id} endpoint sends
     payload: str
 
 @strawberry.type
 class Subscription:
     @strawberry.subscription
-    async def table_updates(self, table_id: strawberry.ID) -> TableUpdate:
-        while True:
-            await asyncio.sleep(1)
-            yield TableUpdate(table_id=table_id, payload="ping")
+    async def table_updates(self, table_id: strawberry.ID, player_id: Optional[strawberry.ID] = None,
+                            seat_token: Optional[str] = None,
+                            types: Optional[List[str]] = None) -> AsyncGenerator[TableUpdate, None]:
+        # Unfiltered: a snapshot, then every delta after it. With `types` (hand event
+        # types such as "player_action" or "showdown") only updates carrying one of them.
+        # The stream ends if the subscriber falls too far behind; resubscribe to resync.
+        # Hole cards are only included with the seat token returned by joinSeat.
+        key = seat_key(seat_token)
+        sub = None
+        try:
+            sub = broker.subscribe(table_id, types, player_id)
+            await router.watch(table_id)
+            last = -1
+            if not types:
+                view = await router.snapshot(table_id)
+                if view is not None:
+                    last = view.seq
+                    yield TableUpdate(table_id=table_id, seq=view.seq, payload=view.for_player(player_id, key))
+            async for view in sub:
+                if view.seq <= last:
+                    continue  # already in the snapshot
+                yield TableUpdate(table_id=table_id, seq=view.seq, payload=view.for_player(player_id, key))
+        finally:
+            if sub is not None:
+                broker.unsubscribe(sub)
+            if not manager.has_connections(table_id) and not broker.has_subscribers(table_id):
+                await router.unwatch(table_id)
 
 schema = strawberry.Schema(query=Query, mutation=Mutation, subscription=Subscription)
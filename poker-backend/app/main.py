@@ -1,8 +1,19 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import json
+from typing import Optional
+from fastapi import FastAPI, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from strawberry.asgi import GraphQL
 from app.graphql.schema import schema
 from app.ws.manager import manager
+from app.ws.broker import broker
+from app.ws.views import BroadcastView, new_seat_token, seat_key, split_private
+from app.ws.wire import dumps_json, get_format
+from app.engine.admission import TokenBucket, client_bucket
+from app.engine.evaluator import get_evaluator
+from app.engine.sharding import router
+from app.engine.registry import touch
+from app.telemetry.tracing import fail_action, start_action
 
 app = FastAPI()
 
@@ -19,50 +30,140 @@ graphql_app = GraphQL(schema, subscription_protocols=["graphql-ws"])
 app.add_route("/graphql", graphql_app)
 app.add_websocket_route("/graphql", graphql_app)
 
+@app.get("/metrics")
+def metrics():
+    # Prometheus scrape endpoint (see app.telemetry.metrics)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.on_event("startup")
+async def startup():
+    # Build (or map) the hand evaluator tables once, before the first showdown
+    get_evaluator()
+    # Listen for actions forwarded by other shards (no-op without SHARD_NODES)
+    await router.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Hand table leases back and write out any state and audit rows still buffered
+    from app.graphql.schema import engines
+    from app.storage.state_persister import state_persister
+    from app.storage.audit_writer import audit_writer
+    from app.telemetry.tracing import flush
+    for engine in list(engines.values()):
+        await engine.stop()
+    await state_persister.close()
+    await audit_writer.close()
+    flush()  # traces still queued for export
+
+async def send_snapshot(websocket: WebSocket, table_id: str):
+    # Full state on connect or resync; deltas follow from the snapshot's seq
+    view = await router.snapshot(table_id)
+    if view is not None:
+        await manager.send_view(websocket, view)
+        return
+
+    # No engine hosts the table right now: fall back to the last state persisted in Redis
+    from app.storage.redis_client import redis_client
+
+    # Get the raw JSON string from the 'data' field of the hash
+    data = await redis_client.redis.hget(f"table:{table_id}:state", "data")
+    if data:
+        state = json.loads(data)
+        state.pop("deck", None)
+        public_state, private = split_private(state)
+        await manager.send_view(websocket, BroadcastView({
+            "type": "snapshot", 
+            "table_id": table_id,
+            "seq": 0, 
+            "state": public_state,
+            "events": []
+        }, private))
+
+async def send_rejection(websocket: WebSocket, action: dict, reason: str):
+    # Turned away before reaching the table (see app.engine.admission); only this client hears
+    await manager.send_view(websocket, BroadcastView.from_encoded(dumps_json({
+        "type": "rejected", "action": action.get("action"), "reason": reason}), None))
+
+async def receive_message(websocket: WebSocket, fmt) -> dict:
+    # Text frames are JSON; binary clients may also send in the format they receive
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return fmt.decode(message["bytes"])
+    return json.loads(message["text"])
+
 @app.websocket("/ws/{table_id}")
-async def websocket_endpoint(websocket: WebSocket, table_id: str):
-    await manager.connect(websocket, table_id)
+async def websocket_endpoint(websocket: WebSocket, table_id: str, player_id: Optional[str] = None,
+                             seat_token: Optional[str] = None,
+                             wire_format: Optional[str] = Query(None, alias="format")):
+    # Seated clients reconnect with ?player_id=...&seat_token=... (the token they were
+    # issued on join) to receive their own hole cards; a player id alone is a spectator.
+    # ?format=msgpack switches the socket to binary frames (see app.ws.wire)
+    fmt = get_format(wire_format)
+    await manager.connect(websocket, table_id, player_id, seat_key(seat_token), fmt)
+    # Relay broadcasts if another shard owns the table
+    await router.watch(table_id)
+    bucket = TokenBucket()  # this connection's action allowance
     
-    # Send initial state from Redis if available
+    # Send initial state
     try:
-        from app.storage.redis_client import redis_client
-        from app.graphql.schema import get_engine
-        import json
-        
-        # Get the raw JSON string from the 'data' field of the hash
-        data = await redis_client.redis.hget(f"table:{table_id}:state", "data")
-        if data:
-            state = json.loads(data)
-            await websocket.send_json({
-                "type": "update", 
-                "table_id": table_id,
-                "seq": 0, 
-                "state": state,
-                "events": []
-            })
+        await send_snapshot(websocket, table_id)
     except Exception as e:
         print(f"Error sending initial state: {e}")
 
     try:
         while True:
-            data = await websocket.receive_json()
+            data = await receive_message(websocket, fmt)
             print(f"[WS] Received message: {data}")
             
             # Route action to TableEngine
             if data.get("type") == "action":
                 try:
-                    from app.graphql.schema import get_engine
+                    # Joins also share their host's bucket: opening more sockets
+                    # mustn't mean more seats
+                    if not bucket.take() or (data.get("action") == "join" and not client_bucket(websocket.client).take()):
+                        await send_rejection(websocket, data, "rate limited")
+                        continue
                     print(f"[WS] Routing action to engine for table {table_id}")
-                    engine = get_engine(table_id)
-                    await engine.enqueue(data)
+                    data.pop("seat_key", None)  # only ever set here
+                    token = None
+                    if data.get("action") == "join" and data.get("player_id"):
+                        # The seat keeps the key of the first successful join; a token
+                        # issued for a join that is rejected unlocks nothing
+                        token, data["seat_key"] = new_seat_token()
+                    span = start_action("ws.action", table_id, data)
+                    try:
+                        reason = await router.route(table_id, data, span=span)
+                    except Exception as e:
+                        fail_action(span, e)
+                        raise
+                    if reason is not None:
+                        await send_rejection(websocket, data, reason)
+                        continue
+                    if token is not None:
+                        manager.bind_player(websocket, data["player_id"], data["seat_key"])
+                        await manager.send_view(websocket, BroadcastView.from_encoded(dumps_json({
+                            "type": "seat", "player_id": data["player_id"], "seat_token": token}), None))
                     print(f"[WS] Action enqueued successfully")
                 except Exception as e:
                     print(f"[WS] Error processing action: {e}")
                     import traceback
                     traceback.print_exc()
+            elif data.get("type") == "resync":
+                # Client saw a seq gap; resend the full state
+                try:
+                    await send_snapshot(websocket, table_id)
+                except Exception as e:
+                    print(f"[WS] Error sending resync snapshot: {e}")
     except WebSocketDisconnect:
         print(f"[WS] Client disconnected from table {table_id}")
+    finally:
+        # Also reached when the manager dropped a stuck client or the socket errored
         await manager.disconnect(websocket, table_id)
+        if not manager.has_connections(table_id) and not broker.has_subscribers(table_id):
+            await router.unwatch(table_id)
+            touch(table_id)  # idle TTL counts from when the table was last watched
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
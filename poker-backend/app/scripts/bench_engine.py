@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+from app.engine.fsm import PokerFSM
+from app.engine.rng import DeterministicRNG
+from app.engine.table_engine import TableEngine
+from app.events.nats_client import nats_client
+from app.storage.audit_writer import audit_writer
+from app.storage.lease import TableLease
+from app.storage.pg import pg_client
+from app.storage.redis_client import redis_client
+from app.storage.state_persister import state_persister
+
+# Headless throughput benchmark: scripted bots play many tables through
+# PokerFSM.apply and through the TableEngine run loop, with Redis, NATS and
+# Postgres stubbed out. Compares against a saved baseline and exits 1 on a
+# regression, so it can gate CI:
+#
+#   python -m app.scripts.bench_engine                  # run and compare
+#   python -m app.scripts.bench_engine --save-baseline  # record this machine's numbers
+#
+# Baselines are machine specific; re-save them when the hardware changes.
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "bench_baseline.json")
+BUYIN = 1000
+
+# Metrics where bigger is better; everything else (latency, allocations) must not grow
+HIGHER_IS_BETTER = ("actions_per_sec", "hands_per_sec")
+
+
+def passive(state, player, rng):
+    # Calling station: never folds, never raises
+    to_call = max(p.current_bet for p in state.players) - player.current_bet
+    return {"action": "call" if to_call else "check"}
+
+
+def aggressive(state, player, rng):
+    # Raises often and folds rarely
+    current = max(p.current_bet for p in state.players)
+    roll = rng.random()
+    if roll < 0.4:
+        return {"action": "raise", "amount": current + state.min_bet * rng.randint(1, 4)}
+    if roll < 0.45 and current > player.current_bet:
+        return {"action": "fold"}
+    return {"action": "call" if current > player.current_bet else "check"}
+
+
+def random_policy(state, player, rng):
+    current = max(p.current_bet for p in state.players)
+    roll = rng.random()
+    if roll < 0.15:
+        return {"action": "fold"}
+    if roll < 0.3:
+        return {"action": "raise", "amount": current + state.min_bet}
+    return {"action": "call" if current > player.current_bet else "check"}
+
+
+POLICIES = [passive, aggressive, random_policy]
+
+
+def next_action(state, rng):
+    # The seat to act picks with its own policy (seats cycle through POLICIES)
+    idx = state.current_turn_index
+    player = state.players[idx]
+    action = POLICIES[idx % len(POLICIES)](state, player, rng)
+    action["player_id"] = player.id
+    return action
+
+
+def rebuy(state):
+    # Keep stacks playable so tables don't stall with everyone all-in for zero
+    for p in state.players:
+        if p.chips < state.min_bet * 5:
+            p.chips = BUYIN
+
+
+def join_actions(table, seats):
+    return [{"action": "join", "player_id": f"bot-{table}-{i}", "username": f"bot{i}", "buyin": BUYIN}
+            for i in range(seats)]
+
+
+@contextlib.contextmanager
+def offline():
+    """Stub the network edges (Redis lease/state, NATS, Postgres); everything else runs for real."""
+    async def acquire(lease):
+        lease.token = 1
+        lease.expires_at = float("inf")
+        return True
+
+    async def release(lease):
+        lease.token = None
+
+    async def flush(table_id=None):
+        state_persister.dirty.clear()
+        state_persister.logs.clear()
+
+    async def noop(*args, **kwargs):
+        return None
+
+    async def no_saved_state(state_key, log_key):
+        return {}, []
+
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(mock.patch.object(TableLease, "acquire", acquire))
+        stack.enter_context(mock.patch.object(TableLease, "release", release))
+        stack.enter_context(mock.patch.object(state_persister, "flush", flush))
+        stack.enter_context(mock.patch.object(redis_client, "load_table", no_saved_state))
+        stack.enter_context(mock.patch.object(nats_client, "publish", noop))
+        stack.enter_context(mock.patch.object(pg_client, "connect", noop))
+        stack.enter_context(mock.patch.object(pg_client, "log_hands", noop))
+        # The engine logs every action; keep that out of the terminal (not out of the timing)
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        stack.enter_context(contextlib.redirect_stdout(devnull))
+        yield
+
+
+def percentile(sorted_ns, pct):
+    if not sorted_ns:
+        return 0.0
+    idx = min(len(sorted_ns) - 1, int(len(sorted_ns) * pct / 100))
+    return sorted_ns[idx] / 1000  # microseconds
+
+
+def summarize(latencies_ns, hands, elapsed, actions=None):
+    # `actions` defaults to one per latency sample
+    latencies_ns.sort()
+    actions = len(latencies_ns) if actions is None else actions
+    return {
+        "actions": actions,
+        "hands": hands,
+        "actions_per_sec": round(actions / elapsed, 1),
+        "hands_per_sec": round(hands / elapsed, 1),
+        "p50_us": round(percentile(latencies_ns, 50), 2),
+        "p99_us": round(percentile(latencies_ns, 99), 2),
+    }
+
+
+async def bench_fsm(tables: int, seats: int, actions: int, seed: int = 0) -> dict:
+    """Drive `tables` PokerFSMs round-robin, `actions` bot actions each."""
+    rng = random.Random(seed)
+    fsms = []
+    for t in range(tables):
+        fsm = PokerFSM(f"bench-{t}")
+        table_rng = DeterministicRNG(seed + t)
+        for join in join_actions(t, seats):
+            await fsm.apply(join, table_rng)
+        fsms.append((fsm, table_rng))
+
+    latencies = []
+    hands = 0
+    started = time.perf_counter()
+    for _ in range(actions):
+        for fsm, table_rng in fsms:
+            action = next_action(fsm.state, rng)
+            t0 = time.perf_counter_ns()
+            events, _ = await fsm.apply(action, table_rng)
+            latencies.append(time.perf_counter_ns() - t0)
+            for ev in events:
+                if ev.type == "showdown":
+                    hands += 1
+                    rebuy(fsm.state)
+    return summarize(latencies, hands, time.perf_counter() - started)
+
+
+async def bench_engine(tables: int, seats: int, actions: int, seed: int = 0) -> dict:
+    """Drive `tables` live TableEngines round-robin; latency is enqueue to processed.
+
+    Every engine's run task is alive for the whole run, but only one action is in
+    flight at a time, so latency is the run loop's service time rather than time
+    spent queued behind other tables.
+    """
+    rng = random.Random(seed)
+    latencies = []
+    hands = 0
+
+    engines = [TableEngine(f"bench-engine-{t}") for t in range(tables)]
+    for engine in engines:
+        engine.start()
+    try:
+        hand_ids = []
+        for t, engine in enumerate(engines):
+            for join in join_actions(t, seats):
+                await engine.enqueue(join)
+            await engine.queue.join()
+            hand_ids.append(engine.fsm.current_hand_id)
+
+        started = time.perf_counter()
+        for _ in range(actions):
+            for t, engine in enumerate(engines):
+                action = next_action(engine.fsm.state, rng)
+                t0 = time.perf_counter_ns()
+                await engine.enqueue(action)
+                await engine.queue.join()
+                latencies.append(time.perf_counter_ns() - t0)
+                if engine.fsm.current_hand_id != hand_ids[t]:
+                    # A hand finished and the next one was dealt
+                    hand_ids[t] = engine.fsm.current_hand_id
+                    hands += 1
+                    rebuy(engine.fsm.state)
+        elapsed = time.perf_counter() - started
+    finally:
+        for engine in engines:
+            await engine.stop()
+    return summarize(latencies, hands, elapsed)
+
+
+async def plan_burst(engine: TableEngine, size: int, rng) -> list:
+    # The table's next `size` bot actions, worked out on a copy of its FSM. Stops after
+    # the action that ends the hand: the next hand's cards aren't known in advance.
+    shadow = PokerFSM.from_primitive(engine.table_id, engine.fsm.to_primitive())
+    shadow.side_effects = False
+    shadow_rng = DeterministicRNG(engine.table_id)
+    planned = []
+    while len(planned) < size:
+        action = next_action(shadow.state, rng)
+        planned.append(action)
+        events, _ = await shadow.apply(dict(action), shadow_rng)
+        if any(ev.type == "showdown" for ev in events):
+            break
+    return planned
+
+
+async def bench_engine_burst(tables: int, seats: int, actions: int, burst: int, seed: int = 0) -> dict:
+    """Like bench_engine, but up to `burst` actions are queued at once before the engine
+    runs, so its loop applies them as one batch. Latency is per burst, from queueing it
+    to its last action processed; throughput counts only that time (not the planning).
+    """
+    rng = random.Random(seed)
+    latencies = []
+    hands = 0
+    applied = 0
+
+    engines = [TableEngine(f"bench-burst-{t}") for t in range(tables)]
+    for engine in engines:
+        engine.start()
+    try:
+        hand_ids = []
+        for t, engine in enumerate(engines):
+            for join in join_actions(t, seats):
+                await engine.enqueue(join)
+            await engine.queue.join()
+            hand_ids.append(engine.fsm.current_hand_id)
+
+        remaining = [actions] * tables
+        while any(remaining):
+            for t, engine in enumerate(engines):
+                if not remaining[t]:
+                    continue
+                planned = await plan_burst(engine, min(burst, remaining[t]), rng)
+                t0 = time.perf_counter_ns()
+                for action in planned:
+                    await engine.enqueue(action)
+                await engine.queue.join()
+                latencies.append(time.perf_counter_ns() - t0)
+                remaining[t] -= len(planned)
+                applied += len(planned)
+                if engine.fsm.current_hand_id != hand_ids[t]:
+                    hand_ids[t] = engine.fsm.current_hand_id
+                    hands += 1
+                    rebuy(engine.fsm.state)
+    finally:
+        for engine in engines:
+            await engine.stop()
+    return summarize(latencies, hands, sum(latencies) / 1e9, actions=applied)
+
+
+async def bench_allocations(tables: int, seats: int, actions: int, seed: int = 0) -> dict:
+    """Allocated blocks still live per action and peak traced memory, over a warmed-up FSM run."""
+    await bench_fsm(min(tables, 10), seats, 10, seed)  # warm caches, evaluator, imports
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        result = await bench_fsm(tables, seats, actions, seed)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(s.count_diff for s in stats if s.count_diff > 0)
+    return {
+        "retained_blocks_per_action": round(blocks / max(result["actions"], 1), 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+async def best_of(repeat: int, bench, *args) -> dict:
+    # Timings on a shared machine are noisy; keep the fastest of a few runs
+    runs = [await bench(*args) for _ in range(repeat)]
+    return max(runs, key=lambda r: r["actions_per_sec"])
+
+
+async def run_all(tables: int, seats: int, actions: int, seed: int = 0, repeat: int = 3,
+                  burst: int = 16) -> dict:
+    with offline():
+        try:
+            await bench_fsm(min(tables, 10), seats, 10, seed)  # warm up the evaluator and imports
+            return {
+                "fsm": await best_of(repeat, bench_fsm, tables, seats, actions, seed),
+                "engine": await best_of(repeat, bench_engine, tables, seats, actions, seed),
+                "engine_burst": await best_of(repeat, bench_engine_burst, tables, seats, actions, burst, seed),
+                "allocations": await bench_allocations(max(tables // 10, 1), seats, actions, seed),
+            }
+        finally:
+            # Stop the background writers while their I/O is still stubbed
+            await audit_writer.close()
+            await state_persister.close()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Return a message per metric that regressed by more than `tolerance` (a fraction)."""
+    regressions = []
+    for section, metrics in baseline.items():
+        if not isinstance(metrics, dict):
+            continue
+        for name, expected in metrics.items():
+            actual = results.get(section, {}).get(name)
+            if actual is None or name in ("actions", "hands") or not expected:
+                continue
+            if name in HIGHER_IS_BETTER:
+                bad = actual < expected * (1 - tolerance)
+            else:
+                bad = actual > expected * (1 + tolerance)
+            if bad:
+                regressions.append(f"{section}.{name}: {actual} vs baseline {expected}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the table engine offline with bot players")
+    parser.add_argument("--tables", type=int, default=1000)
+    parser.add_argument("--seats", type=int, default=4)
+    parser.add_argument("--actions", type=int, default=30, help="bot actions per table")
+    parser.add_argument("--burst", type=int, default=16, help="actions queued at once in the burst benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the fastest is reported")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.35, help="allowed regression, as a fraction")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_all(args.tables, args.seats, args.actions, args.seed, args.repeat, args.burst))
+    results["config"] = {"tables": args.tables, "seats": args.seats, "actions": args.actions, "burst": args.burst}
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != results["config"]:
+        print(f"Baseline was recorded with {baseline.get('config')}; comparing anyway")
+    regressions = compare(results, baseline, args.tolerance)
+    for r in regressions:
+        print(f"REGRESSION {r}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Start N single-worker uvicorn processes that split tables between them by
+# consistent hashing of table_id. Each gets its own SHARD_ID and port; any of
+# them can accept a client, which is forwarded to (or relayed from) the owner.
+
+def main():
+    parser = argparse.ArgumentParser(description="Run sharded poker backend processes")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--base-port", type=int, default=8000)
+    args = parser.parse_args()
+
+    nodes = [f"shard-{i}" for i in range(args.shards)]
+    procs = []
+    for i, node in enumerate(nodes):
+        env = dict(os.environ, SHARD_ID=node, SHARD_NODES=",".join(nodes), NODE_ID=node)
+        port = args.base_port + i
+        print(f"Starting {node} on port {port}")
+        procs.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", args.host, "--port", str(port)],
+            env=env,
+        ))
+
+    try:
+        for p in procs:
+            p.wait()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+
+if __name__ == "__main__":
+    main()
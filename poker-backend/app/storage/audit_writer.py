@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+from typing import Optional
+from app.storage.pg import pg_client
+from app.telemetry.metrics import timed
+
+# Hands waiting to be written before new ones are rejected
+AUDIT_QUEUE_MAX = int(os.getenv("AUDIT_QUEUE_MAX", "10000"))
+# Rows per COPY, and the longest a hand waits for its batch to fill (seconds)
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5"))
+# Attempts per batch before it is given up on
+AUDIT_MAX_ATTEMPTS = int(os.getenv("AUDIT_MAX_ATTEMPTS", "3"))
+
+
+class AuditWriter:
+    """Takes finished-hand audit rows off the table's path.
+
+    Tables submit rows without waiting; a background task bulk-inserts them
+    into game_audit in batches, on a timer or as soon as a batch fills up.
+    """
+
+    def __init__(self, max_queue: int = AUDIT_QUEUE_MAX, batch_size: int = AUDIT_BATCH_SIZE,
+                 interval: float = AUDIT_FLUSH_INTERVAL):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue: Optional[asyncio.Queue] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Backpressure / health counters
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.bad_rows = 0  # rows whose events could not be encoded
+        self.high_water = 0
+        self.last_batch_ms = 0.0
+
+    def submit(self, record: tuple) -> bool:
+        """Queue (table_id, hand_id, seed, secret, commitment, events_json); False if full.
+
+        events_json may be a callable returning it, to encode off the table's path.
+        """
+        if self._task is None or self._task.done():
+            if self.queue is None:
+                self.queue = asyncio.Queue(self.max_queue)
+            self._full = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"[AuditWriter] Queue full ({self.max_queue}), dropped audit for hand {record[1]}")
+            return False
+        depth = self.queue.qsize()
+        if depth > self.high_water:
+            self.high_water = depth
+        if depth >= self.batch_size:
+            self._full.set()
+        return True
+
+    def metrics(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue else 0,
+            "high_water": self.high_water,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "bad_rows": self.bad_rows,
+            "last_batch_ms": self.last_batch_ms,
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self._drain()
+
+    async def _drain(self):
+        while not self.queue.empty():
+            batch = []
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _encode(self, batch) -> list:
+        # Run the rows' deferred encoders; a row that fails is dropped on its own, so one
+        # bad hand can't lose its batch or kill the writer task
+        rows = []
+        for row in batch:
+            if callable(row[5]):
+                try:
+                    row = row[:5] + (row[5](),)
+                except Exception as e:
+                    self.bad_rows += 1
+                    print(f"[AuditWriter] Dropping audit for hand {row[1]}, encoding failed: {e!r}")
+                    continue
+            rows.append(row)
+        return rows
+
+    async def _write(self, batch):
+        batch = self._encode(batch)
+        if not batch:
+            return
+        for attempt in range(1, AUDIT_MAX_ATTEMPTS + 1):
+            started = time.perf_counter()
+            try:
+                await pg_client.connect()
+                with timed("postgres", "log_hands"):
+                    await pg_client.log_hands(batch)
+            except Exception as e:
+                print(f"[AuditWriter] Writing {len(batch)} hands failed (attempt {attempt}): {e}")
+                if attempt < AUDIT_MAX_ATTEMPTS:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+                continue
+            self.last_batch_ms = (time.perf_counter() - started) * 1000
+            self.batches += 1
+            self.written += len(batch)
+            return
+        self.failed_batches += 1
+
+    async def close(self, timeout: float = 10.0):
+        # Drain whatever is queued, then stop the background task
+        if self._task is None:
+            return
+        self._full.set()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"[AuditWriter] Shutdown with {self.queue.qsize()} hands unwritten")
+        self._task.cancel()
+        self._task = None
+
+audit_writer = AuditWriter()
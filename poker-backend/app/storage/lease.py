@@ -0,0 +1,72 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Optional
+from app.storage.redis_client import redis_client
+
+# How long a table lease lives without renewal (seconds); renewed every ttl/3
+TABLE_LEASE_TTL = float(os.getenv("TABLE_LEASE_TTL", "10"))
+NODE_ID = os.getenv("NODE_ID", f"{socket.gethostname()}:{os.getpid()}")
+
+
+class TableLease:
+    """Exclusive ownership of one table by this process.
+
+    Acquired once when an engine starts and renewed in the background, instead of
+    taking a Redis lock around every action. Each acquire bumps the table's fencing
+    token; state writes carry it so a stale owner's writes are rejected.
+    """
+
+    def __init__(self, table_id: str, ttl: float = TABLE_LEASE_TTL):
+        self.table_id = table_id
+        self.key = f"table-lease:{table_id}"
+        self.fence_key = f"table-fence:{table_id}"
+        self.owner = f"{NODE_ID}:{uuid.uuid4().hex[:8]}"
+        self.ttl = ttl
+        self.token: Optional[int] = None
+        self.expires_at = 0.0  # local monotonic deadline, conservative
+        self._renew_task: Optional[asyncio.Task] = None
+
+    @property
+    def held(self) -> bool:
+        return self.token is not None and time.monotonic() < self.expires_at
+
+    async def acquire(self) -> bool:
+        started = time.monotonic()
+        token = await redis_client.acquire_lease(self.key, self.fence_key, self.owner, int(self.ttl * 1000))
+        if not token:
+            return False
+        self.token = token
+        self.expires_at = started + self.ttl
+        if self._renew_task is None or self._renew_task.done():
+            self._renew_task = asyncio.create_task(self._renew())
+        return True
+
+    async def _renew(self):
+        while self.token is not None:
+            await asyncio.sleep(self.ttl / 3)
+            started = time.monotonic()
+            try:
+                renewed = await redis_client.renew_lease(self.key, self.owner, int(self.ttl * 1000))
+            except Exception as e:
+                # Keep trying; held turns false once the local deadline passes
+                print(f"[TableLease] Renew failed for table {self.table_id}: {e}")
+                continue
+            if not renewed:
+                print(f"[TableLease] Lost lease for table {self.table_id}")
+                self.token = None
+                return
+            self.expires_at = started + self.ttl
+
+    async def release(self):
+        if self._renew_task is not None:
+            self._renew_task.cancel()
+            self._renew_task = None
+        if self.token is not None:
+            self.token = None
+            try:
+                await redis_client.release_lease(self.key, self.owner)
+            except Exception as e:
+                print(f"[TableLease] Release failed for table {self.table_id}: {e}")
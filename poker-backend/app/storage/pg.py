@@ -65,4 +65,14 @@ class PostgresClient:
                 table_id, hand_id, str(seed), secret, commitment, events
             )
 
+
+    async def log_hands(self, rows):
+        # Bulk version of log_hand: rows of (table_id, hand_id, seed, secret, commitment, events)
+        async with self.pool.acquire() as conn:
+            await conn.copy_records_to_table(
+                "game_audit",
+                records=[(t, h, str(seed), secret, commitment, events) for t, h, seed, secret, commitment, events in rows],
+                columns=["table_id", "hand_id", "server_seed", "server_secret", "commitment", "events"],
+            )
+
 pg_client = PostgresClient()
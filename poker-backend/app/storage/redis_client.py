@@ -1,8 +1,55 @@
 import os
 import redis.asyncio as redis
+from app.telemetry.metrics import timed
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 
+# Table ownership leases. The fence key holds a per-table counter that is bumped on
+# every successful acquire; its value is the owner's fencing token.
+ACQUIRE_LEASE = """
+if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return redis.call('incr', KEYS[2])
+end
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    redis.call('pexpire', KEYS[1], ARGV[2])
+    return tonumber(redis.call('get', KEYS[2]))
+end
+return 0
+"""
+
+RENEW_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Persist one table: optionally replace its state hash (which also resets the
+# action log, since the new state covers it) and append action-log entries.
+# With a token, nothing is written unless it is still the table's fencing token.
+# ARGV: token ('' = unfenced), number of hash fields, field/value pairs..., log entries...
+SAVE_TABLE = """
+if ARGV[1] ~= '' and redis.call('get', KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+local nfields = tonumber(ARGV[2])
+if nfields > 0 then
+    redis.call('hset', KEYS[1], unpack(ARGV, 3, 2 + nfields * 2))
+    redis.call('del', KEYS[3])
+end
+if #ARGV > 2 + nfields * 2 then
+    redis.call('rpush', KEYS[3], unpack(ARGV, 3 + nfields * 2))
+end
+return 1
+"""
+
 class RedisClient:
     def __init__(self):
         self.redis = redis.from_url(REDIS_URL, decode_responses=True)
@@ -16,6 +63,52 @@ class RedisClient:
     async def hset(self, name, mapping):
         return await self.redis.hset(name, mapping=mapping)
     
+    async def acquire_lease(self, name, fence_name, owner, ttl_ms):
+        # Returns the fencing token, or 0 if another owner holds the lease
+        with timed("redis", "lease"):
+            return int(await self.redis.eval(ACQUIRE_LEASE, 2, name, fence_name, owner, ttl_ms))
+
+    async def renew_lease(self, name, owner, ttl_ms):
+        with timed("redis", "lease"):
+            return bool(await self.redis.eval(RENEW_LEASE, 1, name, owner, ttl_ms))
+
+    async def release_lease(self, name, owner):
+        with timed("redis", "lease"):
+            return bool(await self.redis.eval(RELEASE_LEASE, 1, name, owner))
+
+    def save_table(self, pipe, state_key, log_key, mapping, entries, fence=None):
+        # Queue a table save on a pipeline (see SAVE_TABLE); its result is 0 if fenced off
+        args = [str(fence[1]) if fence else "", len(mapping or {})]
+        for key, value in (mapping or {}).items():
+            args.extend((key, value))
+        args.extend(entries)
+        pipe.eval(SAVE_TABLE, 3, state_key, fence[0] if fence else "", log_key, *args)
+
+    async def load_table(self, state_key, log_key):
+        # Saved state hash plus the actions logged since it, in one round trip
+        pipe = self.pipeline()
+        pipe.hgetall(state_key)
+        pipe.lrange(log_key, 0, -1)
+        with timed("redis", "load_table"):
+            state, log = await pipe.execute()
+        return state, log
+
+    async def load_states(self, state_keys):
+        # The saved "data" field of many tables, in one round trip (None where missing)
+        pipe = self.pipeline()
+        for key in state_keys:
+            pipe.hget(key, "data")
+        with timed("redis", "load_states"):
+            return await pipe.execute()
+
+    async def has_table(self, state_key, log_key):
+        # Whether anything was ever saved for a table
+        return await self.redis.exists(state_key, log_key) > 0
+
+    def pipeline(self):
+        # Non-transactional: batches commands into one round trip
+        return self.redis.pipeline(transaction=False)
+
     async def get(self, name):
         return await self.redis.get(name)
 
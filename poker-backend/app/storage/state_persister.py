@@ -0,0 +1,132 @@
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.storage.redis_client import redis_client
+from app.telemetry.metrics import timed
+from app.telemetry.tracing import background
+
+# Flush at least this often (seconds) while tables are dirty...
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "0.1"))
+# ...or as soon as this many tables are waiting to be written.
+STATE_FLUSH_MAX_DIRTY = int(os.getenv("STATE_FLUSH_MAX_DIRTY", "64"))
+
+
+class StatePersister:
+    """Write-behind persistence of table state to Redis.
+
+    Engines log each action and, every so often, mark the table dirty for a full
+    snapshot; nothing is written inline. Several snapshots of the same table
+    collapse into one write, and all pending tables are flushed together over
+    one pipeline. A snapshot resets the table's action log, so recovery is the
+    last snapshot plus the actions after its seq. Writes that carry a fence
+    (fence_key, token) are dropped by Redis if that token is no longer current.
+    A traced flush links to the spans of the traced actions it writes.
+    """
+
+    def __init__(self, interval: float = STATE_FLUSH_INTERVAL, max_dirty: int = STATE_FLUSH_MAX_DIRTY):
+        self.interval = interval
+        self.max_dirty = max_dirty
+        # table_id -> (seq, snapshot, fence); snapshot() returns the hash mapping and is only
+        # called at flush time, so intermediate versions are never serialized. A "seq" in
+        # the mapping overrides the marked one (the state may have moved on since).
+        self.dirty: Dict[str, Tuple[int, Callable[[], dict], Any]] = {}
+        # table_id -> [(seq, entry)] not yet appended to the action log, and their fence
+        self.logs: Dict[str, List[Tuple[int, str]]] = {}
+        self.log_fences: Dict[str, Any] = {}
+        self.spans: Dict[str, list] = {}  # table_id -> spans of traced actions not yet written
+        self.persisted_seq: Dict[str, int] = {}
+        self.fenced_writes = 0  # writes rejected because a newer owner holds the table
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_dirty(self, table_id: str, seq: int, snapshot: Callable[[], dict],
+                   fence: Optional[Tuple[str, int]] = None):
+        self.dirty[table_id] = (seq, snapshot, fence)
+        self._schedule()
+
+    def log_action(self, table_id: str, seq: int, entry: str, fence: Optional[Tuple[str, int]] = None,
+                   span=None):
+        self.logs.setdefault(table_id, []).append((seq, entry))
+        self.log_fences[table_id] = fence
+        if span is not None:
+            self.spans.setdefault(table_id, []).append(span)
+        self._schedule()
+
+    def pending(self, table_id: str) -> bool:
+        return table_id in self.dirty or table_id in self.logs
+
+    def _schedule(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        if len(self.dirty) + len(self.logs) >= self.max_dirty:
+            self._wakeup.set()
+
+    async def flush(self, table_id: Optional[str] = None):
+        tables = [table_id] if table_id is not None else list(self.dirty.keys() | self.logs.keys())
+        batch = {}
+        for tid in tables:
+            if self.pending(tid):
+                batch[tid] = (self.dirty.pop(tid, None), self.logs.pop(tid, []), self.log_fences.pop(tid, None))
+        if not batch:
+            return
+
+        links = [span for tid in batch for span in self.spans.pop(tid, ())]
+        pipe = redis_client.pipeline()
+        written = []
+        for tid, (snap, entries, fence) in batch.items():
+            mapping = None
+            if snap is not None:
+                seq, snapshot, fence = snap
+                mapping = dict(snapshot())
+                seq = int(mapping.setdefault("seq", seq))
+                # The snapshot already includes these actions
+                entries = [e for e in entries if e[0] > seq]
+            if entries:
+                seq = entries[-1][0]
+            redis_client.save_table(pipe, f"table:{tid}:state", f"table:{tid}:actions", mapping,
+                                    [entry for _, entry in entries], fence)
+            written.append((tid, seq, fence))
+        try:
+            with timed("redis", "flush"), background("state.flush", links, tables=len(batch)):
+                results = await pipe.execute()
+        except asyncio.CancelledError:
+            self._requeue(batch)
+            raise
+        except Exception as e:
+            print(f"[StatePersister] Flush of {len(batch)} tables failed, will retry: {e}")
+            self._requeue(batch)
+            return
+        for (tid, seq, fence), result in zip(written, results):
+            if fence is not None and not result:
+                self.fenced_writes += 1
+                print(f"[StatePersister] Rejected stale write for table {tid} (fencing token {fence[1]})")
+                continue
+            self.persisted_seq[tid] = seq
+
+    def _requeue(self, batch):
+        for tid, (snap, entries, fence) in batch.items():
+            # Keep a newer snapshot if the table was marked again meanwhile
+            if snap is not None:
+                self.dirty.setdefault(tid, snap)
+            if entries:
+                self.logs[tid] = entries + self.logs.get(tid, [])
+                self.log_fences.setdefault(tid, fence)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self.dirty or self.logs:
+                await self.flush()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+state_persister = StatePersister()
@@ -0,0 +1,167 @@
+import bisect
+import contextlib
+import os
+import time
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+from prometheus_client.utils import floatToGoString
+
+# Label queue depth by table too. Off by default: one series per table adds up fast
+METRICS_PER_TABLE = os.getenv("METRICS_PER_TABLE", "0") == "1"
+
+# Hot-path metrics are pre-aggregated in process; anything the code already counts
+# (registry sizes, drop counters) is read at scrape time by TableCollector instead.
+HOT_METRICS = []  # HotHistogram/HotCounter instances, exported by TableCollector
+
+
+class HotHistogram:
+    """A histogram for per-action code paths: a bisect and two adds, no locks or label
+    lookups (prometheus_client's Histogram costs ~1µs per observe). Only touched from
+    the event loop; exported by TableCollector."""
+
+    __slots__ = ("name", "documentation", "bounds", "counts", "sum")
+
+    def __init__(self, name: str, documentation: str, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.bounds = tuple(float(b) for b in buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        HOT_METRICS.append(self)
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def collect(self):
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            buckets.append((floatToGoString(bound), cumulative))
+        return HistogramMetricFamily(self.name, self.documentation, buckets=buckets, sum_value=self.sum)
+
+
+class HotCounter:
+    __slots__ = ("name", "documentation", "value")
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        HOT_METRICS.append(self)
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def collect(self):
+        return CounterMetricFamily(self.name, self.documentation, value=self.value)
+
+
+FSM_APPLY_SECONDS = HotHistogram(
+    "poker_fsm_apply_seconds", "Time to apply one action to a table's FSM",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+BATCH_ACTIONS = HotHistogram(
+    "poker_engine_batch_actions", "Actions applied per engine batch", buckets=(1, 2, 4, 8, 16, 32, 64))
+BROADCAST_SECONDS = HotHistogram(
+    "poker_broadcast_seconds", "Time to hand one update to the broker, sockets and shard relay",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1))
+FANOUT_SECONDS = HotHistogram(
+    "poker_ws_fanout_seconds", "Time to queue one update for every socket at its table",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05))
+IO_SECONDS = Histogram(
+    "poker_io_seconds", "Latency of calls to Redis, NATS and Postgres", ["backend", "op"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5))
+IO_ERRORS = Counter("poker_io_errors_total", "Failed calls to Redis, NATS and Postgres", ["backend", "op"])
+
+ACTIONS = HotCounter("poker_actions_total", "Actions applied by engines in this process")
+HANDS = HotCounter("poker_hands_total", "Hands finished in this process (rate() for hands/sec)")
+REJECTED = Counter("poker_actions_rejected_total", "Actions turned away before the table queue", ["reason"])
+EVENTS_PUBLISHED = HotCounter("poker_events_published_total", "Hand events acknowledged by JetStream")
+EVENTS_DROPPED = Counter("poker_events_dropped_total", "Hand events evicted from a full outbox")
+WS_SKIPPED = Counter("poker_ws_skipped_sends_total", "Updates skipped for sockets that fell behind")
+
+
+_io_children = {}  # (backend, op) -> (latency histogram, error counter); labels() is slow
+
+
+def io_metrics(backend: str, op: str):
+    children = _io_children.get((backend, op))
+    if children is None:
+        children = _io_children[(backend, op)] = (IO_SECONDS.labels(backend, op), IO_ERRORS.labels(backend, op))
+    return children
+
+
+@contextlib.contextmanager
+def timed(backend: str, op: str):
+    # Observe a call's latency; count it as an error if it raises
+    seconds, errors = io_metrics(backend, op)
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        errors.inc()
+        raise
+    finally:
+        seconds.observe(time.perf_counter() - started)
+
+
+class TableCollector:
+    """The hot-path metrics, plus gauges and counters read from the engine registry and
+    I/O components at scrape time."""
+
+    def describe(self):
+        # Nothing to check at registration (collect() would import the engine modules)
+        return []
+
+    def collect(self):
+        for metric in HOT_METRICS:
+            yield metric.collect()
+
+        from app.engine.registry import engines, table_counts
+        from app.storage.audit_writer import audit_writer
+        from app.storage.state_persister import state_persister
+        from app.ws.broker import broker
+        from app.ws.manager import manager
+
+        counts = table_counts()
+        tables = GaugeMetricFamily("poker_tables", "Tables known to this process", labels=["state"])
+        tables.add_metric(["resident"], counts["resident"])
+        tables.add_metric(["hibernated"], counts["hibernated"])
+        yield tables
+
+        depths = [(table_id, engine.queue.qsize()) for table_id, engine in list(engines.items())]
+        yield GaugeMetricFamily("poker_queued_actions", "Actions waiting in table queues",
+                                value=sum(d for _, d in depths))
+        yield GaugeMetricFamily("poker_queue_depth_max", "Deepest table queue",
+                                value=max((d for _, d in depths), default=0))
+        if METRICS_PER_TABLE:
+            per_table = GaugeMetricFamily("poker_table_queue_depth", "Actions waiting per table", labels=["table"])
+            for table_id, depth in depths:
+                per_table.add_metric([table_id], depth)
+            yield per_table
+
+        yield GaugeMetricFamily("poker_ws_connections", "Open table WebSockets",
+                                value=sum(len(s) for s in manager.connections.values()))
+        yield GaugeMetricFamily("poker_ws_watched_tables", "Tables with at least one WebSocket",
+                                value=len(manager.connections))
+        yield GaugeMetricFamily("poker_subscriptions", "Open GraphQL table subscriptions",
+                                value=sum(len(s) for s in broker.subscribers.values()))
+        yield CounterMetricFamily("poker_ws_dropped_clients", "Sockets dropped as dead or stuck",
+                                  value=manager.dropped_clients)
+        yield CounterMetricFamily("poker_subscriptions_dropped", "Subscriptions dropped for falling behind",
+                                  value=broker.dropped)
+        yield CounterMetricFamily("poker_state_fenced_writes", "State writes rejected for a stale lease",
+                                  value=state_persister.fenced_writes)
+
+        audit = audit_writer.metrics()
+        yield GaugeMetricFamily("poker_audit_queued", "Hands waiting for the audit writer", value=audit["queued"])
+        yield CounterMetricFamily("poker_audit_written", "Hands written to game_audit", value=audit["written"])
+        yield CounterMetricFamily("poker_audit_dropped", "Hands dropped by a full audit queue",
+                                  value=audit["dropped"])
+        yield CounterMetricFamily("poker_audit_failed_batches", "Audit batches given up on",
+                                  value=audit["failed_batches"])
+        yield CounterMetricFamily("poker_audit_bad_rows", "Hands whose audit events failed to encode",
+                                  value=audit["bad_rows"])
+
+
+REGISTRY.register(TableCollector())
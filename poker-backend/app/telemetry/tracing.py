@@ -0,0 +1,192 @@
+import contextlib
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+from opentelemetry import trace
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import Link, Span, Status, StatusCode
+
+# Where traces go: "" (tracing off), "file" (JSON lines in TRACE_FILE) or "memory"
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# Fraction of actions traced regardless of speed; actions slower than TRACE_SLOW_MS always are
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "250"))
+# Traces buffered while their root span is still open; the oldest are dropped beyond this
+TRACE_MAX_PENDING = int(os.getenv("TRACE_MAX_PENDING", "10000"))
+
+
+class FileSpanExporter(SpanExporter):
+    """One JSON object per span, appended to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans):
+        with open(self.path, "a") as f:
+            for span in spans:
+                f.write(span.to_json(indent=None) + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+class TailSampler(SpanProcessor):
+    """Tail sampling: a trace's spans are held until its root span ends, then the whole
+    trace is kept if the root was slow or its trace id falls in the sampled fraction.
+
+    An action's root span stays open from the edge until the engine has broadcast its
+    result, so "slow" means slow end to end, wherever the time went. Work done later
+    on the action's behalf (write-behind flushes, event publishes) is traced on its own
+    with links to the actions; such a trace is kept along with any trace it links to.
+
+    Kept spans are handed to a BatchSpanProcessor, which exports them from its own
+    thread, so the event loop never waits on the exporter.
+    """
+
+    def __init__(self, exporter: SpanExporter, rate: float = TRACE_SAMPLE_RATE,
+                 slow_ms: float = TRACE_SLOW_MS, max_pending: int = TRACE_MAX_PENDING):
+        self.exporter = exporter
+        self.batches = BatchSpanProcessor(exporter)
+        self.threshold = int(rate * (1 << 64))
+        self.slow_ns = int(slow_ms * 1_000_000)
+        self.max_pending = max_pending
+        self.pending = OrderedDict()  # trace_id -> finished spans, oldest trace first
+        self.kept = OrderedDict()  # trace ids recently kept, for traces linking to them
+        self.evicted = 0
+
+    def on_start(self, span, parent_context=None):
+        pass
+
+    def on_end(self, span: ReadableSpan):
+        trace_id = span.context.trace_id
+        if span.parent is not None and not span.parent.is_remote:
+            spans = self.pending.get(trace_id)
+            if spans is None:
+                if len(self.pending) >= self.max_pending:
+                    self.pending.popitem(last=False)
+                    self.evicted += 1
+                spans = self.pending[trace_id] = []
+            spans.append(span)
+            return
+        spans = self.pending.pop(trace_id, [])
+        spans.append(span)
+        if span.end_time - span.start_time >= self.slow_ns or (trace_id & 0xFFFFFFFFFFFFFFFF) < self.threshold:
+            self._keep(trace_id, spans)
+            return
+        for link in span.links:
+            linked = link.context.trace_id
+            if linked in self.kept:
+                self._keep(trace_id, spans)
+                return
+            waiting = self.pending.get(linked)
+            if waiting is not None:
+                # That action is still open: this trace goes (or is dropped) with it
+                waiting.extend(spans)
+                return
+
+    def _keep(self, trace_id: int, spans):
+        self.kept[trace_id] = None
+        if len(self.kept) > self.max_pending:
+            self.kept.popitem(last=False)
+        for span in spans:
+            self.batches.on_end(span)
+
+    def shutdown(self):
+        self.batches.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.batches.force_flush(timeout_millis)
+
+
+tracer: Optional[trace.Tracer] = None  # None while tracing is off: every helper is then a no-op
+_provider: Optional[TracerProvider] = None
+
+
+def configure(exporter: Optional[SpanExporter], rate: float = TRACE_SAMPLE_RATE,
+              slow_ms: float = TRACE_SLOW_MS) -> Optional[TracerProvider]:
+    """Send traces to `exporter` (None turns tracing off). Tests pass an InMemorySpanExporter."""
+    global tracer, _provider
+    if _provider is not None:
+        _provider.force_flush()  # export what is still queued; the exporter may be reused
+    tracer = _provider = None
+    if exporter is None:
+        return None
+    # Every span is recorded; TailSampler decides per trace once its root has ended
+    _provider = TracerProvider()
+    _provider.add_span_processor(TailSampler(exporter, rate, slow_ms))
+    tracer = _provider.get_tracer("poker")
+    return _provider
+
+
+def flush(timeout_millis: int = 30000) -> bool:
+    # Export every trace kept so far, blocking until done (tests, shutdown)
+    return _provider is None or _provider.force_flush(timeout_millis)
+
+
+def start_action(name: str, table_id: str, action: dict) -> Optional[Span]:
+    # Root span of one client action; ended by whoever finishes with the action
+    if tracer is None:
+        return None
+    return tracer.start_span(name, attributes={
+        "table.id": table_id,
+        "action": str(action.get("action")),
+        "player.id": str(action.get("player_id")),
+    })
+
+
+def end_action(span: Optional[Span], rejected: Optional[str] = None, **attributes):
+    if span is None:
+        return
+    if rejected is not None:
+        span.set_attribute("rejected", rejected)
+    for key, value in attributes.items():
+        span.set_attribute(key, value)
+    span.end()
+
+
+def fail_action(span: Optional[Span], error: BaseException):
+    if span is not None:
+        span.record_exception(error)
+        span.set_status(Status(StatusCode.ERROR, str(error)))
+        span.end()
+
+
+_UNTRACED = contextlib.nullcontext()  # shared no-op span context for untraced work
+
+
+def child(name: str, parent: Optional[Span], links: Iterable[Span] = ()):
+    # A step of the action `parent` traces; nothing at all if it isn't traced
+    if parent is None:
+        return _UNTRACED
+    return tracer.start_as_current_span(name, context=trace.set_span_in_context(parent),
+                                        links=[Link(s.get_span_context()) for s in links])
+
+
+def record_wait(parent: Optional[Span], queued_ns: int):
+    # Time the action sat in the table's queue, from enqueue until now
+    if parent is not None:
+        span = tracer.start_span("engine.queue_wait", context=trace.set_span_in_context(parent),
+                                 start_time=queued_ns)
+        span.end()
+
+
+def background(name: str, links: Iterable[Span] = (), **attributes):
+    # Root span for work not tied to one action (e.g. a JetStream publish batch), linked
+    # to the actions it was done for. Always a new trace, whatever span is current
+    if tracer is None:
+        return _UNTRACED
+    return tracer.start_as_current_span(name, context=Context(), links=[Link(s.get_span_context()) for s in links],
+                                        attributes=attributes)
+
+
+if TRACE_EXPORTER == "file":
+    configure(FileSpanExporter(TRACE_FILE))
+elif TRACE_EXPORTER == "memory":
+    memory_exporter = InMemorySpanExporter()
+    configure(memory_exporter)
@@ -0,0 +1,81 @@
+import json
+import numpy as np
+import unittest.mock
+import pytest
+from app.analytics.columnar import ColumnarWriter
+from app.analytics.history import HandHistory
+from app.scripts.bench_engine import bench_fsm, offline
+
+
+@pytest.fixture
+async def audited_hands():
+    rows = []
+    with offline(), unittest.mock.patch("app.engine.fsm.audit_writer.submit", rows.append):
+        await bench_fsm(tables=4, seats=3, actions=150)
+    return [(table_id, json.loads(events())) for table_id, _, _, _, _, events in rows]
+
+
+async def test_columnar_stats_match_the_audit_log(audited_hands, tmp_path):
+    half = len(audited_hands) // 2
+    writer = ColumnarWriter(str(tmp_path))
+    for i, (table_id, events) in enumerate(audited_hands[:half]):
+        writer.add_hand(i + 1, table_id, events)
+    writer.flush()
+    # A second run appends a new part and keeps the id dictionaries
+    writer = ColumnarWriter(str(tmp_path))
+    for i, (table_id, events) in enumerate(audited_hands[half:], start=half):
+        writer.add_hand(i + 1, table_id, events)
+    writer.flush()
+
+    history = HandHistory(str(tmp_path))
+    assert history.meta["hands"] == len(audited_hands)
+    assert len(history.meta["parts"]) == 2
+
+    # Same numbers the slow way, straight from the JSON
+    for player_id in history.players:
+        dealt = won = vpip = 0
+        for _, events in audited_hands:
+            # In the hand if dealt in, or (joining mid-hand) if they acted in it
+            seated = {p for e in events if e["type"] == "deal" for p in e["payload"]["players"]}
+            seated |= {e["payload"]["player_id"] for e in events if e["type"] == "player_action"}
+            if player_id not in seated:
+                continue
+            dealt += 1
+            won += any(e["type"] == "showdown" and any(player_id in pot["winner_ids"] for pot in e["payload"]["pots"])
+                       for e in events)
+            street = "preflop"
+            for e in events:
+                if e["type"] == "phase_change":
+                    street = e["payload"]["phase"]
+                elif e["type"] == "player_action" and street == "preflop" and \
+                        e["payload"]["player_id"] == player_id and e["payload"]["action"] in ("call", "raise"):
+                    vpip += 1
+                    break
+        stats = history.player(player_id)
+        assert stats["hands"] == dealt
+        assert stats["win_rate"] == pytest.approx(won / dealt)
+        assert stats["vpip"] == pytest.approx(vpip / dealt)
+
+    tables = history.table_stats()
+    assert tables["hands"].sum() == len(audited_hands)
+    dealt = sum(len(e["payload"]["players"]) for _, events in audited_hands for e in events if e["type"] == "deal")
+    assert sum((hole0 >= 0).sum() for hole0 in history.columns("seats", "hole0")) == dealt
+    assert all(isinstance(col, np.memmap) for col in history.columns("actions", "seat"))
+
+
+def test_side_pot_and_split_pot_winners_all_count_as_won(tmp_path):
+    deal = {"type": "deal", "payload": {"players": ["p-a", "p-b", "p-c"], "hole_cards": [[0, 1], [2, 3], [4, 5]]}}
+    showdown = {"type": "showdown", "payload": {
+        "winner_id": "p-a", "amount": 300, "winning_hand": "Pair",
+        # p-a takes the main pot; p-b and p-c split the side pot p-a couldn't cover
+        "pots": [{"amount": 150, "winner_ids": ["p-a"]}, {"amount": 150, "winner_ids": ["p-b", "p-c"]}]}}
+    legacy = {"type": "showdown", "payload": {"winner_id": "p-c", "amount": 60, "winning_hand": "Flush"}}
+    writer = ColumnarWriter(str(tmp_path))
+    writer.add_hand(1, "t1", [deal, showdown])
+    writer.add_hand(2, "t1", [deal, legacy])
+    writer.flush()
+
+    history = HandHistory(str(tmp_path))
+    assert history.player("p-a")["win_rate"] == pytest.approx(0.5)
+    assert history.player("p-b")["win_rate"] == pytest.approx(0.5)
+    assert history.player("p-c")["win_rate"] == pytest.approx(1.0)
@@ -0,0 +1,17 @@
+from app.scripts.bench_engine import compare, run_all
+
+
+async def test_bench_runs_offline():
+    results = await run_all(tables=3, seats=3, actions=20, repeat=1)
+    for section in ("fsm", "engine", "engine_burst"):
+        assert results[section]["actions"] == 60
+        assert results[section]["hands"] > 0
+        assert results[section]["p99_us"] >= results[section]["p50_us"] > 0
+    assert results["allocations"]["peak_kb"] > 0
+
+
+def test_compare_flags_regressions():
+    baseline = {"fsm": {"actions_per_sec": 1000, "p99_us": 50, "hands": 10}, "config": {"tables": 1}}
+    assert compare({"fsm": {"actions_per_sec": 900, "p99_us": 55, "hands": 1}}, baseline, 0.25) == []
+    regressions = compare({"fsm": {"actions_per_sec": 500, "p99_us": 80, "hands": 10}}, baseline, 0.25)
+    assert len(regressions) == 2
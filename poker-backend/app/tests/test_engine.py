@@ -1,7 +1,9 @@
 import pytest
+import json
 import unittest.mock
-from app.engine.fsm import PokerFSM
+from app.engine.fsm import BettingRound, PokerFSM
 from app.engine.rng import DeterministicRNG
+from app.engine.cards import decode_cards
 
 @pytest.mark.asyncio
 async def test_fsm_initial_state():
@@ -26,3 +28,564 @@ async def test_rng_determinism():
     rng2.shuffle(deck2)
     
     assert deck1 == deck2
+
+def test_int_deck_shuffles_like_dict_deck():
+    fsm = PokerFSM("test-table")
+    deck = fsm._create_deck()
+    legacy = [{"rank": r, "suit": s} for r in "23456789TJQKA" for s in "shdc"]
+
+    DeterministicRNG(99).shuffle(deck)
+    DeterministicRNG(99).shuffle(legacy)
+
+    assert isinstance(deck, bytearray)
+    assert decode_cards(deck) == legacy
+
+@pytest.mark.asyncio
+async def test_state_serializes_cards_as_dicts():
+    with unittest.mock.patch('app.storage.pg.pg_client.connect', new_callable=unittest.mock.AsyncMock), \
+         unittest.mock.patch('app.storage.pg.pg_client.log_hand', new_callable=unittest.mock.AsyncMock):
+        fsm = PokerFSM("test-table")
+        rng = DeterministicRNG(1)
+        await fsm.apply({"action": "join", "player_id": "p-a", "username": "a"}, rng)
+        await fsm.apply({"action": "join", "player_id": "p-b", "username": "b"}, rng)
+
+        assert all(isinstance(c, int) for p in fsm.state.players for c in p.hole_cards)
+        d = fsm.state.to_dict()
+        assert d["phase"] == "preflop"
+        assert len(d["deck"]) == 48
+        assert set(d["players"][0]["hole_cards"][0]) == {"rank", "suit"}
+
+
+@pytest.mark.asyncio
+async def test_state_round_trips_through_primitive():
+    fsm = PokerFSM("test-table")
+    rng = DeterministicRNG(3)
+    await fsm.apply({"action": "join", "player_id": "p-a", "username": "a"}, rng)
+    await fsm.apply({"action": "join", "player_id": "p-b", "username": "b"}, rng)
+    await fsm.apply({"action": "call", "player_id": fsm.state.players[fsm.state.current_turn_index].id}, rng)
+
+    restored = PokerFSM.from_primitive("test-table", fsm.to_primitive())
+    assert restored.state.to_dict() == fsm.state.to_dict()
+    assert restored.state.deck == fsm.state.deck
+    assert restored.current_hand_secret == fsm.current_hand_secret
+
+
+def test_side_pots_layer_by_all_in_level():
+    r = BettingRound(4)
+    r.committed = [100, 300, 500, 50]
+    r.fold(3)  # folded seats feed the pots but can't win them
+    assert r.pots(950) == [(350, 0b0111), (400, 0b0110), (200, 0b0100)]
+    # Chips the round didn't see go in: one pot for everyone still in
+    assert r.pots(1000) == [(1000, 0b0111)]
+
+
+@pytest.mark.asyncio
+async def test_multiway_all_in_pays_each_layer_once(monkeypatch):
+    monkeypatch.setattr("app.engine.fsm.audit_writer.submit", lambda record: True)
+    fsm = PokerFSM("test-table")
+    rng = DeterministicRNG(5)
+    for name in "abc":
+        await fsm.apply({"action": "join", "player_id": f"p-{name}", "username": name}, rng)
+    # c joined mid-hand and sits it out; fold the first hand away so all three are dealt
+    assert fsm.state.players[2].has_folded and fsm.state.players[2].hole_cards == []
+    first = fsm.current_hand_id
+    while fsm.current_hand_id == first:
+        await fsm.apply({"action": "fold", "player_id": fsm.state.players[fsm.state.current_turn_index].id}, rng)
+
+    # Uneven stacks behind the blinds, then everyone shoves
+    for p, behind in zip(fsm.state.players, (80, 280, 480)):
+        p.chips = behind - p.current_bet
+    total = sum(p.chips + p.current_bet for p in fsm.state.players)
+    events = []
+    while fsm.state.phase == "preflop":
+        player = fsm.state.players[fsm.state.current_turn_index]
+        batch, _ = await fsm.apply({"action": "raise", "player_id": player.id, "amount": 10_000}, rng)
+        events += batch
+    showdown = next(e.payload for e in events if e.type == "showdown")
+
+    # Nobody acts after the shoves: the board is run out and three pots paid
+    assert [pot["amount"] for pot in showdown["pots"]] == [240, 400, 200]
+    assert showdown["amount"] == 840
+    # Chips are conserved (the next hand's blinds are back in the pot)
+    assert sum(p.chips + p.current_bet for p in fsm.state.players) == total
+    main = next(p for p in fsm.state.players if p.id == showdown["pots"][0]["winner_ids"][0])
+    assert main.id == showdown["winner_id"]
+
+
+@pytest.mark.asyncio
+async def test_betting_round_survives_a_snapshot():
+    fsm = PokerFSM("test-table")
+    rng = DeterministicRNG(3)
+    for name in "ab":
+        await fsm.apply({"action": "join", "player_id": f"p-{name}", "username": name}, rng)
+    raiser = fsm.state.current_turn_index
+    await fsm.apply({"action": "raise", "player_id": fsm.state.players[raiser].id, "amount": 60}, rng)
+    restored = PokerFSM.from_primitive("test-table", fsm.to_primitive())
+    assert restored.round.to_dict() == fsm.round.to_dict()
+    assert restored.round.last_aggressor == raiser
+    # Older snapshots without the round rebuild everything but the hand's contributions
+    legacy = fsm.to_primitive()
+    hand = json.loads(legacy["hand"])
+    del hand["round"]
+    legacy["hand"] = json.dumps(hand)
+    rebuilt = PokerFSM.from_primitive("test-table", legacy).round
+    assert (rebuilt.max_bet, rebuilt.live, rebuilt.owed()) == (60, 0b11, fsm.round.owed())
+
+
+@pytest.fixture
+def offline_engine(monkeypatch):
+    # TableEngine with its Redis state in a FakeRedis and the other edges stubbed
+    from app.storage.lease import TableLease
+    from app.tests.test_storage import FakeRedis
+
+    fake = FakeRedis()
+
+    async def acquire(lease):
+        # Each acquire bumps the table's fencing token, like the real lease
+        token = fake.fences.get(lease.fence_key, 0) + 1
+        fake.fences[lease.fence_key] = lease.token = token
+        lease.expires_at = float("inf")
+        return True
+
+    async def release(lease):
+        lease.token = None
+
+    monkeypatch.setattr(TableLease, "acquire", acquire)
+    monkeypatch.setattr(TableLease, "release", release)
+    monkeypatch.setattr("app.storage.state_persister.redis_client", fake)
+    monkeypatch.setattr("app.engine.table_engine.redis_client", fake)
+    monkeypatch.setattr("app.engine.sharding.redis_client", fake)
+    monkeypatch.setattr("app.storage.audit_writer.audit_writer.submit", lambda record: True)
+    monkeypatch.setattr("app.events.outbox.nats_client.publish", unittest.mock.AsyncMock())
+    return fake
+
+
+async def play(engine, actions):
+    for action in actions:
+        await engine.enqueue(action)
+        await engine.queue.join()
+
+
+def check_or_call(engine):
+    state = engine.fsm.state
+    player = state.players[state.current_turn_index]
+    to_call = max(p.current_bet for p in state.players) > player.current_bet
+    return {"action": "call" if to_call else "check", "player_id": player.id}
+
+
+@pytest.mark.asyncio
+async def test_idle_table_hibernates_and_rehydrates(offline_engine):
+    from app.engine import registry
+
+    engine = registry.get_engine("sleepy")
+    await play(engine, [{"action": "join", "player_id": pid, "username": pid} for pid in ("p-a", "p-b")])
+    before = engine.fsm.state.to_dict()
+    seq = engine.seq
+
+    await registry.reap_idle(now=engine.last_active + registry.TABLE_IDLE_TTL)
+    assert "sleepy" not in registry.engines
+    assert registry.table_counts()["hibernated"] >= 1
+    assert engine.stopped
+
+    woken = registry.get_engine("sleepy")
+    await woken.ready.wait()
+    assert woken is not engine
+    assert woken.fsm.state.to_dict() == before
+    assert woken.seq == seq
+    assert "sleepy" not in registry.hibernated
+    await woken.stop()
+    registry.engines.pop("sleepy", None)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_only_loads_tables_that_exist(offline_engine):
+    from app.engine import registry
+    from app.engine.sharding import router
+
+    # Looking at a table nobody has played at creates no engine (and takes no lease)
+    assert await router.snapshot("nobody-here") is None
+    assert "nobody-here" not in registry.engines
+
+    engine = registry.get_engine("saved")
+    await play(engine, [{"action": "join", "player_id": "p-a", "username": "a"}])
+    await engine.stop()
+    registry.engines.pop("saved")
+    registry.hibernated.discard("saved")
+    # ...but one with saved state is loaded, e.g. after another process hosted it
+    view = await router.snapshot("saved")
+    assert view is not None and view.seq == engine.seq
+    await registry.engines.pop("saved").stop()
+
+
+@pytest.mark.asyncio
+async def test_crashed_table_recovers_from_snapshot_and_log(offline_engine):
+    from app.engine.table_engine import TableEngine
+    from app.storage.state_persister import state_persister
+
+    engine = TableEngine("crashy")
+    engine.start()
+    await play(engine, [{"action": "join", "player_id": pid, "username": pid} for pid in ("p-a", "p-b")])
+    # Play through a whole hand and into the next, mixing snapshot and log-only actions
+    for _ in range(13):
+        await play(engine, [check_or_call(engine)])
+    await state_persister.flush("crashy")
+    assert offline_engine.lists["table:crashy:actions"]  # some actions exist only in the log
+
+    # The process dies: no stop(), only what reached Redis survives
+    engine.task.cancel()
+    recovered = TableEngine("crashy")
+    recovered.start()
+    await recovered.ready.wait()
+
+    assert recovered.seq == engine.seq
+    assert recovered.fsm.state.to_dict() == engine.fsm.state.to_dict()
+    assert recovered.fsm.current_hand_secret == engine.fsm.current_hand_secret
+    assert offline_engine.lists["table:crashy:actions"] == []  # folded into a new snapshot
+    await recovered.stop()
+
+
+@pytest.mark.asyncio
+async def test_failed_broadcast_still_logs_the_action(offline_engine, monkeypatch):
+    from app.engine.table_engine import TableEngine
+    from app.storage.state_persister import state_persister
+
+    engine = TableEngine("flaky")
+    engine.start()
+    monkeypatch.setattr("app.engine.table_engine.router.publish_view",
+                        unittest.mock.AsyncMock(side_effect=ConnectionError("nats down")))
+    # The second join deals a hand; its broadcast fails after the FSM moved on
+    await play(engine, [{"action": "join", "player_id": pid, "username": pid} for pid in ("p-a", "p-b")])
+    await play(engine, [check_or_call(engine)])
+    await state_persister.flush("flaky")
+    engine.task.cancel()
+
+    recovered = TableEngine("flaky")
+    recovered.start()
+    await recovered.ready.wait()
+    assert recovered.seq == engine.seq
+    assert recovered.fsm.state.to_dict() == engine.fsm.state.to_dict()
+    await recovered.stop()
+
+
+@pytest.mark.asyncio
+async def test_unreplayable_log_falls_back_to_the_snapshot(offline_engine):
+    from app.engine.table_engine import TableEngine
+    from app.storage.state_persister import state_persister
+
+    engine = TableEngine("broken")
+    engine.start()
+    await play(engine, [{"action": "join", "player_id": pid, "username": pid} for pid in ("p-a", "p-b")])
+    await play(engine, [check_or_call(engine)])
+    await state_persister.flush("broken")
+    good = engine.fsm.state.to_dict()
+    engine.task.cancel()
+    # A logged action the FSM chokes on can't be replayed (nor can anything after it)
+    offline_engine.lists["table:broken:actions"].append(json.dumps(
+        {"seq": engine.seq + 5, "action": dict(check_or_call(engine), action="raise", amount="lots")}))
+
+    recovered = TableEngine("broken")
+    recovered.start()
+    await recovered.ready.wait()
+    assert not recovered.stopped
+    assert recovered.fsm.state.to_dict() == good
+    assert recovered.seq == engine.seq + 5
+    assert offline_engine.lists["table:broken:actions"] == []
+    await recovered.stop()
+
+
+@pytest.mark.asyncio
+async def test_connect_snapshot_is_cached_per_seq(offline_engine, monkeypatch):
+    from app.engine import registry
+    from app.engine.sharding import router
+
+    from app.ws.views import seat_key
+
+    engine = registry.get_engine("cached")
+    await play(engine, [{"action": "join", "player_id": pid, "username": pid, "seat_key": seat_key(pid)}
+                        for pid in ("p-a", "p-b")])
+
+    # Connects to a table hosted here never touch Redis
+    monkeypatch.setattr(offline_engine, "load_table", unittest.mock.AsyncMock(side_effect=AssertionError))
+    first = await router.snapshot("cached")
+    assert await router.snapshot("cached") is first
+    assert first.seq == engine.seq
+    assert "hole_cards\": [{" not in first.shared
+    assert first.for_player("p-a", seat_key("p-a")) != first.shared  # a seat still gets its own cards
+    assert first.for_player("p-a") == first.shared
+
+    await play(engine, [check_or_call(engine)])
+    second = await router.snapshot("cached")
+    assert second is not first and second.seq == engine.seq
+    await engine.stop()
+    registry.engines.pop("cached", None)
+
+
+@pytest.mark.asyncio
+async def test_graphql_join_table_still_returns_a_boolean(offline_engine):
+    from app.engine import registry
+    from app.graphql.schema import schema
+
+    engine = registry.get_engine("legacy-join")
+    try:
+        # Clients written before joinSeat select nothing from joinTable
+        joined = await schema.execute('mutation { joinTable(input: {tableId: "legacy-join", username: "a", buyin: 1000}) }')
+        assert joined.errors is None and joined.data["joinTable"] is True
+        await engine.queue.join()
+        assert [p.id for p in engine.fsm.state.players] == ["p-a"]
+    finally:
+        await engine.stop()
+        registry.engines.pop("legacy-join", None)
+
+
+@pytest.mark.asyncio
+async def test_graphql_subscription_streams_engine_updates(offline_engine):
+    import asyncio
+    from app.engine import registry
+    from app.graphql.schema import schema
+
+    engine = registry.get_engine("subscribed")
+    joined = await schema.execute(
+        'mutation { joinSeat(input: {tableId: "subscribed", username: "a", buyin: 1000}) { playerId seatToken } }')
+    await engine.queue.join()
+    seat = joined.data["joinSeat"]
+    updates = await schema.subscribe(
+        'subscription { tableUpdates(tableId: "subscribed", playerId: "%s", seatToken: "%s") { seq payload } }'
+        % (seat["playerId"], seat["seatToken"]))
+    hands = await schema.subscribe(
+        'subscription { tableUpdates(tableId: "subscribed", types: ["hand_started"]) { seq payload } }')
+
+    first = (await asyncio.wait_for(updates.__anext__(), 1)).data["tableUpdates"]
+    assert json.loads(first["payload"])["type"] == "snapshot"
+    next_hand = asyncio.create_task(hands.__anext__())  # filtered streams start without a snapshot
+    await asyncio.sleep(0)
+
+    await play(engine, [{"action": "join", "player_id": "p-b", "username": "b"}])
+    delta = (await asyncio.wait_for(updates.__anext__(), 1)).data["tableUpdates"]
+    message = json.loads(delta["payload"])
+    assert message["type"] == "delta" and message["base_seq"] == first["seq"]
+    assert len(message["private"]["hole_cards"]) == 2  # a's own cards, as on /ws
+    started = (await asyncio.wait_for(next_hand, 1)).data["tableUpdates"]
+    spectated = json.loads(started["payload"])
+    assert "private" not in spectated  # no playerId: the spectator encoding
+    message.pop("private")
+    assert started["seq"] == delta["seq"] and spectated == message
+    assert any(ev.get("hand_id") for ev in message["events"])
+
+    await updates.aclose()
+    await hands.aclose()
+    assert not registry.broker.has_subscribers("subscribed")
+    await engine.stop()
+    registry.engines.pop("subscribed", None)
+
+
+@pytest.mark.asyncio
+async def test_table_queries_batch_into_one_lookup(offline_engine, monkeypatch):
+    from app.engine import registry
+    from app.graphql import loaders
+    from app.graphql.schema import schema
+
+    monkeypatch.setattr("app.graphql.loaders.redis_client", offline_engine)
+    monkeypatch.setattr(loaders, "_cache", {})
+    engine = registry.get_engine("lobby-live")
+    await play(engine, [{"action": "join", "player_id": pid, "username": pid} for pid in ("p-a", "p-b")])
+    stored = engine.fsm.to_primitive()
+    offline_engine.hashes["table:lobby-saved:state"] = dict(stored, data=stored["data"].replace("lobby-live", "lobby-saved"))
+
+    query = """{
+      a: table(tableId: "lobby-live") { tableId phase pot players { id chips } communityCards { rank } }
+      b: table(tableId: "lobby-saved") { tableId players { id } }
+      c: tables(tableIds: ["lobby-saved", "lobby-none", "lobby-live"]) { tableId }
+    }"""
+    result = await schema.execute(query, context_value={})
+    assert result.errors is None
+    assert result.data["a"]["phase"] == "preflop" and len(result.data["a"]["players"]) == 2
+    assert result.data["b"] == {"tableId": "lobby-saved", "players": [{"id": "p-a"}, {"id": "p-b"}]}
+    assert result.data["c"] == [{"tableId": "lobby-saved"}, None, {"tableId": "lobby-live"}]
+    # Resident table from memory; the other two ids in one pipeline, once
+    assert offline_engine.state_reads == [["table:lobby-saved:state", "table:lobby-none:state"]]
+
+    await schema.execute(query, context_value={})
+    assert len(offline_engine.state_reads) == 1  # served by the TTL cache
+    await engine.stop()
+    registry.engines.pop("lobby-live", None)
+
+
+@pytest.mark.asyncio
+async def test_junk_actions_are_turned_away_before_the_queue(offline_engine, monkeypatch):
+    from app.engine.admission import TokenBucket
+    from app.engine.registry import engines
+    from app.engine.table_engine import TableEngine
+
+    engine = TableEngine("gated")
+    engines["gated"] = engine
+    engine.start()
+    await engine.ready.wait()
+    try:
+        # Nothing to bet on at a waiting table
+        assert engine.admit({"action": "check", "player_id": "p-a"}) == "no hand in progress"
+        assert engine.admit({"action": "dance", "player_id": "p-a"}) == "unknown action"
+        for pid in ("p-a", "p-b"):
+            assert engine.admit({"action": "join", "player_id": pid, "username": pid}) is None
+            await engine.queue.join()
+        assert engine.admit({"action": "join", "player_id": "p-a", "username": "a"}) == "already seated"
+
+        to_act = engine.turn.to_act
+        other = "p-b" if to_act == "p-a" else "p-a"
+        seq = engine.seq
+        assert engine.admit({"action": "call", "player_id": other}) == "not your turn"
+        assert engine.admit({"action": "raise", "player_id": to_act}) == "raise needs an integer amount"
+        assert engine.seq == seq and engine.rejected == 5
+
+        # Behind a queued action the turn may change, so only the FSM can judge
+        engine.processing = True
+        assert engine.admit({"action": "call", "player_id": other}) is None
+        engine.processing = False
+        await engine.queue.join()
+
+        monkeypatch.setattr(engine.queue, "full", lambda: True)
+        assert engine.admit(check_or_call(engine)) == "table busy"
+    finally:
+        await engine.stop()
+        engines.pop("gated", None)
+
+    bucket = TokenBucket(rate=0, burst=3)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+def test_client_buckets_are_per_host_and_evicted_lru(monkeypatch):
+    from types import SimpleNamespace
+    from app.engine import admission
+
+    monkeypatch.setattr(admission, "_client_buckets", admission.OrderedDict())
+    monkeypatch.setattr(admission, "MAX_TRACKED_CLIENTS", 2)
+    # A new connection (new ephemeral port) from the same host shares its bucket
+    first = admission.client_bucket(SimpleNamespace(host="10.0.0.1", port=50001))
+    assert admission.client_bucket(SimpleNamespace(host="10.0.0.1", port=50002)) is first
+
+    other = admission.client_bucket(SimpleNamespace(host="10.0.0.2", port=1))
+    admission.client_bucket(SimpleNamespace(host="10.0.0.1", port=3))  # seen again: now most recent
+    admission.client_bucket(SimpleNamespace(host="10.0.0.3", port=1))  # evicts only 10.0.0.2
+    assert admission.client_bucket(SimpleNamespace(host="10.0.0.1", port=4)) is first
+    assert admission.client_bucket(SimpleNamespace(host="10.0.0.2", port=1)) is not other
+
+
+@pytest.mark.asyncio
+async def test_queued_actions_are_applied_as_one_batch(offline_engine, monkeypatch):
+    from app.engine.table_engine import TableEngine
+    from app.storage.state_persister import state_persister
+
+    engine = TableEngine("bursty")
+    broadcasts = []
+
+    async def capture(view, payloads):
+        broadcasts.append(json.loads(view.shared))
+    monkeypatch.setattr(engine, "_broadcast", capture)
+    engine.start()
+    await engine.ready.wait()
+
+    # A burst of joins (e.g. after a restart), plus one the FSM ignores, queued at once
+    joins = [{"action": "join", "player_id": f"p-{i}", "username": str(i)} for i in range(4)]
+    for action in joins + [joins[0]]:
+        await engine.enqueue(action)
+    await engine.queue.join()
+
+    assert len(broadcasts) == 1
+    events = broadcasts[0]["events"]
+    assert [e["player"]["id"] for e in events if "player" in e] == ["p-0", "p-1", "p-2", "p-3"]
+    assert broadcasts[0]["seq"] == engine.seq == len(events)
+    await state_persister.flush("bursty")
+    engine.task.cancel()
+
+    recovered = TableEngine("bursty")
+    recovered.start()
+    await recovered.ready.wait()
+    assert recovered.fsm.state.to_dict() == engine.fsm.state.to_dict()
+    assert recovered.seq == engine.seq
+    await recovered.stop()
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_engine_activity(offline_engine):
+    from prometheus_client import REGISTRY, generate_latest
+    from app.engine.registry import engines, get_engine
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    before = (sample("poker_actions_total"), sample("poker_fsm_apply_seconds_count"),
+              sample("poker_actions_rejected_total", reason="no hand in progress"))
+    engine = get_engine("measured")
+    await engine.ready.wait()
+    assert engine.admit({"action": "call", "player_id": "p-a"}) == "no hand in progress"
+    await play(engine, [{"action": "join", "player_id": pid, "username": pid} for pid in ("p-a", "p-b")])
+
+    assert sample("poker_actions_total") - before[0] == 2
+    assert sample("poker_fsm_apply_seconds_count") - before[1] == 2
+    assert sample("poker_actions_rejected_total", reason="no hand in progress") - before[2] == 1
+    assert sample("poker_tables", state="resident") == len(engines)
+
+    body = generate_latest().decode()  # what /metrics serves
+    assert "poker_queued_actions 0.0" in body
+    assert "poker_table_queue_depth" not in body  # no per-table series unless asked for
+    await engine.stop()
+    engines.pop("measured", None)
+
+
+@pytest.mark.asyncio
+async def test_action_traces_follow_the_action_through_the_queue(offline_engine):
+    import asyncio
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from app.engine.registry import engines
+    from app.engine.table_engine import TableEngine
+    from app.telemetry import tracing
+
+    exporter = InMemorySpanExporter()
+    engine = TableEngine("traced")
+    engines["traced"] = engine
+    engine.start()
+    await engine.ready.wait()
+    try:
+        # Every trace sampled
+        tracing.configure(exporter, rate=1.0, slow_ms=60_000)
+        for pid in ("p-a", "p-b"):
+            action = {"action": "join", "player_id": pid, "username": pid}
+            assert engine.admit(action, tracing.start_action("ws.action", "traced", action)) is None
+        await engine.queue.join()
+        bad = {"action": "check", "player_id": "nobody"}
+        engine.admit(bad, tracing.start_action("ws.action", "traced", bad))
+        while engine.outbox.buffer:
+            await asyncio.sleep(0.01)
+        # Kept traces are exported from a worker thread; wait for it
+        tracing.flush()
+
+        spans = exporter.get_finished_spans()
+        roots = [s for s in spans if s.parent is None and s.name == "ws.action"]
+        assert [r.attributes.get("rejected") for r in roots] == [None, None, "not your turn"]
+        first = roots[0].context.trace_id
+        names = {s.name for s in spans if s.context.trace_id == first}
+        assert {"engine.queue_wait", "fsm.apply", "engine.broadcast"} <= names
+        # The root covers the whole path: it ends after everything under it
+        assert all(s.end_time <= roots[0].end_time for s in spans if s.context.trace_id == first)
+        # Persistence and publishing are traced on their own, linked back to the actions
+        for name in ("state.flush", "outbox.publish"):
+            linked = [s for s in spans if s.name == name and s.parent is None]
+            assert linked and first in {link.context.trace_id for s in linked for link in s.links}
+
+        # Fast actions outside the sampled fraction are dropped; slow ones always kept
+        exporter.clear()
+        tracing.configure(exporter, rate=0.0, slow_ms=60_000)
+        engine.admit(check_or_call(engine), tracing.start_action("ws.action", "traced", check_or_call(engine)))
+        await engine.queue.join()
+        while engine.outbox.buffer:
+            await asyncio.sleep(0.01)
+        tracing.flush()
+        assert exporter.get_finished_spans() == ()
+        tracing.configure(exporter, rate=0.0, slow_ms=0)
+        engine.admit(check_or_call(engine), tracing.start_action("ws.action", "traced", check_or_call(engine)))
+        await engine.queue.join()
+        tracing.flush()
+        assert {s.name for s in exporter.get_finished_spans()} >= {"ws.action", "fsm.apply"}
+    finally:
+        tracing.configure(None)
+        await engine.stop()
+        engines.pop("traced", None)
@@ -0,0 +1,48 @@
+import pytest
+
+from app.engine.cards import card_from_str
+from app.engine.equity import calculate_equity
+from app.engine.evaluator import get_evaluator
+
+
+def cards(*names):
+    return [card_from_str(n) for n in names]
+
+
+def test_preflop_monte_carlo_is_seeded_and_close():
+    hands = [cards("As", "Ad"), cards("Ks", "Kd")]
+    result = calculate_equity(hands, samples=20000, seed=7)
+    assert result == calculate_equity(hands, samples=20000, seed=7)
+    assert not result["exact"]
+    assert result["boards"] == 20000
+    assert 81 < result["equity"][0] < 84
+    assert sum(result["equity"]) == pytest.approx(100)
+
+
+def test_turn_is_enumerated_exactly():
+    hands = [cards("Ah", "Kh"), cards("Qs", "Qd"), cards("7c", "8c")]
+    board = cards("Qh", "2h", "9c", "Tc")
+    result = calculate_equity(hands, board=board)
+    assert result["exact"]
+
+    evaluator = get_evaluator()
+    used = set(board + [c for h in hands for c in h])
+    rivers = [c for c in range(52) if c not in used]
+    shares = [0.0] * len(hands)
+    for river in rivers:
+        ranks = [evaluator.evaluate(h + board + [river]) for h in hands]
+        best = min(ranks)
+        winners = [i for i, r in enumerate(ranks) if r == best]
+        for i in winners:
+            shares[i] += 1 / len(winners)
+    assert result["boards"] == len(rivers)
+    assert result["equity"] == pytest.approx([100 * s / len(rivers) for s in shares])
+
+
+def test_rejects_bad_cards():
+    with pytest.raises(ValueError):
+        calculate_equity([cards("As", "Ad"), cards("As", "Kd")])
+    with pytest.raises(ValueError):
+        calculate_equity([cards("As", "Ad")])
+    with pytest.raises(ValueError):
+        calculate_equity([cards("As", "Ad"), cards("Ks", "Kd")], board=cards("2c", "3c"))
@@ -0,0 +1,44 @@
+import random
+from treys import Evaluator, Card
+from app.engine.cards import RANKS, SUITS, card_from_str
+from app.engine.evaluator import HandEvaluator, get_evaluator
+
+
+def to_treys(card):
+    return Card.new(RANKS[card >> 2] + SUITS[card & 3])
+
+
+def test_matches_treys_on_random_hands():
+    evaluator = get_evaluator()
+    reference = Evaluator()
+    rand = random.Random(7)
+    for size in (5, 6, 7):
+        for _ in range(2000):
+            cards = rand.sample(range(52), size)
+            rank = evaluator.evaluate(cards)
+            expected = reference.evaluate([to_treys(c) for c in cards[:2]], [to_treys(c) for c in cards[2:]])
+            assert rank == expected
+            assert evaluator.hand_name(rank) == reference.class_to_string(reference.get_rank_class(expected))
+
+
+def test_evaluate_many_shares_board():
+    evaluator = get_evaluator()
+    board = [card_from_str(c) for c in ["Ah", "Kh", "Qh", "2c", "7d"]]
+    hands = [
+        [card_from_str("Jh"), card_from_str("Th")],  # royal flush
+        [card_from_str("As"), card_from_str("Ad")],  # trips
+        [card_from_str("3s"), card_from_str("4d")],  # ace high
+    ]
+    ranks = evaluator.evaluate_many(board, hands)
+    assert ranks == [evaluator.evaluate(board + h) for h in hands]
+    assert [evaluator.hand_name(r) for r in ranks] == ["Royal Flush", "Three of a Kind", "High Card"]
+
+
+def test_tables_round_trip_through_mapped_file(tmp_path):
+    path = str(tmp_path / "tables.bin")
+    get_evaluator().save(path)
+    loaded = HandEvaluator.load(path)
+    rand = random.Random(11)
+    for _ in range(500):
+        cards = rand.sample(range(52), 7)
+        assert loaded.evaluate(cards) == get_evaluator().evaluate(cards)
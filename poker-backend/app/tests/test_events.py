@@ -0,0 +1,43 @@
+import asyncio
+import unittest.mock
+import pytest
+from app.events.outbox import EventOutbox
+
+
+class FlakyPublisher:
+    def __init__(self, fail_ids=()):
+        self.fail_ids = set(fail_ids)
+        self.sent = []
+
+    async def publish(self, subject, payload, msg_id=None):
+        await asyncio.sleep(0)
+        if msg_id in self.fail_ids:
+            self.fail_ids.discard(msg_id)  # fails once, then succeeds
+            raise ConnectionError("no ack")
+        self.sent.append(msg_id)
+
+
+@pytest.mark.asyncio
+async def test_outbox_retries_from_first_failure_in_order():
+    nats = FlakyPublisher(fail_ids={"t:3"})
+    with unittest.mock.patch("app.events.outbox.nats_client", nats), \
+         unittest.mock.patch("app.events.outbox.EVENT_RETRY_DELAY", 0):
+        outbox = EventOutbox("table.t.events", batch_size=4)
+        for i in range(1, 7):
+            outbox.append(f"t:{i}", b"{}")
+        await outbox.close()
+
+    # Batch 1..4 acked up to the failure; 3 and 4 are re-sent (JetStream dedups 4)
+    assert nats.sent == ["t:1", "t:2", "t:4", "t:3", "t:4", "t:5", "t:6"]
+    assert outbox.failures == 1
+    assert not outbox.buffer
+
+
+@pytest.mark.asyncio
+async def test_outbox_is_bounded():
+    outbox = EventOutbox("table.t.events", max_size=3)
+    with unittest.mock.patch.object(outbox, "_run", new=unittest.mock.AsyncMock()):
+        for i in range(5):
+            outbox.append(f"t:{i}", b"{}")
+    assert [m for m, _, _ in outbox.buffer] == ["t:2", "t:3", "t:4"]
+    assert outbox.dropped == 2
@@ -0,0 +1,45 @@
+import json
+import unittest.mock
+import pytest
+from app.engine.sharding import HashRing, ShardRouter
+
+
+def test_adding_a_node_moves_a_small_fraction_of_tables():
+    tables = [f"table-{i}" for i in range(5000)]
+    ring = HashRing([f"shard-{i}" for i in range(4)])
+    before = {t: ring.node_for(t) for t in tables}
+
+    ring.add("shard-4")
+    moved = [t for t in tables if ring.node_for(t) != before[t]]
+
+    # Only tables taken over by the new node move, roughly 1/5 of them
+    assert all(ring.node_for(t) == "shard-4" for t in moved)
+    assert 0.1 < len(moved) / len(tables) < 0.3
+
+
+@pytest.mark.asyncio
+async def test_router_forwards_remote_tables_to_their_owner():
+    router = ShardRouter(["shard-0", "shard-1"], node_id="shard-0")
+    remote = next(f"t{i}" for i in range(100) if router.owner(f"t{i}") == "shard-1")
+
+    with unittest.mock.patch("app.engine.sharding.nats_client.publish_core", new_callable=unittest.mock.AsyncMock) as publish:
+        await router.route(remote, {"action": "fold", "player_id": "p-a"})
+
+    subject, payload = publish.await_args.args
+    assert subject == "shard.shard-1.actions"
+    assert json.loads(payload)["table_id"] == remote
+
+
+@pytest.mark.asyncio
+async def test_remote_snapshot_failure_falls_back_to_none():
+    import asyncio
+    from app.engine import sharding
+
+    router = ShardRouter(["shard-0", "shard-1"], node_id="shard-0")
+    remote = next(f"t{i}" for i in range(100) if router.owner(f"t{i}") == "shard-1")
+
+    with unittest.mock.patch("app.engine.sharding.nats_client.request", new_callable=unittest.mock.AsyncMock,
+                             side_effect=asyncio.TimeoutError) as request:
+        assert await router.snapshot(remote) is None
+
+    assert request.await_args.kwargs["timeout"] > sharding.SNAPSHOT_READY_TIMEOUT
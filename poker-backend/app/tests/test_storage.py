@@ -0,0 +1,173 @@
+import asyncio
+import unittest.mock
+import pytest
+from app.storage.audit_writer import AuditWriter
+from app.storage.state_persister import StatePersister
+
+
+class FakePipeline:
+    def __init__(self, store):
+        self.store = store
+        self.commands = []
+
+    async def execute(self):
+        self.store.executed.append(self.commands)
+        results = []
+        for state_key, log_key, mapping, entries, fence in self.commands:
+            if fence is not None and self.store.fences.get(fence[0]) != fence[1]:
+                results.append(0)
+                continue
+            if mapping:
+                self.store.hashes[state_key] = mapping
+                self.store.lists[log_key] = []
+            self.store.lists.setdefault(log_key, []).extend(entries)
+            results.append(1)
+        return results
+
+
+class FakeRedis:
+    # Stands in for redis_client's table persistence (SAVE_TABLE semantics)
+    def __init__(self):
+        self.executed = []
+        self.hashes = {}
+        self.lists = {}
+        self.fences = {}
+        self.state_reads = []
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def save_table(self, pipe, state_key, log_key, mapping, entries, fence=None):
+        pipe.commands.append((state_key, log_key, mapping, entries, fence))
+
+    async def load_table(self, state_key, log_key):
+        return {k: str(v) for k, v in self.hashes.get(state_key, {}).items()}, list(self.lists.get(log_key, []))
+
+    async def load_states(self, state_keys):
+        self.state_reads.append(list(state_keys))
+        return [self.hashes.get(key, {}).get("data") for key in state_keys]
+
+    async def has_table(self, state_key, log_key):
+        return bool(self.hashes.get(state_key) or self.lists.get(log_key))
+
+
+@pytest.mark.asyncio
+async def test_persister_coalesces_versions_into_one_pipelined_write():
+    fake = FakeRedis()
+    with unittest.mock.patch("app.storage.state_persister.redis_client", fake):
+        persister = StatePersister(interval=60, max_dirty=100)
+        for seq in range(1, 6):
+            persister.mark_dirty("t1", seq, lambda seq=seq: {"data": f"v{seq}"})
+        persister.mark_dirty("t2", 3, lambda: {"data": "other"})
+
+        await persister.flush()
+
+        assert len(fake.executed) == 1  # one round trip for both tables
+        assert fake.hashes["table:t1:state"] == {"data": "v5", "seq": 5}
+        assert persister.persisted_seq == {"t1": 5, "t2": 3}
+        await persister.close()
+
+
+@pytest.mark.asyncio
+async def test_persister_flushes_on_dirty_threshold_and_close():
+    fake = FakeRedis()
+    with unittest.mock.patch("app.storage.state_persister.redis_client", fake):
+        persister = StatePersister(interval=60, max_dirty=2)
+        persister.mark_dirty("t1", 1, lambda: {"data": "a"})
+        await asyncio.sleep(0)
+        assert fake.executed == []
+
+        persister.mark_dirty("t2", 1, lambda: {"data": "b"})
+        await asyncio.sleep(0.01)
+        assert len(fake.executed) == 1
+
+        persister.mark_dirty("t3", 7, lambda: {"data": "c"})
+        await persister.close()
+        assert fake.hashes["table:t3:state"]["seq"] == 7
+
+
+@pytest.mark.asyncio
+async def test_persister_rejects_writes_from_stale_lease_holder():
+    fake = FakeRedis()
+    fake.fences["table-fence:t1"] = 2  # another node took the table over
+    fake.fences["table-fence:t2"] = 5
+    with unittest.mock.patch("app.storage.state_persister.redis_client", fake):
+        persister = StatePersister(interval=60)
+        persister.mark_dirty("t1", 9, lambda: {"data": "stale"}, fence=("table-fence:t1", 1))
+        persister.mark_dirty("t2", 4, lambda: {"data": "ok"}, fence=("table-fence:t2", 5))
+
+        await persister.close()
+
+        assert "table:t1:state" not in fake.hashes
+        assert persister.fenced_writes == 1
+        assert persister.persisted_seq == {"t2": 4}
+
+
+@pytest.mark.asyncio
+async def test_audit_writer_batches_rows_and_drains_on_close():
+    batches = []
+
+    async def log_hands(rows):
+        batches.append(list(rows))
+
+    with unittest.mock.patch("app.storage.audit_writer.pg_client") as pg:
+        pg.connect = unittest.mock.AsyncMock()
+        pg.log_hands = log_hands
+        writer = AuditWriter(max_queue=4, batch_size=2, interval=60)
+        accepted = [writer.submit(("t1", f"h{i}", 0, "s", "c", "[]")) for i in range(5)]
+        await writer.close()
+
+    assert accepted == [True, True, True, True, False]  # bounded queue pushes back
+    assert [len(b) for b in batches] == [2, 2]
+    assert writer.metrics()["written"] == 4
+    assert writer.metrics()["dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_audit_writer_drops_only_rows_that_fail_to_encode():
+    batches = []
+
+    async def log_hands(rows):
+        batches.append(list(rows))
+
+    def broken():
+        raise ValueError("bad hand log")
+
+    with unittest.mock.patch("app.storage.audit_writer.pg_client") as pg:
+        pg.connect = unittest.mock.AsyncMock()
+        pg.log_hands = log_hands
+        writer = AuditWriter(max_queue=10, batch_size=3, interval=60)
+        writer.submit(("t1", "h0", 0, "s", "c", lambda: "[0]"))
+        writer.submit(("t1", "h1", 0, "s", "c", broken))
+        writer.submit(("t1", "h2", 0, "s", "c", "[2]"))
+        await asyncio.wait_for(writer.queue.join(), 1)  # the first batch, by the background task
+        writer.submit(("t1", "h3", 0, "s", "c", "[3]"))  # the task must still be alive for this one
+        task = writer._task
+        await writer.close()
+
+    assert [[row[1] for row in b] for b in batches] == [["h0", "h2"], ["h3"]]
+    assert [row[5] for row in batches[0]] == ["[0]", "[2]"]
+    assert not task.done() or task.cancelled()
+    assert writer.metrics()["bad_rows"] == 1 and writer.metrics()["written"] == 3
+
+
+@pytest.mark.asyncio
+async def test_snapshot_resets_action_log():
+    fake = FakeRedis()
+    with unittest.mock.patch("app.storage.state_persister.redis_client", fake):
+        persister = StatePersister(interval=60)
+        for seq in (1, 2, 3):
+            persister.log_action("t1", seq, f"a{seq}")
+        await persister.flush("t1")
+        assert fake.lists["table:t1:actions"] == ["a1", "a2", "a3"]
+        assert persister.persisted_seq["t1"] == 3
+
+        persister.log_action("t1", 4, "a4")
+        persister.log_action("t1", 5, "a5")
+        persister.mark_dirty("t1", 4, lambda: {"data": "s", "seq": 4})
+        await persister.close()
+
+        # The snapshot covers up to seq 4; only the later action stays in the log
+        assert fake.hashes["table:t1:state"]["seq"] == 4
+        assert fake.lists["table:t1:actions"] == ["a5"]
+        assert persister.persisted_seq["t1"] == 5
@@ -0,0 +1,213 @@
+import asyncio
+import copy
+import json
+import pytest
+from msgpack import unpackb
+from app.ws.delta import diff, apply_patch
+from app.ws.manager import ConnectionManager
+from app.ws.views import BroadcastView, new_seat_token, seat_key, split_private
+from app.ws.wire import FORMATS, JSON, expand, get_format
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0):
+        self.sent = []
+        self.delay = delay
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed = True
+
+
+def test_diff_round_trip():
+    old = {"pot": 30, "phase": "preflop", "players": [{"chips": 990, "has_folded": False}, {"chips": 980}],
+           "community_cards": []}
+    new = {"pot": 70, "phase": "flop", "players": [{"chips": 970, "has_folded": True}, {"chips": 980}],
+           "community_cards": [{"rank": "A", "suit": "s"}], "extra": 1}
+
+    patch = diff(old, new)
+
+    assert all(op[0][:2] != ["players", 1] for op in patch)  # unchanged seat sends nothing
+    assert apply_patch(copy.deepcopy(old), patch) == new
+    assert diff(new, new) == []
+    assert apply_patch(copy.deepcopy(new), diff(new, old)) == old
+
+
+@pytest.mark.asyncio
+async def test_broadcast_resyncs_sockets_without_base():
+    manager = ConnectionManager()
+    synced, fresh = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(synced, "t1")
+    await manager.connect(fresh, "t1")
+    await manager.send_view(synced, BroadcastView({"type": "snapshot", "seq": 4, "state": {}}))
+
+    delta = BroadcastView({"type": "delta", "seq": 5, "base_seq": 4, "patch": [[["pot"], 10]], "events": []})
+    await manager.broadcast_view("t1", delta, lambda: BroadcastView({"type": "snapshot", "seq": 5, "state": {"pot": 10}}))
+    assert await manager.drain()
+
+    assert json.loads(synced.sent[-1])["type"] == "delta"
+    assert json.loads(fresh.sent[-1])["type"] == "snapshot"
+    assert manager.seqs[synced] == manager.seqs[fresh] == 5
+
+
+@pytest.mark.asyncio
+async def test_hole_cards_only_reach_their_seat():
+    token, key = new_seat_token()
+    state = {"pot": 30, "players": [
+        {"id": "p-a", "hole_cards": [{"rank": "A", "suit": "s"}, {"rank": "K", "suit": "s"}], "seat_key": key},
+        {"id": "p-b", "hole_cards": [{"rank": "2", "suit": "d"}, {"rank": "7", "suit": "c"}],
+         "seat_key": seat_key("other")},
+    ]}
+    public_state, private = split_private(state)
+    view = BroadcastView({"type": "snapshot", "seq": 1, "state": public_state, "events": []}, private)
+
+    manager = ConnectionManager()
+    alice, spectator, impostor = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await manager.connect(alice, "t1", player_id="p-a", seat_key=seat_key(token))
+    await manager.connect(spectator, "t1")
+    # Player ids are public; claiming one without its token gets the spectator view
+    await manager.connect(impostor, "t1", player_id="p-b", seat_key=seat_key("guess"))
+    for ws in (alice, spectator, impostor):
+        await manager.send_view(ws, view)
+    assert await manager.drain()
+
+    seen = json.loads(alice.sent[-1])
+    assert seen["private"] == {"player_id": "p-a", "hole_cards": state["players"][0]["hole_cards"]}
+    assert all(p["hole_cards"] is None and "seat_key" not in p for p in seen["state"]["players"])
+    assert spectator.sent[-1] is view.shared and impostor.sent[-1] is view.shared
+    assert '"hole_cards":[{' not in view.shared and key not in view.shared
+
+
+@pytest.mark.asyncio
+async def test_msgpack_sockets_get_compact_frames_encoded_once():
+    msgpack = FORMATS["msgpack"]
+    token, key = new_seat_token()
+    hole = [{"rank": "A", "suit": "s"}, {"rank": "T", "suit": "h"}]
+    board = [{"rank": "2", "suit": "d"}, {"rank": "7", "suit": "c"}, {"rank": "K", "suit": "s"}]
+    state = {"phase": "flop", "pot": 40, "community_cards": board, "last_action": {"action": "call"},
+             "players": [{"id": "p-a", "hole_cards": hole, "seat_key": key}, {"id": "p-b", "hole_cards": None}]}
+    public_state, private = split_private(state)
+    message = {"type": "delta", "seq": 7, "base_seq": 6, "state": public_state,
+               "patch": [[["phase"], "turn"], [["community_cards", 3], {"rank": "Q", "suit": "h"}]],
+               "events": [{"type": "player_action", "payload": {"action": "raise", "amount": 20}}]}
+    view = BroadcastView(message, private)
+
+    manager = ConnectionManager()
+    seated, watchers = FakeWebSocket(), [FakeWebSocket() for _ in range(3)]
+    await manager.connect(seated, "t1", player_id="p-a", seat_key=seat_key(token), fmt=msgpack)
+    for ws in watchers:
+        await manager.connect(ws, "t1", fmt=get_format("msgpack"))
+    text = FakeWebSocket()
+    await manager.connect(text, "t1", fmt=get_format(None))
+    for ws in [seated, text, *watchers]:
+        await manager.send_view(ws, view)
+    assert await manager.drain()
+
+    # Encoded once per format, whatever the number of sockets
+    assert set(view.encoded) == {"json", "msgpack"}
+    assert all(ws.sent[-1] is view.encoded["msgpack"] for ws in watchers)
+    assert text.sent[-1] is view.shared
+    assert len(view.encoded["msgpack"]) < len(view.shared) * 0.75
+
+    raw = unpackb(watchers[0].sent[-1])
+    assert raw["state"]["phase"] == 2 and raw["patch"][0] == [["phase"], 3]
+    assert raw["state"]["community_cards"] == bytes((2, 23, 44))
+    assert expand(raw) == msgpack.decode(watchers[0].sent[-1]) == json.loads(view.shared)
+    seen = msgpack.decode(seated.sent[-1])
+    assert seen["private"] == {"player_id": "p-a", "hole_cards": hole}
+    assert seen == dict(json.loads(view.shared), private=seen["private"])
+    # Relayed views only carry the JSON text; other formats are decoded from it once
+    relayed = BroadcastView.from_encoded(view.shared, 7, 6)
+    assert msgpack.decode(relayed.for_player(None, None, msgpack)) == json.loads(view.shared)
+    assert get_format("xml") is JSON
+
+
+def delta_view(seq):
+    return BroadcastView({"type": "delta", "seq": seq, "base_seq": seq - 1, "patch": [[["pot"], seq]], "events": []})
+
+
+def snapshot_view(seq):
+    return BroadcastView({"type": "snapshot", "seq": seq, "state": {"pot": seq}})
+
+
+@pytest.mark.asyncio
+async def test_slow_client_skips_ahead_without_holding_up_others():
+    manager = ConnectionManager(max_queue=4)
+    fast, slow = FakeWebSocket(), FakeWebSocket(delay=0.01)
+    await manager.connect(fast, "t1")
+    await manager.connect(slow, "t1")
+    await manager.send_view(fast, snapshot_view(0))
+    await manager.send_view(slow, snapshot_view(0))
+    await manager.drain()
+
+    latest = [0]
+    for seq in range(1, 21):
+        latest[0] = seq
+        await manager.broadcast_view("t1", delta_view(seq), lambda: snapshot_view(latest[0]))
+        await asyncio.sleep(0.002)  # the engine never waits on a socket, only on its next action
+    assert await manager.drain()
+
+    assert [json.loads(m)["seq"] for m in fast.sent] == list(range(21))
+    assert all(json.loads(m)["type"] == "delta" for m in fast.sent[1:])
+    received = [json.loads(m) for m in slow.sent]
+    assert len(received) < 21
+    assert any(m["type"] == "snapshot" for m in received[1:])
+    assert manager.seqs[slow] == manager.seqs[fast] == 20
+
+
+@pytest.mark.asyncio
+async def test_stuck_client_is_dropped():
+    manager = ConnectionManager(send_timeout=0.01)
+    ok, stuck = FakeWebSocket(), FakeWebSocket(delay=10)
+    await manager.connect(ok, "t1")
+    await manager.connect(stuck, "t1")
+    await manager.broadcast_view("t1", snapshot_view(1), None)
+    assert await manager.drain()
+
+    assert stuck.closed
+    assert manager.connections["t1"] == {ok}
+    assert stuck not in manager.clients and stuck not in manager.seqs
+    assert manager.dropped_clients == 1
+
+
+@pytest.mark.asyncio
+async def test_broker_fans_out_filters_and_drops_slow_subscribers():
+    from app.ws.broker import Broker
+
+    broker = Broker(max_queue=2)
+    everything = broker.subscribe("t1")
+    showdowns = broker.subscribe("t1", types=["showdown"])
+    action = BroadcastView({"type": "delta", "seq": 1, "events": []}, event_types=["player_action"])
+    showdown = BroadcastView({"type": "delta", "seq": 2, "events": []}, event_types=["showdown"])
+
+    broker.publish("t1", action)
+    broker.publish("t1", showdown)
+    assert [v.seq async for v in _take(everything, 2)] == [1, 2]
+    assert [v.seq async for v in _take(showdowns, 1)] == [2]
+
+    # Nobody reads `showdowns` now; it is dropped once its queue is full, the rest keep going
+    for seq in range(3, 9):
+        broker.publish("t1", BroadcastView({"type": "delta", "seq": seq}, event_types=["showdown"]))
+        await _take(everything, 1).__anext__()
+    assert broker.dropped == 1 and showdowns.closed
+    assert broker.subscribers["t1"] == {everything}
+    assert [v.seq async for v in showdowns] == [3, 4]  # what it had queued, then the stream ends
+
+    broker.unsubscribe(everything)
+    assert not broker.has_subscribers("t1")
+
+
+async def _take(sub, n):
+    for _ in range(n):
+        yield await sub.__anext__()
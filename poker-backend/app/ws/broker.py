@@ -0,0 +1,90 @@
+import asyncio
+import os
+from collections import deque
+from typing import Dict, Iterable, Optional, Set
+from app.ws.views import BroadcastView
+
+# Updates waiting per subscriber; one that falls this far behind is dropped
+BROKER_QUEUE = int(os.getenv("BROKER_QUEUE", "64"))
+
+
+class Subscription:
+    """One subscriber's bounded queue of table updates, consumed with `async for`.
+
+    Iteration ends once the subscriber is dropped or unsubscribed.
+    """
+
+    __slots__ = ("table_id", "types", "player_id", "items", "wakeup", "closed")
+
+    def __init__(self, table_id: str, types: Optional[Iterable[str]] = None, player_id: Optional[str] = None):
+        self.table_id = table_id
+        self.types = frozenset(types) if types else None
+        self.player_id = player_id
+        self.items = deque()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+
+    def wants(self, view: BroadcastView) -> bool:
+        return self.types is None or not self.types.isdisjoint(view.event_types)
+
+    def close(self):
+        self.closed = True
+        self.wakeup.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> BroadcastView:
+        while not self.items:
+            if self.closed:
+                raise StopAsyncIteration
+            self.wakeup.clear()
+            await self.wakeup.wait()
+        return self.items.popleft()
+
+
+class Broker:
+    """In-process pub/sub of table updates for GraphQL subscriptions.
+
+    The engine publishes the same BroadcastView it sends to WebSocket clients, so
+    an update is encoded once whichever way it goes out. Publishing never waits on
+    a subscriber: each has its own bounded queue and is dropped when it fills.
+    """
+
+    def __init__(self, max_queue: int = BROKER_QUEUE):
+        self.subscribers: Dict[str, Set[Subscription]] = {}  # table_id -> subscriptions
+        self.max_queue = max_queue
+        self.dropped = 0
+
+    def subscribe(self, table_id: str, types: Optional[Iterable[str]] = None,
+                  player_id: Optional[str] = None) -> Subscription:
+        sub = Subscription(table_id, types, player_id)
+        self.subscribers.setdefault(table_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        sub.close()
+        subs = self.subscribers.get(sub.table_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self.subscribers[sub.table_id]
+
+    def has_subscribers(self, table_id: str) -> bool:
+        return bool(self.subscribers.get(table_id))
+
+    def publish(self, table_id: str, view: BroadcastView):
+        for sub in list(self.subscribers.get(table_id, ())):
+            if not sub.wants(view):
+                continue
+            if len(sub.items) >= self.max_queue:
+                # Too slow to keep up: end its stream rather than hold updates for it
+                self.dropped += 1
+                print(f"[Broker] Dropping slow subscriber on table {table_id}")
+                self.unsubscribe(sub)
+                continue
+            sub.items.append(view)
+            sub.wakeup.set()
+
+
+broker = Broker()
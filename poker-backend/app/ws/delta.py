@@ -0,0 +1,47 @@
+from typing import Any, List
+
+# Field-level patches between two JSON-like states.
+#
+# A patch is a list of ops. [path, value] sets the value at path and [path]
+# deletes it. A path is a list of dict keys and list indices; an empty path
+# replaces the whole document. Lists whose length changed are replaced whole.
+
+
+def diff(old: Any, new: Any) -> List[list]:
+    ops = []
+    _diff(old, new, [], ops)
+    return ops
+
+
+def _diff(old, new, path, ops):
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            if key in old:
+                _diff(old[key], value, path + [key], ops)
+            else:
+                ops.append([path + [key], value])
+        for key in old:
+            if key not in new:
+                ops.append([path + [key]])
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for i, (a, b) in enumerate(zip(old, new)):
+            _diff(a, b, path + [i], ops)
+    elif type(old) is not type(new) or old != new:
+        ops.append([path, new])
+
+
+def apply_patch(doc: Any, ops: List[list]) -> Any:
+    """Apply a patch in place and return the (possibly replaced) document."""
+    for op in ops:
+        path = op[0]
+        if not path:
+            doc = op[1]
+            continue
+        parent = doc
+        for key in path[:-1]:
+            parent = parent[key]
+        if len(op) == 1:
+            del parent[path[-1]]
+        else:
+            parent[path[-1]] = op[1]
+    return doc
@@ -1,29 +1,201 @@
-from typing import Dict, Set
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Set, Tuple
 from fastapi import WebSocket
+from app.telemetry.metrics import FANOUT_SECONDS, WS_SKIPPED
+from app.ws.views import BroadcastView
+from app.ws.wire import JSON, dumps_json
+
+# Messages waiting per socket before a lagging client is skipped ahead to a snapshot
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "32"))
+# A single send that takes longer than this marks the client as stuck; it is dropped
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+
+
+def _once(fn: Callable[[], BroadcastView]) -> Callable[[], BroadcastView]:
+    # Build a broadcast's snapshot at most once, however many lagging clients need it
+    cache = []
+
+    def get():
+        if not cache:
+            cache.append(fn())
+        return cache[0]
+    return get
+
+
+class ClientQueue:
+    """Bounded outbound queue for one socket, drained by its own writer task.
+
+    Items are (view, snapshot, force). A delta whose base the client does not
+    have is replaced by the snapshot; forced items (connect/resync snapshots)
+    are always sent.
+    """
+
+    __slots__ = ("table_id", "items", "wakeup", "task", "sending", "skipped")
+
+    def __init__(self, table_id: str):
+        self.table_id = table_id
+        self.items = deque()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.sending = False
+        self.skipped = 0
+
+    def push(self, item, max_size: int):
+        if len(self.items) >= max_size:
+            if item[1] is not None:
+                # Too far behind for the queued deltas to be worth sending: jump to the
+                # newest update; its base won't match, so it goes out as a snapshot
+                self.skipped += len(self.items)
+                WS_SKIPPED.inc(len(self.items))
+                self.items.clear()
+            else:
+                # No snapshot to fall back on; the client sees the gap and asks to resync
+                self.items.popleft()
+                self.skipped += 1
+                WS_SKIPPED.inc()
+        self.items.append(item)
+        self.wakeup.set()
+
+    @property
+    def idle(self) -> bool:
+        return not self.items and not self.sending
+
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, max_queue: int = WS_SEND_QUEUE, send_timeout: float = WS_SEND_TIMEOUT):
         self.connections: Dict[str, Set[WebSocket]] = {}  # table_id -> websockets
+        self.seqs: Dict[WebSocket, int] = {}  # websocket -> last seq it was sent
+        # websocket -> (player_id, seat key) it proved it holds; spectators absent
+        self.players: Dict[WebSocket, Tuple[str, str]] = {}
+        self.clients: Dict[WebSocket, ClientQueue] = {}  # websocket -> outbound queue
+        self.formats: Dict[WebSocket, object] = {}  # websocket -> wire format, if not JSON
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        # Broadcasts are handed off here and fanned out to client queues by one task,
+        # so the engine's cost doesn't grow with the number of watchers
+        self._fanout = deque()  # (table_id, view, snapshot)
+        self._fanout_wakeup: Optional[asyncio.Event] = None
+        self._fanout_task: Optional[asyncio.Task] = None
+        self.dropped_clients = 0
 
-    async def connect(self, websocket: WebSocket, table_id: str):
+    async def connect(self, websocket: WebSocket, table_id: str, player_id: Optional[str] = None,
+                      seat_key: Optional[str] = None, fmt=JSON):
         await websocket.accept()
+        if player_id and seat_key:
+            self.players[websocket] = (player_id, seat_key)
+        if fmt is not JSON:
+            self.formats[websocket] = fmt
         if table_id not in self.connections:
             self.connections[table_id] = set()
         self.connections[table_id].add(websocket)
+        client = ClientQueue(table_id)
+        client.task = asyncio.create_task(self._write(websocket, client))
+        self.clients[websocket] = client
 
     async def disconnect(self, websocket: WebSocket, table_id: str):
+        client = self.clients.pop(websocket, None)
+        if client is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+        self.seqs.pop(websocket, None)
+        self.players.pop(websocket, None)
+        self.formats.pop(websocket, None)
         if table_id in self.connections:
             self.connections[table_id].discard(websocket)
             if not self.connections[table_id]:
                 del self.connections[table_id]
 
+    def bind_player(self, websocket: WebSocket, player_id: str, seat_key: str):
+        # Seat a socket once it was issued the seat's token, so it receives that player's cards
+        self.players[websocket] = (player_id, seat_key)
+
+    async def send_view(self, websocket: WebSocket, view: BroadcastView):
+        # Queued behind anything already pending for this socket, so ordering holds
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.push((view, None, True), self.max_queue)
+
+    def has_connections(self, table_id: str) -> bool:
+        return bool(self.connections.get(table_id))
+
     async def broadcast(self, table_id: str, message: dict):
-        conns = list(self.connections.get(table_id, []))
-        for ws in conns:
-            try:
-                await ws.send_json(message)
-            except Exception:
-                # Handle disconnected clients
-                pass
+        # Unsequenced message for everyone at the table; doesn't affect delta tracking
+        view = BroadcastView.from_encoded(dumps_json(message), None)
+        for ws in self.connections.get(table_id, ()):
+            self.clients[ws].push((view, None, True), self.max_queue)
+
+    async def broadcast_view(self, table_id: str, view: BroadcastView,
+                             snapshot: Optional[Callable[[], BroadcastView]]):
+        # Sockets whose last seq is the view's base get the delta; anyone else
+        # (new, lagging or after a skip) is resynced with a full snapshot.
+        # Both are encoded once; seated sockets only add their private fragment.
+        # Without a snapshot everyone gets the delta and clients resync on the gap.
+        if table_id not in self.connections:
+            return  # nobody watching; don't wake the fan-out task
+        self._fanout.append((table_id, view, _once(snapshot) if snapshot is not None else None))
+        if self._fanout_task is None or self._fanout_task.done():
+            self._fanout_wakeup = asyncio.Event()
+            self._fanout_task = asyncio.create_task(self._run_fanout())
+        self._fanout_wakeup.set()
+
+    async def _run_fanout(self):
+        while True:
+            await self._fanout_wakeup.wait()
+            self._fanout_wakeup.clear()
+            while self._fanout:
+                table_id, view, snapshot = self._fanout.popleft()
+                started = time.perf_counter()
+                for ws in self.connections.get(table_id, ()):
+                    self.clients[ws].push((view, snapshot, False), self.max_queue)
+                FANOUT_SECONDS.observe(time.perf_counter() - started)
+                await asyncio.sleep(0)  # let writers run between large fan-outs
+
+    async def _write(self, websocket: WebSocket, client: ClientQueue):
+        fmt = self.formats.get(websocket, JSON)
+        send = websocket.send_bytes if fmt.binary else websocket.send_text
+        while True:
+            await client.wakeup.wait()
+            client.wakeup.clear()
+            while client.items:
+                view, snapshot, force = client.items.popleft()
+                last = self.seqs.get(websocket)
+                if not force:
+                    if last is not None and view.seq <= last:
+                        continue  # already covered by a newer snapshot
+                    if snapshot is not None and last != view.base_seq:
+                        view = snapshot()
+                client.sending = True
+                try:
+                    player_id, key = self.players.get(websocket, (None, None))
+                    await asyncio.wait_for(send(view.for_player(player_id, key, fmt)), self.send_timeout)
+                except Exception as e:
+                    await self._drop(websocket, client, e)
+                    return
+                finally:
+                    client.sending = False
+                if view.seq is not None:
+                    self.seqs[websocket] = view.seq
+
+    async def _drop(self, websocket: WebSocket, client: ClientQueue, error: Exception):
+        # A dead or stuck consumer: forget it so it can't hold anything up, then try to close it
+        self.dropped_clients += 1
+        print(f"[WS] Dropping client on table {client.table_id}: {error!r}")
+        await self.disconnect(websocket, client.table_id)
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), 1)
+        except Exception:
+            pass
+
+    async def drain(self, timeout: float = 1.0):
+        # Wait (bounded) until every queued broadcast has been written or dropped
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            if not self._fanout and all(c.idle for c in self.clients.values()):
+                return True
+            await asyncio.sleep(0.001)
+        return False
 
 manager = ConnectionManager()
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import secrets
+from typing import Dict, Iterable, Optional, Tuple, Union
+from app.ws.wire import JSON
+
+
+def new_seat_token() -> Tuple[str, str]:
+    # Issued to whoever joins a seat: (token for the client, key stored with the seat)
+    token = secrets.token_urlsafe(16)
+    return token, seat_key(token)
+
+
+def seat_key(token: Optional[str]) -> Optional[str]:
+    return hashlib.sha256(token.encode()).hexdigest() if token else None
+
+
+def split_private(state: dict) -> Tuple[dict, Dict[str, dict]]:
+    """Mask hole cards (and the seat key) in a client state dict.
+
+    Returns (public_state, {player_id: private_fragment}); the fragment is what only
+    that seat may see, plus the key a socket must present to be sent it.
+    """
+    private = {}
+    players = []
+    for p in state.get("players", []):
+        cards = p.get("hole_cards")
+        if cards:
+            private[p["id"]] = {"player_id": p["id"], "hole_cards": cards, "seat_key": p.get("seat_key")}
+            p = dict(p, hole_cards=None)
+        if "seat_key" in p:
+            p = dict(p)
+            del p["seat_key"]
+        players.append(p)
+    return dict(state, players=players), private
+
+
+class BroadcastView:
+    # One outbound message, encoded once per wire format for the whole table. Spectators
+    # share the encoding; a seated player gets it with their private fragment spliced in.
+    # event_types lists the hand events the message carries, for subscription filters.
+    def __init__(self, message: dict, private: Optional[Dict[str, dict]] = None,
+                 event_types: Iterable[str] = ()):
+        self.seq = message["seq"]
+        self.base_seq = message.get("base_seq")
+        self.message = message
+        self.shared = JSON.encode(message)
+        self.encoded = {JSON.name: self.shared}  # format name -> shared encoding
+        self.private = private or {}
+        self.event_types = tuple(event_types)
+
+    @classmethod
+    def from_encoded(cls, shared: str, seq: int, base_seq: Optional[int] = None,
+                     private: Optional[Dict[str, dict]] = None,
+                     event_types: Iterable[str] = ()) -> "BroadcastView":
+        # Rebuild a view from text that was already encoded elsewhere (e.g. a relayed broadcast)
+        view = cls.__new__(cls)
+        view.seq = seq
+        view.base_seq = base_seq
+        view.message = None  # decoded from the text if another format asks for it
+        view.shared = shared
+        view.encoded = {JSON.name: shared}
+        view.private = private or {}
+        view.event_types = tuple(event_types)
+        return view
+
+    def encode(self, fmt) -> Union[str, bytes]:
+        # The shared message in one of app.ws.wire's formats, encoded on first use
+        data = self.encoded.get(fmt.name)
+        if data is None:
+            message = self.message if self.message is not None else json.loads(self.shared)
+            data = self.encoded[fmt.name] = fmt.encode(message)
+        return data
+
+    def for_player(self, player_id: Optional[str], key: Optional[str] = None, fmt=JSON) -> Union[str, bytes]:
+        # Only a socket holding the seat's key (see new_seat_token) gets its cards
+        shared = self.encode(fmt)
+        fragment = self.private.get(player_id) if player_id else None
+        if fragment is None or key is None or fragment.get("seat_key") != key:
+            return shared
+        fragment = {"player_id": fragment["player_id"], "hole_cards": fragment["hole_cards"]}
+        return fmt.with_private(shared, fragment)